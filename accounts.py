@@ -0,0 +1,186 @@
+import asyncio
+import threading
+import time
+from datetime import datetime
+from logger import api_logger as logger
+from typing import Dict, NamedTuple, Optional
+from api_client import _ensure_dict
+from config import ACCOUNT_SYNC_INTERVAL
+from metrics import (
+    ACCOUNT_SNAPSHOT_AGE,
+    ACCOUNT_SYNC_FAILURES,
+    ACCOUNT_SYNC_INTERVAL_SECONDS,
+    ACCOUNT_SYNC_SECONDS,
+    timer,
+)
+
+
+class AccountInfo(NamedTuple):
+    """Трафик и срок действия клиента на момент последней синхронизации."""
+
+    panel: str
+    email: str
+    up: int
+    down: int
+    total: int  # лимит трафика в байтах, 0 — без ограничения
+    expiry_time: int  # мс с эпохи, 0 — бессрочно, < 0 — отсчёт с первого подключения
+    enable: bool
+    synced_at: float
+
+
+def collect_accounts(panel_name: str, inbounds: list, synced_at: float) -> Dict[int, AccountInfo]:
+    """
+    Собирает AccountInfo по tgId из ответа inbounds/list: клиенты берутся
+    из settings, их трафик — из clientStats того же inbound по email.
+    """
+    accounts = {}
+    for inbound in inbounds:
+        stats = {s.get("email"): s for s in inbound.get("clientStats") or []}
+        for client in _ensure_dict(inbound.get("settings", {})).get("clients", []):
+            try:
+                user_id = int(client.get("tgId"))
+            except (TypeError, ValueError):
+                continue
+            if user_id in accounts:
+                continue
+            email = client.get("email", "")
+            stat = stats.get(email, {})
+            accounts[user_id] = AccountInfo(
+                panel=panel_name,
+                email=email,
+                up=stat.get("up") or 0,
+                down=stat.get("down") or 0,
+                total=stat.get("total") or client.get("totalGB") or 0,
+                expiry_time=stat.get("expiryTime") or client.get("expiryTime") or 0,
+                enable=bool(stat.get("enable", client.get("enable", True))),
+                synced_at=synced_at,
+            )
+    return accounts
+
+
+class AccountStore:
+    """
+    Снимки аккаунтов по панелям. Снимок панели заменяется целиком,
+    так что читатели всегда видят согласованное состояние одного прохода.
+    """
+
+    def __init__(self):
+        self._panels: Dict[str, Dict[int, AccountInfo]] = {}
+        self._synced_at: Dict[str, float] = {}
+
+    def update(self, panel_name: str, accounts: Dict[int, AccountInfo], synced_at: float) -> None:
+        self._panels[panel_name] = accounts
+        self._synced_at[panel_name] = synced_at
+
+    def get(self, user_id: int) -> Optional[AccountInfo]:
+        for accounts in list(self._panels.values()):
+            info = accounts.get(user_id)
+            if info is not None:
+                return info
+        return None
+
+    def ready(self) -> bool:
+        """Была ли хотя бы одна успешная синхронизация."""
+        return bool(self._synced_at)
+
+    def age(self) -> float:
+        """Возраст самого старого снимка в секундах, 0 — если снимков ещё нет."""
+        if not self._synced_at:
+            return 0.0
+        return time.time() - min(self._synced_at.values())
+
+
+account_store = AccountStore()
+ACCOUNT_SNAPSHOT_AGE.set_function(account_store.age)
+ACCOUNT_SYNC_INTERVAL_SECONDS.set(ACCOUNT_SYNC_INTERVAL)
+
+
+def _store_inbounds(panel_name: str, inbounds: list) -> None:
+    synced_at = time.time()
+    accounts = collect_accounts(panel_name, inbounds, synced_at)
+    account_store.update(panel_name, accounts, synced_at)
+    logger.info(f"Synced {len(accounts)} accounts from panel {panel_name}")
+
+
+def sync_accounts(panels: list) -> None:
+    """
+    Один проход синхронизации: inbounds/list каждой панели через общий кэш,
+    так что несколько экземпляров бота делят один запрос к панели за TTL.
+    """
+    with timer(ACCOUNT_SYNC_SECONDS):
+        for panel in panels:
+            try:
+                _store_inbounds(panel.name, panel.fetch_inbounds())
+            except Exception as e:
+                ACCOUNT_SYNC_FAILURES.labels(panel.name).inc()
+                logger.error(f"Failed to sync accounts from panel {panel.name}: {e}")
+
+
+def start_account_sync(panels: list, interval: float = ACCOUNT_SYNC_INTERVAL) -> threading.Thread:
+    """Запускает фоновый поток, синхронизирующий аккаунты раз в interval секунд."""
+
+    def _run() -> None:
+        while True:
+            sync_accounts(panels)
+            time.sleep(interval)
+
+    thread = threading.Thread(target=_run, name="account-sync", daemon=True)
+    thread.start()
+    return thread
+
+
+async def sync_accounts_async(panels: list) -> None:
+    """То же, что sync_accounts, для AsyncPanelClient: панели опрашиваются параллельно."""
+    with timer(ACCOUNT_SYNC_SECONDS):
+        results = await asyncio.gather(
+            *(panel.fetch_inbounds() for panel in panels), return_exceptions=True
+        )
+        for panel, inbounds in zip(panels, results):
+            if isinstance(inbounds, Exception):
+                ACCOUNT_SYNC_FAILURES.labels(panel.name).inc()
+                logger.error(f"Failed to sync accounts from panel {panel.name}: {inbounds}")
+                continue
+            # Разбор клиентов всех inbound'ов не должен занимать event loop
+            await asyncio.to_thread(_store_inbounds, panel.name, inbounds)
+
+
+async def run_account_sync(panels: list, interval: float = ACCOUNT_SYNC_INTERVAL) -> None:
+    while True:
+        await sync_accounts_async(panels)
+        await asyncio.sleep(interval)
+
+
+def _format_bytes(value: int) -> str:
+    for unit in ("Б", "КБ", "МБ", "ГБ"):
+        if value < 1024:
+            return f"{value:.0f} {unit}" if unit == "Б" else f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} ТБ"
+
+
+def account_text(user_id: int) -> str:
+    """Текст ответа на get_info из последнего снимка, без запросов к панели."""
+    info = account_store.get(user_id)
+    if info is None:
+        if not account_store.ready():
+            return "⏳ Информация об аккаунте ещё не загружена, попробуйте позже"
+        return "❗ Учётная запись не найдена"
+
+    used = _format_bytes(info.up + info.down)
+    limit = f"из {_format_bytes(info.total)}" if info.total else "без ограничений"
+    if info.expiry_time > 0:
+        expiry = datetime.fromtimestamp(info.expiry_time / 1000).strftime("%d.%m.%Y %H:%M")
+    elif info.expiry_time < 0:
+        expiry = f"{-info.expiry_time // 86_400_000} дн. с первого подключения"
+    else:
+        expiry = "бессрочно"
+    status = "активна" if info.enable else "отключена"
+    updated = datetime.fromtimestamp(info.synced_at).strftime("%H:%M:%S")
+    return (
+        "ℹ️ Учётная запись\n"
+        f"Статус: {status}\n"
+        f"Трафик: {used} {limit} "
+        f"(↑ {_format_bytes(info.up)}, ↓ {_format_bytes(info.down)})\n"
+        f"Действует до: {expiry}\n"
+        f"Обновлено: {updated}"
+    )
@@ -2,44 +2,119 @@ from handlers import *
 from api_client import *
 from logger import api_logger as logger
 from telebot import types
-from bot import bot
+from telebot.apihelper import ApiTelegramException
+from bot import bot, sender
+from metrics import timed_handler
 
 @bot.message_handler(commands=["admin"])
+@timed_handler
 def cmd_admin(message: types.Message) -> None:
     user_id = message.chat.id
     # @todo: move validation to query handler
 
-    if is_admin(user_id):
+    if not is_admin(user_id):
         bot.send_message(user_id, "⛔ Доступ запрещён")
         return
 
-    requests = load_approval_requests()
-    users = load_approved_users()
-
-    lines = []
-    if requests:
-        lines.append("**Ожидают:**")
-        for r in requests:
-            lines.append(f"- @{r['username']} (ID: {r['user_id']})")
-    if users:
-        lines.append("**Одобрены:**")
-        for a in users:
-            lines.append(f"- @{a['username']} (ID: {a['user_id']})")
-    text = "\n".join(lines) if lines else "Заявок нет"
-
-    markup = types.InlineKeyboardMarkup()
-    for r in requests:
-        uid = r['user_id']
-        markup.add(
-            types.InlineKeyboardButton(
-                text=f"Одобрить @{r['username']}",
-                callback_data=f"approve:{uid}"
-            )
-        )
+    # /admin <запрос> ищет по ID или части username
+    query = message.text.partition(" ")[2].strip()
+    text, markup = admin_search(query) if query else admin_page()
     bot.send_message(user_id, text, reply_markup=markup, parse_mode="Markdown")
 
 
+@bot.callback_query_handler(func=lambda c: c.data and c.data.startswith(ADMIN_PAGE_PREFIX))
+@timed_handler
+def handle_admin_page(call: types.CallbackQuery) -> None:
+    """Листает /admin, редактируя то же сообщение."""
+    if not is_admin(call.from_user.id):
+        bot.answer_callback_query(call.id, "Нет прав", show_alert=True)
+        return
+
+    try:
+        page = parse_admin_callback(call.data)
+    except ValueError:
+        logger.warning(f"Malformed admin page callback: {call.data}")
+        bot.answer_callback_query(call.id, STALE_PAGE_TEXT, show_alert=True)
+        return
+
+    text, markup = admin_page(*page)
+    try:
+        bot.edit_message_text(
+            text,
+            call.message.chat.id,
+            call.message.message_id,
+            reply_markup=markup,
+            parse_mode="Markdown",
+        )
+    except ApiTelegramException as e:
+        # Повторное нажатие на ту же страницу
+        if "message is not modified" not in e.description:
+            raise
+    bot.answer_callback_query(call.id)
+
+
+def approve_requests(caller_id: int, requests: list) -> tuple:
+    """
+    Регистрирует пачку заявок на панели одним запросом и одним обновлением
+    хранилища переносит успешные в одобренные. Неудачные заявки остаются
+    в ожидании. Заявки, которые уже обрабатывает другой админ, пропускаются.
+    Возвращает (одобренные, неудачные).
+    """
+    claimed = in_flight.claim_many(REQUEST_ACTION, [r['user_id'] for r in requests])
+    try:
+        requests = take_requests(claimed)
+        results = add_clients([(r['user_id'], r['username']) for r in requests])
+        return settle_requests(sender, caller_id, requests, results)
+    finally:
+        in_flight.release(REQUEST_ACTION, *claimed)
+
+
+@bot.callback_query_handler(func=lambda c: c.data == "approve_all")
+@timed_handler
+def handle_approve_all(call: types.CallbackQuery) -> None:
+    caller_id = call.from_user.id
+    if not is_admin(caller_id):
+        bot.answer_callback_query(call.id, "Нет прав", show_alert=True)
+        return
+
+    requests = load_approval_requests()
+    if not requests:
+        bot.answer_callback_query(call.id, "Заявок нет", show_alert=True)
+        return
+
+    approved, failed = approve_requests(caller_id, requests)
+    bot.answer_callback_query(call.id)
+    bot.send_message(caller_id, approval_summary(approved, failed))
+
+
+@bot.message_handler(commands=["approve"])
+@timed_handler
+def cmd_approve(message: types.Message) -> None:
+    """Одобряет выбранные заявки: /approve <id> [<id> ...]"""
+    caller_id = message.chat.id
+    if not is_admin(caller_id):
+        bot.send_message(caller_id, "⛔ Доступ запрещён")
+        return
+
+    try:
+        user_ids = [int(arg) for arg in message.text.split()[1:]]
+    except ValueError:
+        user_ids = []
+    if not user_ids:
+        bot.send_message(caller_id, "Укажите ID пользователей: /approve <id> [<id> ...]")
+        return
+
+    requests = get_approval_requests(user_ids)
+    if not requests:
+        bot.send_message(caller_id, "Заявки не найдены или уже обработаны")
+        return
+
+    approved, failed = approve_requests(caller_id, requests)
+    bot.send_message(caller_id, approval_summary(approved, failed))
+
+
 @bot.callback_query_handler(func=lambda c: c.data and c.data.startswith("approve:"))
+@timed_handler
 def handle_approve(call: types.CallbackQuery) -> None:
     caller_id = call.from_user.id
     if not is_admin(caller_id):
@@ -49,33 +124,26 @@ def handle_approve(call: types.CallbackQuery) -> None:
     _, uid = call.data.split(":", 1)
     user_id = int(uid)
 
-    requests = load_approval_requests()
-    req = next((r for r in requests if r['user_id'] == user_id), None)
-    if not req:
-        bot.answer_callback_query(call.id, "Заявка не найдена или уже обработана", show_alert=True)
-        return
+    with in_flight.single(REQUEST_ACTION, user_id) as claimed:
+        if not claimed:
+            bot.answer_callback_query(call.id, "⏳ Заявка уже обрабатывается")
+            return
 
-    username = req['username']
-    if add_client(user_id, username):
-        users = load_approved_users()
-        users.append(req)
-        save_approved_users(users)
-        logger.info(f"Approved user {user_id} by admin {caller_id}")
-        bot.send_message(
-            user_id,
-            "✅ Ваша заявка одобрена! Вы зарегистрированы",
-            reply_markup=make_user_keyboard()
-        )
-        bot.answer_callback_query(call.id, "Пользователь одобрен")
-    else:
-        bot.answer_callback_query(call.id, "Ошибка при регистрации API", show_alert=True)
+        requests = take_requests([user_id])
+        if not requests:
+            bot.answer_callback_query(call.id, "Заявка не найдена или уже обработана", show_alert=True)
+            return
 
-    # Удаление обработанной заявки
-    remaining = [r for r in requests if r['user_id'] != user_id]
-    save_approval_requests(remaining)
+        results = {user_id: add_client(user_id, requests[0]['username'])}
+        approved, _ = settle_requests(sender, caller_id, requests, results)
+        if approved:
+            bot.answer_callback_query(call.id, "Пользователь одобрен")
+        else:
+            bot.answer_callback_query(call.id, "Ошибка при регистрации API", show_alert=True)
 
 
 @bot.callback_query_handler(func=lambda c: c.data and c.data.startswith("reject:"))
+@timed_handler
 def handle_reject(call: types.CallbackQuery) -> None:
     caller_id = call.from_user.id
     if not is_admin(caller_id):
@@ -85,11 +153,15 @@ def handle_reject(call: types.CallbackQuery) -> None:
     _, uid = call.data.split(":", 1)
     user_id = int(uid)
 
-    requests = load_approval_requests()
-    req = next((r for r in requests if r['user_id'] == user_id), None)
-    if not req:
-        bot.answer_callback_query(call.id, "Заявка не найдена или уже обработана", show_alert=True)
-        return
+    with in_flight.single(REQUEST_ACTION, user_id) as claimed:
+        if not claimed:
+            bot.answer_callback_query(call.id, "⏳ Заявка уже обрабатывается")
+            return
+
+        req = remove_approval_request(user_id)
+        if not req:
+            bot.answer_callback_query(call.id, "Заявка не найдена или уже обработана", show_alert=True)
+            return
 
     username = req['username']
     bot.send_message(user_id, "❌ Ваша заявка отклонена администратором")
@@ -98,8 +170,4 @@ def handle_reject(call: types.CallbackQuery) -> None:
         f"🗑️ Вы отклонили заявку пользователя @{username} (id={user_id})"
     )
     bot.answer_callback_query(call.id, "Заявка отклонена")
-    logger.info(f"Rejected user {user_id} by admin {caller_id}")
-
-    # Удаление обработанной заявки
-    remaining = [r for r in requests if r['user_id'] != user_id]
-    save_approval_requests(remaining)
\ No newline at end of file
+    logger.info("Rejected user %s by admin %s", user_id, caller_id)
\ No newline at end of file
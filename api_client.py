@@ -1,10 +1,45 @@
 import requests
 import json
+import threading
+import time
 import urllib3
+from collections import deque
+from contextlib import contextmanager
 from logger import api_logger as logger
 from urllib.parse import quote_plus, quote, urlencode, urlparse
-from config import API_URL, API_AUTH_LOGIN, API_AUTH_PASSWORD, VERIFY
-from typing import Optional
+from config import (
+    API_URL,
+    API_AUTH_LOGIN,
+    API_AUTH_PASSWORD,
+    VERIFY,
+    API_TIMEOUT,
+    API_SESSION_POOL_SIZE,
+    INBOUNDS_CACHE_TTL,
+    API_BATCH_SIZE,
+    PANELS_FILE,
+    PLACEMENT_STRATEGY,
+    CLIENT_LOOKUP,
+    PANEL_BREAKER_THRESHOLD,
+    PANEL_BREAKER_RESET,
+)
+from breaker import CircuitBreaker, CircuitOpenError
+from handlers.storage import (
+    add_pending_clients,
+    get_placement,
+    load_pending_clients,
+    remove_pending_clients,
+    set_placements,
+)
+from handlers.shared_cache import shared_inbounds
+from metrics import PANEL_REPLAYED_CLIENTS, count_cache
+from placement import assign, inbound_candidates
+from ratelimit import panel_load
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import ijson
+except ImportError:  # без ijson ответ разбирается целиком
+    ijson = None
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -18,18 +53,6 @@ def _ensure_dict(value):
             return {}
     return value or {}
 
-def _extract_client_and_inbound(inbounds, user_id: str):
-    """
-    Находит inbound и client по tgId.
-    """
-    for inbound in inbounds:
-        settings = _ensure_dict(inbound.get("settings", {}))
-        clients  = settings.get("clients", [])
-        for client in clients:
-            if client.get("tgId") == user_id:
-                return inbound, client
-    return None, None
-
 def _parse_stream_settings(stream_settings):
     ss = _ensure_dict(stream_settings)
     reality = _ensure_dict(ss.get("realitySettings", {}))
@@ -45,103 +68,282 @@ def _parse_stream_settings(stream_settings):
     }
 
 
-def _build_client_info(user_id: int, username: str) -> dict:
+def _build_client(user_id: int, username: str) -> dict:
     """Строит dict с данными клиента для API."""
     return {
-        "clients": [{
-            "id": str(user_id),
-            "flow": "xtls-rprx-vision",
-            "email": username,
-            "limitIp": 0,
-            "totalGB": 0,
-            "expiryTime": 0,
-            "enable": True,
-            "tgId": str(user_id),
-            "subId": "",
-            "comment": "",
-            "reset": 0
-        }]
+        "id": str(user_id),
+        "flow": "xtls-rprx-vision",
+        "email": username,
+        "limitIp": 0,
+        "totalGB": 0,
+        "expiryTime": 0,
+        "enable": True,
+        "tgId": str(user_id),
+        "subId": "",
+        "comment": "",
+        "reset": 0
     }
 
-def get_authorized_session():
-    session = requests.Session()
-    session.verify = VERIFY
-    resp = session.post(
-        f"{API_URL}/login",
-        data={"username": f'{API_AUTH_LOGIN}', "password": f'{API_AUTH_PASSWORD}'},
-        timeout=5
-    )
-    resp.raise_for_status()
-    logger.info("Authenticated successfully")
-    return session
 
+def _build_client_info(batch: List[Tuple[int, str]]) -> dict:
+    """Строит settings для addClient из пар (user_id, username)."""
+    return {"clients": [_build_client(user_id, username) for user_id, username in batch]}
 
-def list_inbounds(session: requests.Session) -> list:
-    """Возвращает список inbound-конфигураций"""
-    resp = session.get(
-        f"{API_URL}/panel/api/inbounds/list",
-        timeout=5
-    )
-    resp.raise_for_status()
-    data = resp.json()
-    inbounds = data.get("obj", [])
-    logger.info(f"Found {len(inbounds)} active inbounds")
-    return inbounds
 
+class PanelAuthError(Exception):
+    """Панель не приняла логин: это не сбой панели, размыкатель его не считает."""
 
-def get_first_inbound(session: requests.Session) -> int:
-    inbound = list_inbounds(session)[0]
-    logger.info(f"Using inbound with id={inbound['id']}")
-    return inbound['id']
 
-def add_client(user_id: int, username: str) -> bool:
-    """Добавляет клиента в первый inbound по Telegram ID"""
-    try:
-        session = get_authorized_session()
-        inbound_id = get_first_inbound(session)
-        logger.info(f'Registering user with id={user_id} to inbound with id={inbound_id}')
-
-        client_info = _build_client_info(user_id, username)
-        payload = {
-            "id": inbound_id,
-            "settings": json.dumps(client_info)
-        }
-        resp = session.post(
-            f"{API_URL}/panel/api/inbounds/addClient",
-            json=payload,
-            timeout=5
-        )
+def _add_clients_payload(inbound_id: int, batch: List[Tuple[int, str]]) -> dict:
+    return {"id": inbound_id, "settings": json.dumps(_build_client_info(batch))}
+
+
+def _registered(data: dict, inbound_id: int, batch: List[Tuple[int, str]]) -> bool:
+    """Разбирает ответ addClient."""
+    user_ids = [user_id for user_id, _ in batch]
+    if data.get("success"):
+        logger.info("Users with ids=%s have been registered successfully", user_ids)
+        return True
+    logger.error(f"Registering users with ids={user_ids} to inbound with id={inbound_id} failed: {data.get('msg')}")
+    return False
+
+
+def _update_payload(inbound: dict, changes: Dict[str, dict]) -> dict:
+    """Тело запроса update: inbound с изменёнными полями клиентов (по tgId)."""
+    settings = _ensure_dict(inbound.get("settings", {}))
+    for client in settings.get("clients", []):
+        fields = changes.get(str(client.get("tgId")))
+        if fields:
+            client.update(fields)
+    payload = {key: value for key, value in inbound.items() if key != "clientStats"}
+    payload["settings"] = json.dumps(settings)
+    return payload
+
+
+def _updated(data: dict, panel_name: str, inbound_id: int, changes: Dict[str, dict]) -> bool:
+    """Разбирает ответ update."""
+    if data.get("success"):
+        logger.info("Updated %s clients in inbound with id=%s on panel %s", len(changes), inbound_id, panel_name)
+        return True
+    logger.error(f"Updating clients in inbound with id={inbound_id} failed: {data.get('msg')}")
+    return False
+
+
+def _is_outage(exc: Exception) -> bool:
+    """Сбой самой панели: нет соединения, таймаут или ответ 5xx."""
+    if isinstance(exc, requests.HTTPError):
+        return exc.response is None or exc.response.status_code >= 500
+    return isinstance(exc, requests.RequestException)
+
+
+class _Waiter:
+    """Поток, ждущий сессию: получает её саму или место, чтобы создать новую."""
+
+    __slots__ = ("ready", "session")
+
+    def __init__(self):
+        self.ready = threading.Event()
+        self.session: Optional[requests.Session] = None
+
+
+class SessionPool:
+    """
+    Пул долгоживущих авторизованных сессий к панели 3x-ui.
+    Каждая сессия держит keep-alive соединение и логинится повторно только
+    когда панель отвечает 401 или редиректит на страницу входа.
+    Все запросы проходят через размыкатель панели breaker.
+    """
+
+    def __init__(self, base_url: str, login: str, password: str, breaker: CircuitBreaker, size: int = 1):
+        self.base_url = base_url
+        self.breaker = breaker
+        self._credentials = {"username": f"{login}", "password": f"{password}"}
+        self._size = max(1, size)
+        # Свободные сессии, последняя возвращённая выдаётся первой
+        self._idle: List[requests.Session] = []
+        # Ждущие сессию в порядке очереди, сессия передаётся первому из них
+        self._waiters = deque()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _login(self, session: requests.Session) -> None:
+        with panel_load.timer("/login"):
+            resp = session.post(
+                f"{self.base_url}/login",
+                data=self._credentials,
+                timeout=API_TIMEOUT,
+            )
         resp.raise_for_status()
-        data = resp.json()
-        if data.get("success"):
-            logger.info(f"User with id={user_id} has been registered successfully")
-            return True
-        else:
-            logger.error(f"Registering user with id={user_id} to inbound with id={inbound_id} failed: {data.get('msg')}")
-            return False
-    except Exception as e:
-        logger.error(f"Exception while adding client: {e}", exc_info=True)
-        return False
+        logger.info("Authenticated successfully")
 
-def get_connection_string(user_id: int) -> Optional[str]:
-    """Возвращает строку подключения для пользователя по Telegram ID"""
-    try:
-        session = get_authorized_session()
-        inbounds = list_inbounds(session)
-        target = str(user_id)
+    def _new_session(self) -> requests.Session:
+        session = requests.Session()
+        session.verify = VERIFY
+        self._login(session)
+        return session
 
-        inbound, client = _extract_client_and_inbound(inbounds, target)
-        if not inbound or not client:
-            logger.warning(f"User with id={target} not found in any inbound")
-            return None
+    @staticmethod
+    def _is_auth_required(resp: requests.Response) -> bool:
+        """Панель либо отвечает 401, либо редиректит неавторизованный запрос на вход."""
+        return resp.status_code == 401 or resp.is_redirect
+
+    def _acquire(self) -> requests.Session:
+        waiter = None
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+            if self._created < self._size:
+                self._created += 1
+            else:
+                waiter = _Waiter()
+                self._waiters.append(waiter)
+        if waiter is not None:
+            if not waiter.ready.wait(API_TIMEOUT):
+                with self._lock:
+                    if not waiter.ready.is_set():
+                        self._waiters.remove(waiter)
+                        raise requests.Timeout(f"No free session to {self.base_url} within {API_TIMEOUT}s")
+            if waiter.session is not None:
+                return waiter.session
+            # Получили место сессии, которую не удалось создать другому потоку
+        try:
+            return self._new_session()
+        except BaseException:
+            with self._lock:
+                if self._waiters:
+                    self._waiters.popleft().ready.set()
+                else:
+                    self._created -= 1
+            raise
+
+    def _release(self, session: requests.Session) -> None:
+        with self._lock:
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                waiter.session = session
+                waiter.ready.set()
+            else:
+                self._idle.append(session)
+
+    @contextmanager
+    def session(self):
+        """
+        Выдаёт сессию в монопольное пользование на время блока with.
+        Если все size сессий заняты дольше API_TIMEOUT, бросает requests.Timeout.
+        """
+        session = self._acquire()
+        try:
+            yield session
+        finally:
+            self._release(session)
+
+    def _send(self, session: requests.Session, method: str, path: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", API_TIMEOUT)
+        kwargs["allow_redirects"] = False
+        url = f"{self.base_url}{path}"
+        with panel_load.timer(path):
+            resp = session.request(method, url, **kwargs)
+            if self._is_auth_required(resp):
+                logger.info("Session expired (%s), re-authenticating", resp.status_code)
+                resp.close()
+                self._login(session)
+                resp = session.request(method, url, **kwargs)
+                if self._is_auth_required(resp):
+                    resp.close()
+                    raise PanelAuthError(f"Panel {self.base_url} rejected credentials for {path}")
+            resp.raise_for_status()
+            return resp
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """Выполняет запрос к панели, при истёкшей сессии логинится и повторяет его."""
+        with self.breaker.guard(_is_outage), self.session() as session:
+            return self._send(session, method, path, **kwargs)
+
+    @contextmanager
+    def stream(self, method: str, path: str, **kwargs):
+        """То же, что request, но тело ответа читается потоком внутри блока with."""
+        with self.breaker.guard(_is_outage), self.session() as session:
+            resp = self._send(session, method, path, stream=True, **kwargs)
+            try:
+                yield resp
+            finally:
+                resp.close()
+
+
+# Поля inbound'а, нужные для поиска клиента и сборки строки подключения
+_LOOKUP_FIELDS = ("id", "protocol", "port", "remark", "settings", "streamSettings")
+_SCALAR_EVENTS = ("string", "number", "boolean", "null")
+
+
+class _InboundAssembler:
+    """Собирает inbound'ы с полями _LOOKUP_FIELDS из событий ijson.parse."""
 
-        logger.debug(f"Found client in inbound id={inbound.get('id')}")
-        protocol = inbound.get("protocol", "")
-        host = urlparse(API_URL).hostname or ""
-        port = inbound.get("port", "")
+    def __init__(self):
+        self._inbound = None
 
-        settings = _parse_stream_settings(inbound.get("streamSettings", {}))
+    def feed(self, prefix: str, event: str, value) -> Optional[dict]:
+        """Возвращает inbound, когда он разобран целиком, иначе None."""
+        if prefix == "obj.item":
+            if event == "start_map":
+                self._inbound = {}
+            elif event == "end_map":
+                inbound, self._inbound = self._inbound, None
+                return inbound
+        elif self._inbound is not None and event in _SCALAR_EVENTS:
+            key = prefix[len("obj.item."):]
+            if key in _LOOKUP_FIELDS:
+                self._inbound[key] = value
+        return None
 
+
+def _lookup_fields(inbounds: list) -> Iterator[dict]:
+    for inbound in inbounds or []:
+        yield {key: inbound.get(key) for key in _LOOKUP_FIELDS}
+
+
+def _iter_inbounds(resp: requests.Response) -> Iterator[dict]:
+    """
+    Перебирает inbound'ы из ответа inbounds/list, оставляя только
+    _LOOKUP_FIELDS. С ijson ответ читается потоком: в памяти держится
+    один inbound, а clientStats и прочие поля пропускаются без разбора.
+    """
+    if ijson is None:
+        yield from _lookup_fields(resp.json().get("obj"))
+        return
+
+    resp.raw.decode_content = True
+    assembler = _InboundAssembler()
+    for prefix, event, value in ijson.parse(resp.raw):
+        inbound = assembler.feed(prefix, event, value)
+        if inbound is not None:
+            yield inbound
+
+
+def find_in_inbounds(inbounds, user_id: int):
+    """
+    Ищет клиента с tgId=user_id среди inbound'ов и останавливается на первом
+    совпадении. settings раскодируются только у inbound'ов, в тексте которых
+    встречается user_id. Возвращает (inbound, client) или (None, None).
+    """
+    target = str(user_id)
+    for inbound in inbounds:
+        settings = inbound.get("settings")
+        if isinstance(settings, str) and target not in settings:
+            continue
+        for client in _ensure_dict(settings).get("clients", []):
+            if str(client.get("tgId")) == target:
+                return inbound, client
+    return None, None
+
+
+class ConnectionTemplate:
+    """
+    Заранее собранная строка подключения inbound'а: протокол, хост, порт,
+    параметры streamSettings и remark кодируются один раз, а для клиента
+    подставляются только id, flow и email.
+    """
+
+    def __init__(self, host: str, inbound: dict, settings: dict):
         params = {
             "type":     settings["network"],
             "security": settings["security"],
@@ -151,24 +353,602 @@ def get_connection_string(user_id: int) -> Optional[str]:
             "sid":      settings["short_id"],
             "spx":      settings["spider_x"],
         }
+        query = urlencode(params, quote_via=quote_plus, safe="")
+        self._scheme = f"{inbound.get('protocol', '')}://"
+        self._address = f"@{host}:{inbound.get('port', '')}?{query}"
+        # quote кодирует посимвольно, поэтому remark можно закодировать заранее
+        self._fragment = "#" + quote(f"{inbound.get('remark', '')}-", safe="")
+
+    def render(self, client: dict) -> str:
         flow = client.get("flow") or ""
-        if flow:
-            params["flow"] = flow
+        flow_param = f"&flow={quote_plus(flow, safe='')}" if flow else ""
+        email = quote(f"{client.get('email', '')}", safe="")
+        return f"{self._scheme}{client.get('id', '')}{self._address}{flow_param}{self._fragment}{email}"
 
-        query = urlencode(params, quote_via=quote_plus, safe="")
-        remark = inbound.get("remark", "")
-        email = client.get("email", "")
-        fragment = f"{remark}-{email}"
-        fragment_enc = quote(fragment, safe="")
 
-        client_id = client.get("id", "")
-        conn_string = f"{protocol}://{client_id}@{host}:{port}?{query}#{fragment_enc}"
+class InboundSnapshot:
+    """
+    Снимок списка inbound-конфигураций с индексом клиентов по tgId,
+    заранее разобранными streamSettings каждого inbound и шаблонами
+    строк подключения.
+    """
+
+    def __init__(self, inbounds: list):
+        self.inbounds = inbounds
+        self.created_at = time.monotonic()
+        self.clients = {}
+        self.client_counts = {}
+        self.stream_settings = {}
+        self._templates: Dict[int, ConnectionTemplate] = {}
+        for inbound in inbounds:
+            self.stream_settings[inbound.get("id")] = _parse_stream_settings(
+                inbound.get("streamSettings", {})
+            )
+            settings = _ensure_dict(inbound.get("settings", {}))
+            clients = settings.get("clients", [])
+            self.client_counts[inbound.get("id")] = len(clients)
+            for client in clients:
+                tg_id = client.get("tgId")
+                if tg_id and str(tg_id) not in self.clients:
+                    self.clients[str(tg_id)] = (inbound, client)
+
+    def find(self, user_id: str):
+        """Находит inbound и client по tgId."""
+        return self.clients.get(user_id, (None, None))
+
+    def template(self, inbound: dict, host: str) -> ConnectionTemplate:
+        """Шаблон строки подключения inbound'а, собирается один раз на снимок."""
+        inbound_id = inbound.get("id")
+        template = self._templates.get(inbound_id)
+        if template is None:
+            template = ConnectionTemplate(host, inbound, self.stream_settings[inbound_id])
+            self._templates[inbound_id] = template
+        return template
+
+
+class InboundCache:
+    """
+    Кэширует снимок inbound-конфигураций на ttl секунд.
+    После изменений на панели кэш нужно сбросить через invalidate().
+    Устаревший по ttl снимок отдаётся, пока его обновляет другой поток,
+    а последний удачный — пока панель недоступна.
+    """
+
+    def __init__(self, fetch, ttl: float):
+        self._fetch = fetch
+        self._ttl = ttl
+        self._snapshot = None
+        self.last_good = None
+        self._lock = threading.Lock()
+
+    def _is_fresh(self, snapshot) -> bool:
+        return (
+            snapshot is not None
+            and time.monotonic() - snapshot.created_at < self._ttl
+        )
+
+    def get(self) -> InboundSnapshot:
+        snapshot = self._snapshot
+        if self._is_fresh(snapshot):
+            count_cache("inbounds", True)
+            return snapshot
+        # Сброшенный через invalidate снимок ждём: в старом нет свежих изменений
+        if snapshot is None:
+            self._lock.acquire()
+        elif not self._lock.acquire(blocking=False):
+            count_cache("inbounds_stale", True)
+            return snapshot
+        try:
+            # Пока ждали блокировку, снимок мог обновить другой поток
+            snapshot = self._snapshot
+            if self._is_fresh(snapshot):
+                count_cache("inbounds", True)
+                return snapshot
+            count_cache("inbounds", False)
+            try:
+                snapshot = InboundSnapshot(self._fetch())
+            except Exception as e:
+                if self.last_good is None:
+                    raise
+                count_cache("inbounds_stale", True)
+                logger.warning(f"Serving stale inbounds snapshot: {e}")
+                return self.last_good
+            self._snapshot = self.last_good = snapshot
+            return snapshot
+        finally:
+            self._lock.release()
+
+    def invalidate(self) -> None:
+        self._snapshot = None
+
+
+class Panel:
+    """
+    Панель 3x-ui: пул сессий, кэш снимка inbound-конфигураций и список
+    inbound'ов, в которые разрешено добавлять новых клиентов.
+    """
+
+    def __init__(self, name: str, url: str, login: str, password: str, inbounds=None):
+        self.name = name
+        self.url = url
+        self.host = urlparse(url).hostname or ""
+        self.inbound_ids = set(inbounds) if inbounds else None
+        self.breaker = CircuitBreaker(
+            name, PANEL_BREAKER_THRESHOLD, PANEL_BREAKER_RESET, start_replay
+        )
+        self.pool = SessionPool(url, login, password, self.breaker, API_SESSION_POOL_SIZE)
+        self.cache = InboundCache(self.fetch_inbounds, INBOUNDS_CACHE_TTL)
+        # update перезаписывает settings inbound'а целиком, поэтому изменения
+        # клиентов одной панели не должны пересекаться
+        self._write_lock = threading.Lock()
+
+    def accepts(self, inbound_id: int) -> bool:
+        return self.inbound_ids is None or inbound_id in self.inbound_ids
+
+    def list_inbounds(self) -> list:
+        """Возвращает список inbound-конфигураций"""
+        resp = self.pool.request("GET", "/panel/api/inbounds/list")
+        data = resp.json()
+        inbounds = data.get("obj", [])
+        logger.info("Found %s active inbounds on panel %s", len(inbounds), self.name)
+        return inbounds
+
+    def fetch_inbounds(self) -> list:
+        """inbounds/list для снимка: из кэша, общего для экземпляров бота, при промахе — с панели."""
+        inbounds, generation = shared_inbounds.get(self.name)
+        if inbounds is None:
+            inbounds = self.list_inbounds()
+            shared_inbounds.put(self.name, inbounds, generation)
+        return inbounds
+
+    def invalidate(self) -> None:
+        """Сбрасывает снимок после изменений на панели — здесь и у других экземпляров бота."""
+        self.cache.invalidate()
+        shared_inbounds.invalidate(self.name)
+
+    def _add_clients_to_inbound(self, inbound_id: int, batch: List[Tuple[int, str]]) -> bool:
+        """Регистрирует пачку клиентов в inbound одним запросом addClient."""
+        try:
+            resp = self.pool.request(
+                "POST", "/panel/api/inbounds/addClient", json=_add_clients_payload(inbound_id, batch)
+            )
+            return _registered(resp.json(), inbound_id, batch)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error(f"Exception while adding clients: {e}", exc_info=True)
+            return False
+
+    def register_clients(
+        self, inbound_id: int, batch: List[Tuple[int, str]], results: Optional[Dict[int, bool]] = None
+    ) -> Dict[int, bool]:
+        """
+        Добавляет клиентов в inbound по API_BATCH_SIZE за запрос и возвращает
+        успех по каждому user_id. results заполняется по ходу, так что после
+        CircuitOpenError в нём видно, до кого очередь успела дойти.
+        """
+        results = {} if results is None else results
+        try:
+            with self._write_lock:
+                for start in range(0, len(batch), API_BATCH_SIZE):
+                    chunk = batch[start:start + API_BATCH_SIZE]
+                    if self._add_clients_to_inbound(inbound_id, chunk):
+                        results.update((user_id, True) for user_id, _ in chunk)
+                    elif len(chunk) > 1:
+                        # Панель отклоняет пачку целиком, если хотя бы один клиент
+                        # не подходит (например, email уже занят), поэтому повторяем по одному
+                        for item in chunk:
+                            results[item[0]] = self._add_clients_to_inbound(inbound_id, [item])
+                    else:
+                        results[chunk[0][0]] = False
+        finally:
+            if any(results.values()):
+                self.invalidate()
+        return results
+
+    def add_clients_to_inbound(self, inbound_id: int, batch: List[Tuple[int, str]]) -> Dict[int, bool]:
+        """
+        То же, что register_clients, но клиенты, до которых не дошла очередь
+        из-за разомкнутого размыкателя, откладываются до восстановления панели
+        и считаются добавленными.
+        """
+        logger.info("Registering %s users to inbound with id=%s on panel %s", len(batch), inbound_id, self.name)
+        results = {}
+        try:
+            return self.register_clients(inbound_id, batch, results)
+        except CircuitOpenError:
+            results.update(_defer_clients(self, inbound_id, batch, results))
+            return results
+
+    def find_client(self, user_id: int):
+        """
+        Ищет клиента потоковым разбором inbounds/list, не собирая снимок.
+        Возвращает (inbound, client, stream_settings) или (None, None, None).
+        """
+        with self.pool.stream("GET", "/panel/api/inbounds/list") as resp:
+            inbound, client = find_in_inbounds(_iter_inbounds(resp), user_id)
+        if client is None:
+            return None, None, None
+        return inbound, client, _parse_stream_settings(inbound.get("streamSettings", {}))
+
+    def _update_inbound(self, inbound: dict, changes: Dict[str, dict]) -> bool:
+        """Применяет изменения клиентов (по tgId) к inbound одним запросом update."""
+        inbound_id = inbound.get("id")
+        try:
+            resp = self.pool.request(
+                "POST", f"/panel/api/inbounds/update/{inbound_id}", json=_update_payload(inbound, changes)
+            )
+            return _updated(resp.json(), self.name, inbound_id, changes)
+        except Exception as e:
+            logger.error(f"Exception while updating clients: {e}", exc_info=True)
+            return False
+
+    def update_clients(self, changes: Dict[int, Dict[str, dict]]) -> Dict[int, bool]:
+        """
+        Меняет поля клиентов: changes — {inbound_id: {tgId: поля}}.
+        Настройки inbound'ов берутся с панели заново, под блокировкой записи,
+        и каждый inbound обновляется одним запросом. Возвращает успех по inbound'ам.
+        """
+        with self._write_lock:
+            try:
+                inbounds = {inbound.get("id"): inbound for inbound in self.list_inbounds()}
+            except Exception as e:
+                logger.error(f"Failed to fetch inbounds from panel {self.name}: {e}")
+                return {inbound_id: False for inbound_id in changes}
+            results = {}
+            for inbound_id, group in changes.items():
+                inbound = inbounds.get(inbound_id)
+                if inbound is None:
+                    logger.error(f"Inbound with id={inbound_id} not found on panel {self.name}")
+                    results[inbound_id] = False
+                    continue
+                results[inbound_id] = self._update_inbound(inbound, group)
+        self.invalidate()
+        return results
+
+
+def _defer_clients(panel, inbound_id: int, batch: List[Tuple[int, str]], done: Dict[int, bool]) -> Dict[int, bool]:
+    """
+    Откладывает регистрацию клиентов из batch, которых нет в done.
+    Запрос к панели для них либо не уходил, либо упал без ответа; если
+    панель всё же успела его выполнить, повтор она отклонит как дубль.
+    """
+    deferred = [(user_id, username) for user_id, username in batch if user_id not in done]
+    add_pending_clients([
+        {"user_id": user_id, "username": username, "panel": panel.name, "inbound_id": inbound_id}
+        for user_id, username in deferred
+    ])
+    logger.warning(
+        "Panel %s is unavailable, deferred registration of %s users", panel.name, len(deferred)
+    )
+    return {user_id: True for user_id, _ in deferred}
+
+
+def group_pending_clients(pending: List[dict]) -> Dict[Tuple[str, int], List[Tuple[int, str]]]:
+    """Раскладывает отложенных клиентов по (панель, inbound)."""
+    groups = {}
+    for entry in pending:
+        groups.setdefault((entry["panel"], entry["inbound_id"]), []).append(
+            (entry["user_id"], entry["username"])
+        )
+    return groups
+
+
+def _count_replayed(panel_name: str, results: Dict[int, bool]) -> None:
+    for user_id, ok in results.items():
+        PANEL_REPLAYED_CLIENTS.labels("ok" if ok else "rejected").inc()
+        if not ok:
+            logger.error(f"Panel {panel_name} rejected deferred user with id={user_id}")
+
+
+def _rejected(results: Dict[int, bool]) -> List[int]:
+    return [user_id for user_id, ok in results.items() if not ok]
+
+
+def _check_duplicate(panel_name: str, user_id: int, client, results: Dict[int, bool]) -> None:
+    """
+    Отклонённый повтор мог быть дублем: панель выполнила первый запрос, но
+    ответ не дошёл. Найденный на панели клиент считается зарегистрированным.
+    """
+    if client is not None:
+        logger.info(f"Deferred user with id={user_id} is already registered on panel {panel_name}")
+        results[user_id] = True
+
+
+def take_pending_clients() -> List[dict]:
+    """
+    Забирает отложенных клиентов на повтор. Повтор запускают все экземпляры
+    бота, а удаление атомарно, поэтому каждого клиента забирает ровно один.
+    """
+    return remove_pending_clients([entry["user_id"] for entry in load_pending_clients()])
+
+
+def return_pending_clients(taken: List[dict], done: List[int]) -> None:
+    """Возвращает в отложенные забранных клиентов, которых не удалось обработать."""
+    done = set(done)
+    add_pending_clients([entry for entry in taken if entry["user_id"] not in done])
+
+
+_replay_lock = threading.Lock()
+# Вызывается с user_id одобренных пользователей, чью отложенную регистрацию
+# панель отклонила; задаётся в start_replay
+_on_rejected: Optional[Callable[[List[int]], None]] = None
+
+
+def replay_pending_clients() -> int:
+    """
+    Регистрирует клиентов, отложенных, пока их панель была недоступна.
+    Панели с разомкнутым размыкателем пропускаются до следующего раза.
+    Клиентов, которых панель отклонила, получает _on_rejected.
+    Возвращает число обработанных клиентов.
+    """
+    if not _replay_lock.acquire(blocking=False):
+        return 0
+    try:
+        taken = take_pending_clients()
+        done = []
+        rejected = []
+        try:
+            for (name, inbound_id), batch in group_pending_clients(taken).items():
+                panel = _panels_by_name.get(name)
+                if panel is None:
+                    logger.error(f"Panel {name} of deferred users is not configured")
+                    continue
+                results = {}
+                try:
+                    panel.register_clients(inbound_id, batch, results)
+                    for user_id in _rejected(results):
+                        _check_duplicate(name, user_id, panel.find_client(user_id)[1], results)
+                except Exception as e:
+                    # Без ответа панели отклонённые остаются отложенными до следующего раза
+                    if not isinstance(e, CircuitOpenError):
+                        logger.error(f"Failed to look up rejected deferred users on panel {name}: {e}")
+                    for user_id in _rejected(results):
+                        del results[user_id]
+                _count_replayed(name, results)
+                done += results
+                rejected += _rejected(results)
+        finally:
+            return_pending_clients(taken, done)
+        if done:
+            logger.info("Replayed %s deferred client registrations", len(done))
+        if rejected and _on_rejected is not None:
+            _on_rejected(rejected)
+        return len(done)
+    finally:
+        _replay_lock.release()
+
+
+def start_replay(on_rejected: Optional[Callable[[List[int]], None]] = None) -> threading.Thread:
+    """
+    Повторяет отложенные регистрации в фоновом потоке. on_rejected
+    запоминается и для повторов после восстановления панели.
+    """
+    global _on_rejected
+    if on_rejected is not None:
+        _on_rejected = on_rejected
+    thread = threading.Thread(target=replay_pending_clients, name="panel-replay", daemon=True)
+    thread.start()
+    return thread
+
+
+def _load_panel_configs() -> List[dict]:
+    """
+    Читает список панелей из PANELS_FILE: [{"name", "url", "login",
+    "password", "inbounds": [id, ...]}, ...]. Поле inbounds необязательное.
+    Без PANELS_FILE используется одна панель из API_URL.
+    """
+    if not PANELS_FILE:
+        return [{
+            "name": "default",
+            "url": API_URL,
+            "login": API_AUTH_LOGIN,
+            "password": API_AUTH_PASSWORD,
+        }]
+    with open(PANELS_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+panels = [Panel(**cfg) for cfg in _load_panel_configs()]
+_panels_by_name = {panel.name: panel for panel in panels}
+
+
+def invalidate_inbounds_cache() -> None:
+    for panel in panels:
+        panel.cache.invalidate()
+
+
+def _drop_cache(panel_name: str) -> None:
+    panel = _panels_by_name.get(panel_name)
+    if panel is not None:
+        panel.cache.invalidate()
+
+
+def start_cache_listener():
+    """Сбрасывает снимки панелей, изменённых другими экземплярами бота."""
+    return shared_inbounds.listen(_drop_cache)
+
+
+def _remember_placements(entries: List[dict]) -> None:
+    # С одной панелью искать владельца клиента не нужно
+    if entries and len(panels) > 1:
+        set_placements(entries)
+
+
+def _placement_candidates() -> list:
+    candidates = []
+    for panel in panels:
+        try:
+            candidates += inbound_candidates(panel, panel.cache.get())
+        except Exception as e:
+            logger.error(f"Panel {panel.name} is unavailable for placement: {e}")
+    return candidates
+
+
+def add_clients(batch: List[Tuple[int, str]]) -> Dict[int, bool]:
+    """
+    Добавляет клиентов из пар (user_id, username) в наименее нагруженные
+    inbound'ы всех панелей. Возвращает успех по каждому user_id.
+    """
+    if not batch:
+        return {}
+    try:
+        plan = assign(batch, _placement_candidates(), PLACEMENT_STRATEGY)
+    except Exception as e:
+        logger.error(f"Exception while adding clients: {e}", exc_info=True)
+        return {user_id: False for user_id, _ in batch}
+
+    results = {}
+    placements = []
+    for candidate, users in plan:
+        added = candidate.panel.add_clients_to_inbound(candidate.inbound_id, users)
+        results.update(added)
+        placements += [
+            {"user_id": user_id, "panel": candidate.panel.name, "inbound_id": candidate.inbound_id}
+            for user_id, ok in added.items() if ok
+        ]
+    _remember_placements(placements)
+    return results
+
+
+def add_client(user_id: int, username: str) -> bool:
+    """Добавляет клиента в наименее нагруженный inbound по Telegram ID"""
+    return add_clients([(user_id, username)])[user_id]
+
+
+def _owner_panel(user_id: int) -> Optional[Panel]:
+    if len(panels) < 2:
+        return None
+    placement = get_placement(user_id)
+    return placement and _panels_by_name.get(placement["panel"])
+
+
+def _find_client(user_id: int):
+    """
+    Находит панель и снимок, в которых есть клиент с данным tgId.
+    Сначала проверяет панель-владельца, затем остальные.
+    """
+    target = str(user_id)
+    owner = _owner_panel(user_id)
+    # Недоступная панель-владелец пропускается так же, как остальные
+    ordered = [owner] + [p for p in panels if p is not owner] if owner else panels
+    for panel in ordered:
+        try:
+            snapshot = panel.cache.get()
+        except Exception as e:
+            logger.error(f"Failed to fetch inbounds from panel {panel.name}: {e}")
+            continue
+        inbound, client = snapshot.find(target)
+        if client:
+            if panel is not owner:
+                _remember_placements(
+                    [{"user_id": user_id, "panel": panel.name, "inbound_id": inbound.get("id")}]
+                )
+            return panel, snapshot, inbound, client
+    return None, None, None, None
+
+
+def _find_in_last_good(snapshot: Optional[InboundSnapshot], user_id: int):
+    """Ищет клиента в последнем удачном снимке панели, если он есть."""
+    if snapshot is None:
+        return None, None, None
+    inbound, client = snapshot.find(str(user_id))
+    return inbound, client, inbound and snapshot.stream_settings[inbound.get("id")]
+
+
+def _find_client_streaming(user_id: int):
+    """
+    То же, что _find_client, но без снимков: панели опрашиваются по очереди
+    потоковым разбором, начиная с панели-владельца.
+    Возвращает (panel, inbound, client, stream_settings).
+    """
+    owner = _owner_panel(user_id)
+    ordered = [owner] + [p for p in panels if p is not owner] if owner else panels
+    for panel in ordered:
+        try:
+            inbound, client, settings = panel.find_client(user_id)
+        except Exception as e:
+            logger.error(f"Failed to fetch inbounds from panel {panel.name}: {e}")
+            inbound, client, settings = _find_in_last_good(panel.cache.last_good, user_id)
+        if client:
+            if panel is not owner:
+                _remember_placements(
+                    [{"user_id": user_id, "panel": panel.name, "inbound_id": inbound.get("id")}]
+                )
+            return panel, inbound, client, settings
+    return None, None, None, None
+
+
+def _group_by_inbound(changes: Dict[int, dict], located: dict) -> Tuple[dict, Dict[int, bool]]:
+    """
+    Раскладывает изменения клиентов по панелям и inbound'ам.
+    located — {user_id: (panel, inbound)} для найденных клиентов.
+    """
+    groups = {}
+    missing = {}
+    for user_id, fields in changes.items():
+        panel, inbound = located.get(user_id, (None, None))
+        if inbound is None:
+            logger.warning(f"User with id={user_id} not found in any inbound")
+            missing[user_id] = False
+            continue
+        groups.setdefault(panel, {}).setdefault(inbound.get("id"), {})[str(user_id)] = fields
+    return groups, missing
+
+
+def update_clients(changes: Dict[int, dict]) -> Dict[int, bool]:
+    """
+    Меняет поля клиентов (например, expiryTime и enable) по Telegram ID.
+    Изменения группируются так, что на каждый inbound уходит один запрос.
+    Возвращает успех по каждому user_id.
+    """
+    located = {}
+    for user_id in changes:
+        panel, _, inbound, _ = _find_client(user_id)
+        if inbound is not None:
+            located[user_id] = (panel, inbound)
+    groups, results = _group_by_inbound(changes, located)
+    for panel, by_inbound in groups.items():
+        updated = panel.update_clients(by_inbound)
+        for inbound_id, group in by_inbound.items():
+            results.update((int(tg_id), updated[inbound_id]) for tg_id in group)
+    return results
+
+
+def iter_connection_strings(panel: Panel, inbound_id: int) -> Iterator[Tuple[dict, str]]:
+    """
+    Строки подключения всех клиентов inbound'а за один проход:
+    шаблон собирается один раз, для клиента остаётся одна подстановка.
+    """
+    snapshot = panel.cache.get()
+    inbound = next((i for i in snapshot.inbounds if i.get("id") == inbound_id), None)
+    if inbound is None:
+        raise ValueError(f"Inbound with id={inbound_id} not found on panel {panel.name}")
+    template = snapshot.template(inbound, panel.host)
+    for client in _ensure_dict(inbound.get("settings", {})).get("clients", []):
+        yield client, template.render(client)
+
+
+def get_connection_string(user_id: int) -> Optional[str]:
+    """Возвращает строку подключения для пользователя по Telegram ID"""
+    try:
+        if CLIENT_LOOKUP == "stream":
+            panel, inbound, client, settings = _find_client_streaming(user_id)
+            template = inbound and ConnectionTemplate(panel.host, inbound, settings)
+        else:
+            panel, snapshot, inbound, client = _find_client(user_id)
+            template = inbound and snapshot.template(inbound, panel.host)
+        if not inbound or not client:
+            logger.warning(f"User with id={user_id} not found in any inbound")
+            return None
+
+        logger.debug("Found client in inbound id=%s on panel %s", inbound.get('id'), panel.name)
+        conn_string = template.render(client)
 
-        logger.info(f"Connection string for user with id={user_id} generated")
-        logger.debug(f"Connection string: {conn_string}")
+        logger.info("Connection string for user with id=%s generated", user_id)
 
         return conn_string
 
     except Exception as e:
         logger.error(f"Failed to generate connection string for user {user_id}: {e}", exc_info=True)
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,177 @@
+import asyncio
+from handlers import *
+import async_api_client
+from logger import api_logger as logger
+from telebot import types
+from telebot.asyncio_helper import ApiTelegramException
+from async_bot import bot, bounded, sender
+from metrics import timed_handler
+
+
+@bot.message_handler(commands=["admin"])
+@timed_handler
+@bounded
+async def cmd_admin(message: types.Message) -> None:
+    user_id = message.chat.id
+
+    if not await asyncio.to_thread(is_admin, user_id):
+        await bot.send_message(user_id, "⛔ Доступ запрещён")
+        return
+
+    # /admin <запрос> ищет по ID или части username
+    query = message.text.partition(" ")[2].strip()
+    if query:
+        text, markup = await asyncio.to_thread(admin_search, query)
+    else:
+        text, markup = await asyncio.to_thread(admin_page)
+    await bot.send_message(user_id, text, reply_markup=markup, parse_mode="Markdown")
+
+
+@bot.callback_query_handler(func=lambda c: c.data and c.data.startswith(ADMIN_PAGE_PREFIX))
+@timed_handler
+@bounded
+async def handle_admin_page(call: types.CallbackQuery) -> None:
+    """То же, что admin_handlers.handle_admin_page."""
+    if not await asyncio.to_thread(is_admin, call.from_user.id):
+        await bot.answer_callback_query(call.id, "Нет прав", show_alert=True)
+        return
+
+    try:
+        page = parse_admin_callback(call.data)
+    except ValueError:
+        logger.warning(f"Malformed admin page callback: {call.data}")
+        await bot.answer_callback_query(call.id, STALE_PAGE_TEXT, show_alert=True)
+        return
+
+    text, markup = await asyncio.to_thread(admin_page, *page)
+    try:
+        await bot.edit_message_text(
+            text,
+            call.message.chat.id,
+            call.message.message_id,
+            reply_markup=markup,
+            parse_mode="Markdown",
+        )
+    except ApiTelegramException as e:
+        if "message is not modified" not in e.description:
+            raise
+    await bot.answer_callback_query(call.id)
+
+
+async def approve_requests(caller_id: int, requests: list) -> tuple:
+    """То же, что admin_handlers.approve_requests."""
+    claimed = in_flight.claim_many(REQUEST_ACTION, [r['user_id'] for r in requests])
+    try:
+        requests = await asyncio.to_thread(take_requests, claimed)
+        results = await async_api_client.add_clients([(r['user_id'], r['username']) for r in requests])
+        return await asyncio.to_thread(settle_requests, sender, caller_id, requests, results)
+    finally:
+        in_flight.release(REQUEST_ACTION, *claimed)
+
+
+@bot.callback_query_handler(func=lambda c: c.data == "approve_all")
+@timed_handler
+@bounded
+async def handle_approve_all(call: types.CallbackQuery) -> None:
+    caller_id = call.from_user.id
+    if not await asyncio.to_thread(is_admin, caller_id):
+        await bot.answer_callback_query(call.id, "Нет прав", show_alert=True)
+        return
+
+    requests = await asyncio.to_thread(load_approval_requests)
+    if not requests:
+        await bot.answer_callback_query(call.id, "Заявок нет", show_alert=True)
+        return
+
+    approved, failed = await approve_requests(caller_id, requests)
+    await bot.answer_callback_query(call.id)
+    await bot.send_message(caller_id, approval_summary(approved, failed))
+
+
+@bot.message_handler(commands=["approve"])
+@timed_handler
+@bounded
+async def cmd_approve(message: types.Message) -> None:
+    """Одобряет выбранные заявки: /approve <id> [<id> ...]"""
+    caller_id = message.chat.id
+    if not await asyncio.to_thread(is_admin, caller_id):
+        await bot.send_message(caller_id, "⛔ Доступ запрещён")
+        return
+
+    try:
+        user_ids = [int(arg) for arg in message.text.split()[1:]]
+    except ValueError:
+        user_ids = []
+    if not user_ids:
+        await bot.send_message(caller_id, "Укажите ID пользователей: /approve <id> [<id> ...]")
+        return
+
+    requests = await asyncio.to_thread(get_approval_requests, user_ids)
+    if not requests:
+        await bot.send_message(caller_id, "Заявки не найдены или уже обработаны")
+        return
+
+    approved, failed = await approve_requests(caller_id, requests)
+    await bot.send_message(caller_id, approval_summary(approved, failed))
+
+
+@bot.callback_query_handler(func=lambda c: c.data and c.data.startswith("approve:"))
+@timed_handler
+@bounded
+async def handle_approve(call: types.CallbackQuery) -> None:
+    caller_id = call.from_user.id
+    if not await asyncio.to_thread(is_admin, caller_id):
+        await bot.answer_callback_query(call.id, "Нет прав", show_alert=True)
+        return
+
+    _, uid = call.data.split(":", 1)
+    user_id = int(uid)
+
+    with in_flight.single(REQUEST_ACTION, user_id) as claimed:
+        if not claimed:
+            await bot.answer_callback_query(call.id, "⏳ Заявка уже обрабатывается")
+            return
+
+        requests = await asyncio.to_thread(take_requests, [user_id])
+        if not requests:
+            await bot.answer_callback_query(call.id, "Заявка не найдена или уже обработана", show_alert=True)
+            return
+
+        results = {user_id: await async_api_client.add_client(user_id, requests[0]['username'])}
+        approved, _ = await asyncio.to_thread(settle_requests, sender, caller_id, requests, results)
+        if approved:
+            await bot.answer_callback_query(call.id, "Пользователь одобрен")
+        else:
+            await bot.answer_callback_query(call.id, "Ошибка при регистрации API", show_alert=True)
+
+
+@bot.callback_query_handler(func=lambda c: c.data and c.data.startswith("reject:"))
+@timed_handler
+@bounded
+async def handle_reject(call: types.CallbackQuery) -> None:
+    caller_id = call.from_user.id
+    if not await asyncio.to_thread(is_admin, caller_id):
+        await bot.answer_callback_query(call.id, "Нет прав", show_alert=True)
+        return
+
+    _, uid = call.data.split(":", 1)
+    user_id = int(uid)
+
+    with in_flight.single(REQUEST_ACTION, user_id) as claimed:
+        if not claimed:
+            await bot.answer_callback_query(call.id, "⏳ Заявка уже обрабатывается")
+            return
+
+        req = await asyncio.to_thread(remove_approval_request, user_id)
+        if not req:
+            await bot.answer_callback_query(call.id, "Заявка не найдена или уже обработана", show_alert=True)
+            return
+
+    username = req['username']
+    await bot.send_message(user_id, "❌ Ваша заявка отклонена администратором")
+    await bot.send_message(
+        caller_id,
+        f"🗑️ Вы отклонили заявку пользователя @{username} (id={user_id})"
+    )
+    await bot.answer_callback_query(call.id, "Заявка отклонена")
+    logger.info("Rejected user %s by admin %s", user_id, caller_id)
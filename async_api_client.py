@@ -0,0 +1,514 @@
+import asyncio
+import ssl
+import time
+import aiohttp
+from contextlib import asynccontextmanager
+from logger import api_logger as logger
+from urllib.parse import urlparse
+from config import (
+    VERIFY,
+    API_TIMEOUT,
+    API_SESSION_POOL_SIZE,
+    INBOUNDS_CACHE_TTL,
+    API_BATCH_SIZE,
+    PLACEMENT_STRATEGY,
+    CLIENT_LOOKUP,
+    PANEL_BREAKER_THRESHOLD,
+    PANEL_BREAKER_RESET,
+)
+from api_client import (
+    ConnectionTemplate,
+    InboundSnapshot,
+    PanelAuthError,
+    _InboundAssembler,
+    _add_clients_payload,
+    _check_duplicate,
+    _defer_clients,
+    _count_replayed,
+    _find_in_last_good,
+    _group_by_inbound,
+    _load_panel_configs,
+    _lookup_fields,
+    _parse_stream_settings,
+    _registered,
+    _rejected,
+    _update_payload,
+    _updated,
+    find_in_inbounds,
+    group_pending_clients,
+    ijson,
+    return_pending_clients,
+    take_pending_clients,
+)
+from breaker import CircuitBreaker, CircuitOpenError
+from handlers.storage import (
+    get_placement,
+    set_placements,
+)
+from placement import assign, inbound_candidates
+from ratelimit import panel_load
+from handlers.shared_cache import shared_inbounds
+from metrics import count_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+def _ssl_context(verify):
+    """VERIFY из конфига: False, True или путь к сертификату."""
+    if verify is False:
+        return False
+    if verify is True:
+        return None
+    return ssl.create_default_context(cafile=verify)
+
+
+def _is_outage(exc: Exception) -> bool:
+    """То же, что api_client._is_outage."""
+    if isinstance(exc, aiohttp.ClientResponseError):
+        return exc.status >= 500
+    return isinstance(exc, (aiohttp.ClientError, asyncio.TimeoutError))
+
+
+class AsyncPanelClient:
+    """
+    Асинхронный клиент панели 3x-ui. Все запросы идут через одну
+    aiohttp-сессию с общим пулом keep-alive соединений и общими cookie
+    авторизации. Повторный вход выполняется только при 401 или редиректе
+    на страницу входа, одновременные вызовы логинятся не более одного раза.
+    Запросы проходят через размыкатель панели, как в api_client.Panel.
+    """
+
+    def __init__(self, name: str, url: str, login: str, password: str, inbounds=None):
+        self.name = name
+        self.base_url = url
+        self.host = urlparse(url).hostname or ""
+        self.inbound_ids = set(inbounds) if inbounds else None
+        self._credentials = {"username": f"{login}", "password": f"{password}"}
+        self._pool_size = API_SESSION_POOL_SIZE
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._auth_generation = 0
+        self._auth_lock = asyncio.Lock()
+        self._snapshot: Optional[InboundSnapshot] = None
+        self.last_good: Optional[InboundSnapshot] = None
+        self._snapshot_lock = asyncio.Lock()
+        self.breaker = CircuitBreaker(
+            name, PANEL_BREAKER_THRESHOLD, PANEL_BREAKER_RESET, start_replay
+        )
+        self._write_lock = asyncio.Lock()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self._pool_size, ssl=_ssl_context(VERIFY)
+                ),
+                # Панель обычно доступна по IP, а cookie с IP-хостов
+                # стандартный CookieJar не принимает
+                cookie_jar=aiohttp.CookieJar(unsafe=True),
+                # Как у requests: таймаут на соединение и на каждое чтение, а не
+                # на весь ответ, иначе большой inbounds/list не успевает дочитаться.
+                # connect включает и ожидание свободного соединения пула
+                timeout=aiohttp.ClientTimeout(
+                    total=None,
+                    connect=API_TIMEOUT,
+                    sock_connect=API_TIMEOUT,
+                    sock_read=API_TIMEOUT,
+                ),
+            )
+        return self._session
+
+    def accepts(self, inbound_id: int) -> bool:
+        return self.inbound_ids is None or inbound_id in self.inbound_ids
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+    async def _login(self, seen_generation: int) -> None:
+        async with self._auth_lock:
+            # Другая корутина уже залогинилась, пока мы ждали
+            if self._auth_generation != seen_generation:
+                return
+            with panel_load.timer("/login"):
+                async with self._get_session().post(
+                    f"{self.base_url}/login", data=self._credentials
+                ) as resp:
+                    resp.raise_for_status()
+            self._auth_generation += 1
+            logger.info("Authenticated successfully")
+
+    @asynccontextmanager
+    async def stream(self, method: str, path: str, **kwargs):
+        """Открывает ответ панели; тело читается внутри блока async with."""
+        with self.breaker.guard(_is_outage):
+            url = f"{self.base_url}{path}"
+            if self._auth_generation == 0:
+                await self._login(0)
+            for _ in range(2):
+                generation = self._auth_generation
+                with panel_load.timer(path):
+                    async with self._get_session().request(
+                        method, url, allow_redirects=False, **kwargs
+                    ) as resp:
+                        if resp.status == 401 or 300 <= resp.status < 400:
+                            logger.info("Session expired (%s), re-authenticating", resp.status)
+                            await self._login(generation)
+                            continue
+                        resp.raise_for_status()
+                        yield resp
+                        return
+            raise PanelAuthError(f"Panel {self.base_url} rejected credentials for {path}")
+
+    async def request(self, method: str, path: str, **kwargs) -> dict:
+        """Выполняет запрос к панели и возвращает разобранный JSON-ответ."""
+        async with self.stream(method, path, **kwargs) as resp:
+            return await resp.json(content_type=None)
+
+    async def list_inbounds(self) -> list:
+        """Возвращает список inbound-конфигураций"""
+        data = await self.request("GET", "/panel/api/inbounds/list")
+        inbounds = data.get("obj", [])
+        logger.info("Found %s active inbounds on panel %s", len(inbounds), self.name)
+        return inbounds
+
+    async def get_snapshot(self) -> InboundSnapshot:
+        """То же, что api_client.InboundCache.get."""
+        snapshot = self._snapshot
+        if snapshot and time.monotonic() - snapshot.created_at < INBOUNDS_CACHE_TTL:
+            count_cache("inbounds", True)
+            return snapshot
+        if snapshot and self._snapshot_lock.locked():
+            count_cache("inbounds_stale", True)
+            return snapshot
+        async with self._snapshot_lock:
+            snapshot = self._snapshot
+            if snapshot and time.monotonic() - snapshot.created_at < INBOUNDS_CACHE_TTL:
+                count_cache("inbounds", True)
+                return snapshot
+            count_cache("inbounds", False)
+            try:
+                inbounds = await self.fetch_inbounds()
+                # Индекс разбирает settings каждого inbound'а, это работа для потока
+                snapshot = await asyncio.to_thread(InboundSnapshot, inbounds)
+            except Exception as e:
+                if self.last_good is None:
+                    raise
+                count_cache("inbounds_stale", True)
+                logger.warning(f"Serving stale inbounds snapshot: {e}")
+                return self.last_good
+            self._snapshot = self.last_good = snapshot
+            return snapshot
+
+    async def fetch_inbounds(self) -> list:
+        """
+        То же, что api_client.Panel.fetch_inbounds. Клиент Redis общего
+        кэша синхронный, поэтому обращения к нему уходят в поток.
+        """
+        inbounds, generation = await asyncio.to_thread(shared_inbounds.get, self.name)
+        if inbounds is None:
+            inbounds = await self.list_inbounds()
+            await asyncio.to_thread(shared_inbounds.put, self.name, inbounds, generation)
+        return inbounds
+
+    def invalidate_snapshot(self) -> None:
+        self._snapshot = None
+
+    async def invalidate(self) -> None:
+        """То же, что api_client.Panel.invalidate."""
+        self.invalidate_snapshot()
+        await asyncio.to_thread(shared_inbounds.invalidate, self.name)
+
+    async def _iter_inbounds(self, resp):
+        if ijson is None:
+            for inbound in _lookup_fields((await resp.json(content_type=None)).get("obj")):
+                yield inbound
+            return
+        assembler = _InboundAssembler()
+        async for prefix, event, value in ijson.parse_async(resp.content):
+            inbound = assembler.feed(prefix, event, value)
+            if inbound is not None:
+                yield inbound
+
+    async def find_client(self, user_id: int):
+        """То же, что api_client.Panel.find_client."""
+        async with self.stream("GET", "/panel/api/inbounds/list") as resp:
+            async for inbound in self._iter_inbounds(resp):
+                inbound, client = find_in_inbounds([inbound], user_id)
+                if client:
+                    return inbound, client, _parse_stream_settings(inbound.get("streamSettings", {}))
+        return None, None, None
+
+    async def _add_clients_to_inbound(self, inbound_id: int, batch: List[Tuple[int, str]]) -> bool:
+        try:
+            data = await self.request(
+                "POST", "/panel/api/inbounds/addClient", json=_add_clients_payload(inbound_id, batch)
+            )
+            return _registered(data, inbound_id, batch)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error(f"Exception while adding clients: {e}", exc_info=True)
+            return False
+
+    async def register_clients(
+        self, inbound_id: int, batch: List[Tuple[int, str]], results: Optional[Dict[int, bool]] = None
+    ) -> Dict[int, bool]:
+        """То же, что api_client.Panel.register_clients."""
+        results = {} if results is None else results
+        try:
+            async with self._write_lock:
+                for start in range(0, len(batch), API_BATCH_SIZE):
+                    chunk = batch[start:start + API_BATCH_SIZE]
+                    if await self._add_clients_to_inbound(inbound_id, chunk):
+                        results.update((user_id, True) for user_id, _ in chunk)
+                    elif len(chunk) > 1:
+                        for item in chunk:
+                            results[item[0]] = await self._add_clients_to_inbound(inbound_id, [item])
+                    else:
+                        results[chunk[0][0]] = False
+        finally:
+            if any(results.values()):
+                await self.invalidate()
+        return results
+
+    async def add_clients_to_inbound(self, inbound_id: int, batch: List[Tuple[int, str]]) -> Dict[int, bool]:
+        """То же, что api_client.Panel.add_clients_to_inbound."""
+        logger.info("Registering %s users to inbound with id=%s on panel %s", len(batch), inbound_id, self.name)
+        results = {}
+        try:
+            return await self.register_clients(inbound_id, batch, results)
+        except CircuitOpenError:
+            results.update(await asyncio.to_thread(_defer_clients, self, inbound_id, batch, results))
+            return results
+
+    async def _update_inbound(self, inbound: dict, changes: Dict[str, dict]) -> bool:
+        inbound_id = inbound.get("id")
+        try:
+            data = await self.request(
+                "POST", f"/panel/api/inbounds/update/{inbound_id}", json=_update_payload(inbound, changes)
+            )
+            return _updated(data, self.name, inbound_id, changes)
+        except Exception as e:
+            logger.error(f"Exception while updating clients: {e}", exc_info=True)
+            return False
+
+    async def update_clients(self, changes: Dict[int, Dict[str, dict]]) -> Dict[int, bool]:
+        """То же, что api_client.Panel.update_clients."""
+        async with self._write_lock:
+            try:
+                inbounds = {inbound.get("id"): inbound for inbound in await self.list_inbounds()}
+            except Exception as e:
+                logger.error(f"Failed to fetch inbounds from panel {self.name}: {e}")
+                return {inbound_id: False for inbound_id in changes}
+            results = {}
+            for inbound_id, group in changes.items():
+                inbound = inbounds.get(inbound_id)
+                if inbound is None:
+                    logger.error(f"Inbound with id={inbound_id} not found on panel {self.name}")
+                    results[inbound_id] = False
+                    continue
+                results[inbound_id] = await self._update_inbound(inbound, group)
+        await self.invalidate()
+        return results
+
+
+_replay_lock = asyncio.Lock()
+_replay_task: Optional[asyncio.Task] = None
+# То же, что api_client._on_rejected; блокируется на хранилище и зовётся в потоке
+_on_rejected: Optional[Callable[[List[int]], None]] = None
+
+
+async def replay_pending_clients() -> int:
+    """То же, что api_client.replay_pending_clients."""
+    if _replay_lock.locked():
+        return 0
+    async with _replay_lock:
+        taken = await asyncio.to_thread(take_pending_clients)
+        done = []
+        rejected = []
+        try:
+            for (name, inbound_id), batch in group_pending_clients(taken).items():
+                panel = _panels_by_name.get(name)
+                if panel is None:
+                    logger.error(f"Panel {name} of deferred users is not configured")
+                    continue
+                results = {}
+                try:
+                    await panel.register_clients(inbound_id, batch, results)
+                    for user_id in _rejected(results):
+                        _check_duplicate(name, user_id, (await panel.find_client(user_id))[1], results)
+                except Exception as e:
+                    if not isinstance(e, CircuitOpenError):
+                        logger.error(f"Failed to look up rejected deferred users on panel {name}: {e}")
+                    for user_id in _rejected(results):
+                        del results[user_id]
+                _count_replayed(name, results)
+                done += results
+                rejected += _rejected(results)
+        finally:
+            await asyncio.to_thread(return_pending_clients, taken, done)
+        if done:
+            logger.info("Replayed %s deferred client registrations", len(done))
+        if rejected and _on_rejected is not None:
+            await asyncio.to_thread(_on_rejected, rejected)
+        return len(done)
+
+
+def start_replay(on_rejected: Optional[Callable[[List[int]], None]] = None) -> asyncio.Task:
+    """Повторяет отложенные регистрации отдельной задачей в текущем event loop."""
+    global _replay_task, _on_rejected
+    if on_rejected is not None:
+        _on_rejected = on_rejected
+    _replay_task = asyncio.get_running_loop().create_task(replay_pending_clients())
+    return _replay_task
+
+
+panels = [AsyncPanelClient(**cfg) for cfg in _load_panel_configs()]
+_panels_by_name = {panel.name: panel for panel in panels}
+
+
+def _drop_snapshot(panel_name: str) -> None:
+    # Вызывается из потока подписки: присваивание атрибута не требует event loop
+    panel = _panels_by_name.get(panel_name)
+    if panel is not None:
+        panel.invalidate_snapshot()
+
+
+def start_cache_listener():
+    """То же, что api_client.start_cache_listener."""
+    return shared_inbounds.listen(_drop_snapshot)
+
+
+async def close() -> None:
+    await asyncio.gather(*(panel.close() for panel in panels))
+
+
+async def _remember_placements(entries: List[dict]) -> None:
+    if entries and len(panels) > 1:
+        await asyncio.to_thread(set_placements, entries)
+
+
+async def _placement_candidates() -> list:
+    snapshots = await asyncio.gather(
+        *(panel.get_snapshot() for panel in panels), return_exceptions=True
+    )
+    candidates = []
+    for panel, snapshot in zip(panels, snapshots):
+        if isinstance(snapshot, Exception):
+            logger.error(f"Panel {panel.name} is unavailable for placement: {snapshot}")
+            continue
+        candidates += inbound_candidates(panel, snapshot)
+    return candidates
+
+
+async def add_clients(batch: List[Tuple[int, str]]) -> Dict[int, bool]:
+    """То же, что api_client.add_clients."""
+    if not batch:
+        return {}
+    try:
+        plan = assign(batch, await _placement_candidates(), PLACEMENT_STRATEGY)
+    except Exception as e:
+        logger.error(f"Exception while adding clients: {e}", exc_info=True)
+        return {user_id: False for user_id, _ in batch}
+
+    added = await asyncio.gather(
+        *(c.panel.add_clients_to_inbound(c.inbound_id, users) for c, users in plan)
+    )
+    results = {}
+    placements = []
+    for (candidate, _), group in zip(plan, added):
+        results.update(group)
+        placements += [
+            {"user_id": user_id, "panel": candidate.panel.name, "inbound_id": candidate.inbound_id}
+            for user_id, ok in group.items() if ok
+        ]
+    await _remember_placements(placements)
+    return results
+
+
+async def add_client(user_id: int, username: str) -> bool:
+    """Добавляет клиента в наименее нагруженный inbound по Telegram ID"""
+    return (await add_clients([(user_id, username)]))[user_id]
+
+
+async def _owner_panel(user_id: int) -> Optional[AsyncPanelClient]:
+    if len(panels) < 2:
+        return None
+    placement = await asyncio.to_thread(get_placement, user_id)
+    return placement and _panels_by_name.get(placement["panel"])
+
+
+async def _find_client(user_id: int):
+    """То же, что api_client._find_client."""
+    target = str(user_id)
+    owner = await _owner_panel(user_id)
+    # Недоступная панель-владелец пропускается так же, как остальные
+    ordered = [owner] + [p for p in panels if p is not owner] if owner else panels
+    for panel in ordered:
+        try:
+            snapshot = await panel.get_snapshot()
+        except Exception as e:
+            logger.error(f"Failed to fetch inbounds from panel {panel.name}: {e}")
+            continue
+        inbound, client = snapshot.find(target)
+        if client:
+            if panel is not owner:
+                await _remember_placements(
+                    [{"user_id": user_id, "panel": panel.name, "inbound_id": inbound.get("id")}]
+                )
+            return panel, snapshot, inbound, client
+    return None, None, None, None
+
+
+async def _find_client_streaming(user_id: int):
+    """То же, что api_client._find_client_streaming."""
+    owner = await _owner_panel(user_id)
+    ordered = [owner] + [p for p in panels if p is not owner] if owner else panels
+    for panel in ordered:
+        try:
+            inbound, client, settings = await panel.find_client(user_id)
+        except Exception as e:
+            logger.error(f"Failed to fetch inbounds from panel {panel.name}: {e}")
+            inbound, client, settings = _find_in_last_good(panel.last_good, user_id)
+        if client:
+            if panel is not owner:
+                await _remember_placements(
+                    [{"user_id": user_id, "panel": panel.name, "inbound_id": inbound.get("id")}]
+                )
+            return panel, inbound, client, settings
+    return None, None, None, None
+
+
+async def update_clients(changes: Dict[int, dict]) -> Dict[int, bool]:
+    """То же, что api_client.update_clients."""
+    located = {}
+    for user_id in changes:
+        panel, _, inbound, _ = await _find_client(user_id)
+        if inbound is not None:
+            located[user_id] = (panel, inbound)
+    groups, results = _group_by_inbound(changes, located)
+    updated = await asyncio.gather(
+        *(panel.update_clients(by_inbound) for panel, by_inbound in groups.items())
+    )
+    for by_inbound, panel_results in zip(groups.values(), updated):
+        for inbound_id, group in by_inbound.items():
+            results.update((int(tg_id), panel_results[inbound_id]) for tg_id in group)
+    return results
+
+
+async def get_connection_string(user_id: int) -> Optional[str]:
+    """Возвращает строку подключения для пользователя по Telegram ID"""
+    try:
+        if CLIENT_LOOKUP == "stream":
+            panel, inbound, client, settings = await _find_client_streaming(user_id)
+            template = inbound and ConnectionTemplate(panel.host, inbound, settings)
+        else:
+            panel, snapshot, inbound, client = await _find_client(user_id)
+            template = inbound and snapshot.template(inbound, panel.host)
+        if not inbound or not client:
+            logger.warning(f"User with id={user_id} not found in any inbound")
+            return None
+        logger.info("Connection string for user with id=%s generated", user_id)
+        return template.render(client)
+    except Exception as e:
+        logger.error(f"Failed to generate connection string for user {user_id}: {e}", exc_info=True)
+        return None
@@ -0,0 +1,86 @@
+# async_bot.py
+import asyncio
+import functools
+import time
+from logger import api_logger as logger
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+from config import BOT_TOKEN, ASYNC_MAX_CONCURRENT_HANDLERS
+from handlers import load_admins, user_commands, admin_commands, plan_commands, save_commands_state
+from sender import MessageSender
+
+# Сколько запросов setMyCommands отправляется одновременно
+COMMANDS_CONCURRENCY = 8
+
+bot = AsyncTeleBot(BOT_TOKEN)
+_loop = None
+_commands_task = None
+
+
+def _send_message_threadsafe(chat_id: int, text: str, **kwargs):
+    """Отправляет сообщение из потока очереди через event loop бота."""
+    return asyncio.run_coroutine_threadsafe(
+        bot.send_message(chat_id, text, **kwargs), _loop
+    ).result()
+
+
+sender = MessageSender(_send_message_threadsafe)
+
+# AsyncTeleBot запускает обработчики всех апдейтов пачки одновременно,
+# семафор ограничивает число обработчиков, работающих параллельно
+_handler_slots = asyncio.Semaphore(ASYNC_MAX_CONCURRENT_HANDLERS)
+
+
+def bounded(handler):
+    """Запускает обработчик, только когда есть свободный слот."""
+
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        async with _handler_slots:
+            return await handler(*args, **kwargs)
+
+    return wrapper
+
+
+async def sync_commands() -> None:
+    """То же, что bot.sync_commands."""
+    start = time.perf_counter()
+    admins = await asyncio.to_thread(load_admins)
+    plan = await asyncio.to_thread(plan_commands, BOT_TOKEN.split(":", 1)[0], [a["user_id"] for a in admins])
+    if not (plan.default or plan.register or plan.remove):
+        logger.info("Bot commands are up to date, skipping registration")
+        return
+    slots = asyncio.Semaphore(COMMANDS_CONCURRENCY)
+
+    async def run(call):
+        async with slots:
+            await call()
+
+    calls = [
+        lambda: bot.set_my_commands(commands=user_commands, scope=types.BotCommandScopeDefault())
+    ] if plan.default else []
+    calls += [
+        lambda uid=uid: bot.set_my_commands(commands=admin_commands, scope=types.BotCommandScopeChat(uid))
+        for uid in plan.register
+    ]
+    calls += [lambda uid=uid: bot.delete_my_commands(scope=types.BotCommandScopeChat(uid)) for uid in plan.remove]
+    results = await asyncio.gather(*(run(call) for call in calls), return_exceptions=True)
+    errors = [r for r in results if isinstance(r, Exception)]
+    for e in errors:
+        logger.error(f"Failed to set bot commands: {e}")
+    if errors:
+        logger.warning(f"{len(errors)}/{len(calls)} bot command updates failed, will retry on next start")
+    else:
+        await asyncio.to_thread(save_commands_state, plan.state)
+    logger.info(
+        f"Updated bot commands for {len(plan.register)} admins, removed for {len(plan.remove)} "
+        f"in {(time.perf_counter() - start) * 1000:.0f} ms"
+    )
+
+
+async def init_bot() -> None:
+    global _loop, _commands_task
+    _loop = asyncio.get_running_loop()
+    sender.start()
+    # Команды выставляются в фоне, polling их не ждёт
+    _commands_task = asyncio.create_task(sync_commands())
@@ -0,0 +1,159 @@
+# async_client_handlers.py
+import asyncio
+from logger import api_logger as logger
+import async_api_client
+from telebot import types
+from async_bot import bot, bounded, sender
+from metrics import timed_handler
+from ratelimit import rate_limited
+from accounts import account_text
+from billing import (
+    SUBSCRIPTION_PAYLOAD,
+    check_invoice,
+    format_expiry,
+    record_payment,
+    subscription_scheduler,
+)
+from config import (
+    PAYMENT_PROVIDER_TOKEN,
+    SUBSCRIPTION_CURRENCY,
+    SUBSCRIPTION_DAYS,
+    SUBSCRIPTION_PRICE,
+)
+
+from handlers import *
+
+
+@bot.message_handler(commands=["start"])
+@timed_handler
+@rate_limited(bot, "start")
+@bounded
+async def cmd_start(message: types.Message) -> None:
+    user_id = message.chat.id
+    username = message.from_user.username or "[unknown]"
+
+    logger.info("Received /start from user_id=%s, username=%s", user_id, username)
+
+    outcome = await asyncio.to_thread(submit_request, sender, user_id, username)
+    text, markup = start_reply(outcome)
+    await bot.send_message(user_id, text, reply_markup=markup)
+
+
+@bot.callback_query_handler(func=lambda call: call.data == "get_qr")
+@timed_handler
+@rate_limited(bot, "get_qr", shed=True)
+@bounded
+async def cmd_send_qr(call: types.CallbackQuery) -> None:
+    """Отправляет пользователю QR для подключения к VPN серверу"""
+    user_id = call.message.chat.id
+
+    if not await asyncio.to_thread(is_approved_user, user_id):
+        await bot.answer_callback_query(
+            call.id, "❌ Доступ запрещён: заявка не одобрена", show_alert=True
+        )
+        logger.warning(f"User {user_id} tried to get QR without approval")
+        return
+
+    logger.info("Incoming command /get_qr from approved user_id=%s", user_id)
+
+    with in_flight.single(QR_ACTION, user_id) as claimed:
+        if not claimed:
+            await bot.answer_callback_query(call.id, "⏳ QR-код уже готовится")
+            return
+
+        cs = await async_api_client.get_connection_string(user_id)
+        if cs is None:
+            await bot.send_message(user_id, "❗ Не удалось найти параметры подключения")
+            await bot.answer_callback_query(call.id)
+            logger.error(f"Can't find configuration for user with id={user_id}")
+            return
+
+        # Рендер PNG занимает процессор, поэтому он выполняется в пуле потоков
+        await send_qr_async(bot, user_id, cs)
+        await bot.answer_callback_query(call.id)
+
+
+@bot.callback_query_handler(func=lambda call: call.data == "get_info")
+@timed_handler
+@rate_limited(bot, "get_info")
+@bounded
+async def cmd_send_info(call: types.CallbackQuery) -> None:
+    user_id = call.message.chat.id
+
+    if not await asyncio.to_thread(is_approved_user, user_id):
+        await bot.answer_callback_query(
+            call.id, "❌ Доступ запрещён: заявка не одобрена", show_alert=True
+        )
+        logger.warning(f"User {user_id} tried to get info without approval")
+        return
+
+    logger.info("Incoming command /get_info from approved user with id=%s", user_id)
+    # Ответ берётся из снимка фоновой синхронизации, к панели не обращаемся
+    await bot.send_message(user_id, await asyncio.to_thread(account_text, user_id))
+    await bot.answer_callback_query(call.id)
+
+
+@bot.callback_query_handler(func=lambda c: c.data == 'buy_subscription')
+@timed_handler
+@bounded
+async def handle_subscription_payment(callback_query):
+    chat_id = callback_query.message.chat.id
+
+    await bot.send_invoice(
+        chat_id=chat_id,
+        title="Продление подписки",
+        description=f"Подписка на {SUBSCRIPTION_DAYS} дней",
+        invoice_payload=SUBSCRIPTION_PAYLOAD,
+        provider_token=PAYMENT_PROVIDER_TOKEN,
+        currency=SUBSCRIPTION_CURRENCY,
+        prices=[types.LabeledPrice(label="Подписка", amount=SUBSCRIPTION_PRICE)],
+        start_parameter="subscription",
+        is_flexible=False
+    )
+    await bot.answer_callback_query(callback_query.id)
+
+
+@bot.pre_checkout_query_handler(func=lambda query: True)
+@timed_handler
+@bounded
+async def handle_pre_checkout(query: types.PreCheckoutQuery) -> None:
+    error = await asyncio.to_thread(
+        check_invoice,
+        query.from_user.id,
+        query.invoice_payload,
+        query.currency,
+        query.total_amount,
+    )
+    if error:
+        logger.warning(f"Rejected checkout from user with id={query.from_user.id}: {error}")
+    await bot.answer_pre_checkout_query(query.id, ok=error is None, error_message=error)
+
+
+@bot.message_handler(content_types=["successful_payment"])
+@timed_handler
+@bounded
+async def handle_successful_payment(message: types.Message) -> None:
+    user_id = message.chat.id
+    payment = message.successful_payment
+    entry = await asyncio.to_thread(
+        record_payment,
+        user_id,
+        payment.telegram_payment_charge_id,
+        payment.total_amount,
+        payment.currency,
+    )
+    if entry is None:
+        return
+
+    # Срок на панели обновит планировщик, ответ пользователю не ждёт панель
+    subscription_scheduler.schedule(entry)
+    await bot.send_message(
+        user_id, f"✅ Оплата получена, подписка действует до {format_expiry(entry)}"
+    )
+
+
+@bot.message_handler(func=lambda message: True)
+@timed_handler
+@bounded
+async def fallback(message: types.Message) -> None:
+    await bot.send_message(message.chat.id, "Не понимаю")
@@ -0,0 +1,33 @@
+import asyncio
+from async_bot import bot, init_bot, sender
+import async_api_client
+from accounts import run_account_sync
+from billing import subscription_scheduler
+from handlers.approvals import revoke_rejected
+from metrics import report_startup
+# Обработчики админки регистрируются первыми: в async_client_handlers
+# есть fallback, который перехватывает любые сообщения
+import async_admin_handlers
+import async_client_handlers
+
+
+async def main(started: float) -> None:
+    await init_bot()
+    async_api_client.start_cache_listener()
+    account_sync = asyncio.create_task(run_account_sync(async_api_client.panels))
+    async_api_client.start_replay(lambda user_ids: revoke_rejected(sender, user_ids))
+    loop = asyncio.get_running_loop()
+    # Планировщик подписок работает в своём потоке и обновляет панель
+    # через асинхронный клиент в event loop бота
+    subscription_scheduler.start(
+        lambda changes: asyncio.run_coroutine_threadsafe(
+            async_api_client.update_clients(changes), loop
+        ).result(),
+        sender,
+    )
+    report_startup(started)
+    try:
+        await bot.infinity_polling()
+    finally:
+        account_sync.cancel()
+        await async_api_client.close()
@@ -0,0 +1,88 @@
+"""
+Один пользователь жмёт «Получить QR-код» и /start сотни раз подряд, пока
+обычные пользователи запрашивают QR по одному разу. Показывает, сколько
+работы спамер отнимает у панели и Bot API и сколько его запросов отсечено.
+
+    python -m benchmarks.abuse --presses 500 --users 50
+"""
+import argparse
+import sys
+import tempfile
+from benchmarks.fake_panel import FakePanelState, start_fake_panel
+from benchmarks.fake_telegram import FakeTelegramState, start_fake_telegram
+from benchmarks.harness import format_table, measure
+from benchmarks.run import _callback, _configure, _message
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--presses", type=int, default=500, help="нажатий спамера на каждую команду")
+    parser.add_argument("--users", type=int, default=50, help="обычных пользователей")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--panel-latency", type=float, default=5.0, help="задержка панели, мс")
+    parser.add_argument("--verbose", action="store_true", help="не глушить логи бота")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = _parse_args(argv)
+    # Спамер и обычные пользователи — существующие клиенты панели
+    panel_state = FakePanelState(1, args.users + 1, args.panel_latency / 1000)
+    telegram = FakeTelegramState()
+    panel = start_fake_panel(panel_state)
+    bot_api = start_fake_telegram(telegram)
+    workdir = tempfile.mkdtemp(prefix="bot-bench-")
+    args.storage = "json"
+    _configure(
+        args,
+        workdir,
+        f"http://127.0.0.1:{panel.server_port}",
+        f"http://127.0.0.1:{bot_api.server_port}",
+    )
+
+    from handlers.storage import add_approved_users
+    from bot import sender
+    import client_handlers
+
+    spammer = panel_state.first_tg_id
+    users = range(spammer + 1, spammer + 1 + args.users)
+    add_approved_users([{"user_id": uid, "username": f"user{uid}"} for uid in (spammer, *users)])
+    sender.start()
+
+    results = [
+        measure(
+            "spam /start",
+            lambda _: client_handlers.cmd_start(_message(spammer, "/start")),
+            range(args.presses),
+            args.concurrency,
+        ),
+        measure(
+            "spam get_qr",
+            lambda _: client_handlers.cmd_send_qr(_callback(spammer, "get_qr")),
+            range(args.presses),
+            args.concurrency,
+        ),
+    ]
+    spam_panel = sum(panel_state.requests.values())
+    spam_messages = telegram.calls.get("sendMessage", 0)
+    # QR спамера рендерятся в фоне; его фото — всё, что сверх фото обычных пользователей
+    photos = telegram.calls.get("sendPhoto", 0)
+    results.append(
+        measure(
+            "users get_qr",
+            lambda uid: client_handlers.cmd_send_qr(_callback(uid, "get_qr")),
+            users,
+            args.concurrency,
+            wait=lambda: telegram.wait_for("sendPhoto", photos + args.users),
+        )
+    )
+    print(
+        f"presses={args.presses} users={args.users} "
+        f"spam: panel_requests={spam_panel} messages={spam_messages} "
+        f"photos={telegram.calls.get('sendPhoto', 0) - args.users}"
+    )
+    print(format_table(results))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,162 @@
+"""
+Нагрузочный прогон асинхронного режима (BOT_MODE=async) рядом с потоковым:
+одни и те же сценарии /start, одобрения заявок и get_qr против фейковых
+панели 3x-ui и Bot API. Показывает обновлений в секунду и p50/p99 времени
+обработчика, а для асинхронного режима — наибольшую задержку event loop:
+её дают вызовы, которые блокируют цикл вместо того, чтобы уйти в поток.
+Фейковые серверы работают в том же процессе, поэтому на одном ядре
+в задержку цикла попадает и их борьба за GIL. С --storage redis хранилище
+и общий кэш inbound'ов живут в Redis: REDIS_URL из окружения, а без него —
+fakeredis в этом процессе.
+
+    python -m benchmarks.async_load --users 500 --panel-latency 20
+    python -m benchmarks.async_load --users 500 --storage sqlite
+    python -m benchmarks.async_load --users 500 --storage redis
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from benchmarks.fake_panel import FakePanelState, start_fake_panel
+from benchmarks.fake_telegram import FakeTelegramState, start_fake_telegram
+from benchmarks.harness import format_table, measure, measure_async
+from benchmarks.run import _callback, _configure, _message
+from benchmarks.shared_state import _start_fake_redis
+
+ADMIN_ID = 1
+THREADED_USERS = 1_000_000
+ASYNC_USERS = 2_000_000
+# Период, с которым сторож проверяет, не заблокирован ли event loop
+_LAG_TICK = 0.005
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=500, help="новых пользователей в каждом режиме")
+    parser.add_argument("--concurrency", type=int, default=8, help="потоков обработчиков TeleBot")
+    parser.add_argument("--async-concurrency", type=int, default=64, help="одновременных обработчиков AsyncTeleBot")
+    parser.add_argument("--inbounds", type=int, default=4, help="inbound'ов на фейковой панели")
+    parser.add_argument("--clients", type=int, default=1000, help="клиентов в каждом inbound'е")
+    parser.add_argument("--panel-latency", type=float, default=20.0, help="задержка панели, мс")
+    parser.add_argument("--telegram-latency", type=float, default=5.0, help="задержка Bot API, мс")
+    parser.add_argument("--storage", choices=("json", "sqlite", "redis"), default="json")
+    parser.add_argument("--verbose", action="store_true", help="не глушить логи бота")
+    return parser.parse_args(argv)
+
+
+def _run_threaded(args, telegram: FakeTelegramState) -> list:
+    import admin_handlers
+    import client_handlers
+    from bot import sender
+
+    sender.start()
+    users = range(THREADED_USERS, THREADED_USERS + args.users)
+    # QR отправляется из пула рендера уже после возврата обработчика
+    photos = telegram.calls.get("sendPhoto", 0) + args.users
+    return [
+        measure(
+            "threaded start",
+            lambda uid: client_handlers.cmd_start(_message(uid, "/start")),
+            users,
+            args.concurrency,
+        ),
+        measure(
+            "threaded approve",
+            lambda uid: admin_handlers.handle_approve(_callback(ADMIN_ID, f"approve:{uid}")),
+            users,
+            args.concurrency,
+        ),
+        measure(
+            "threaded get_qr",
+            lambda uid: client_handlers.cmd_send_qr(_callback(uid, "get_qr")),
+            users,
+            args.concurrency,
+            wait=lambda: telegram.wait_for("sendPhoto", photos),
+        ),
+    ]
+
+
+async def _watch_lag(lags: list) -> None:
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(_LAG_TICK)
+        lags.append(time.perf_counter() - start - _LAG_TICK)
+
+
+async def _run_async(args) -> tuple:
+    import async_admin_handlers
+    import async_api_client
+    import async_bot
+    import async_client_handlers
+
+    await async_bot.init_bot()
+    users = range(ASYNC_USERS, ASYNC_USERS + args.users)
+    lags = []
+    watcher = asyncio.create_task(_watch_lag(lags))
+    try:
+        results = [
+            await measure_async(
+                "async start",
+                lambda uid: async_client_handlers.cmd_start(_message(uid, "/start")),
+                users,
+                args.async_concurrency,
+            ),
+            await measure_async(
+                "async approve",
+                lambda uid: async_admin_handlers.handle_approve(_callback(ADMIN_ID, f"approve:{uid}")),
+                users,
+                args.async_concurrency,
+            ),
+            await measure_async(
+                "async get_qr",
+                lambda uid: async_client_handlers.cmd_send_qr(_callback(uid, "get_qr")),
+                users,
+                args.async_concurrency,
+            ),
+        ]
+    finally:
+        watcher.cancel()
+        await async_api_client.close()
+        await async_bot.bot.close_session()
+    return results, max(lags, default=0.0)
+
+
+def main(argv=None) -> None:
+    args = _parse_args(argv)
+    panel_state = FakePanelState(args.inbounds, args.clients, args.panel_latency / 1000)
+    telegram = FakeTelegramState(args.telegram_latency / 1000)
+    panel = start_fake_panel(panel_state)
+    bot_api = start_fake_telegram(telegram)
+    if args.storage == "redis" and not os.environ.get("REDIS_URL"):
+        os.environ["REDIS_URL"] = _start_fake_redis()
+    _configure(
+        args,
+        tempfile.mkdtemp(prefix="bot-bench-"),
+        f"http://127.0.0.1:{panel.server_port}",
+        f"http://127.0.0.1:{bot_api.server_port}",
+    )
+    from telebot import apihelper, asyncio_helper
+
+    asyncio_helper.API_URL = apihelper.API_URL
+
+    # Модули бота импортируются только после настройки окружения
+    from handlers.storage import _backend
+    from handlers.storage_backend import ADMINS
+
+    _backend.add(ADMINS, {"user_id": ADMIN_ID})
+    results = _run_threaded(args, telegram)
+    async_results, max_lag = asyncio.run(_run_async(args))
+    results += async_results
+
+    print(
+        f"users={args.users} storage={args.storage} threads={args.concurrency} "
+        f"async_concurrency={args.async_concurrency} panel_latency={args.panel_latency}ms "
+        f"telegram_latency={args.telegram_latency}ms max_loop_lag={max_lag * 1000:.1f}ms"
+    )
+    print(format_table(results))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,190 @@
+"""
+Нагрузочная проверка дедупликации колбэков: несколько админов одновременно
+нажимают «Одобрить» и «Отклонить» на одних и тех же заявках, а пользователи
+много раз подряд запрашивают QR. Каждый пользователь должен оказаться на
+панели не больше одного раза, одобренный — ровно один раз, отклонённый —
+ни разу, и ни одна заявка не должна остаться висеть. Повторный запрос QR
+отклоняется, пока предыдущий не отправлен, а после отправки захват снят.
+Проверяются и потоковые обработчики, и асинхронные.
+
+    python -m benchmarks.callback_stress --users 200 --admins 4 --clicks 3
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from telebot import apihelper, asyncio_helper
+from benchmarks.fake_panel import FakePanelState, start_fake_panel
+from benchmarks.fake_telegram import FakeTelegramState, start_fake_telegram
+from benchmarks.run import _callback, _configure
+
+FIRST_ADMIN_ID = 1
+SYNC_USERS = 2_000_000
+ASYNC_USERS = 3_000_000
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200, help="заявок в каждом прогоне")
+    parser.add_argument("--admins", type=int, default=4, help="админов, нажимающих кнопки")
+    parser.add_argument("--clicks", type=int, default=3, help="нажатий каждого админа на заявку")
+    parser.add_argument("--concurrency", type=int, default=32, help="потоков обработчиков")
+    parser.add_argument("--panel-latency", type=float, default=20.0, help="задержка панели, мс")
+    parser.add_argument("--storage", choices=("json", "sqlite"), default="json")
+    parser.add_argument("--verbose", action="store_true", help="не глушить логи бота")
+    return parser.parse_args(argv)
+
+
+def _clicks(args, users) -> list:
+    """Перемешанные колбэки админов: в основном одобрения, каждая пятая заявка ещё и отклоняется."""
+    clicks = []
+    for user_id in users:
+        for admin_id in range(FIRST_ADMIN_ID, FIRST_ADMIN_ID + args.admins):
+            clicks += [(admin_id, f"approve:{user_id}")] * args.clicks
+            if user_id % 5 == 0:
+                clicks.append((admin_id, f"reject:{user_id}"))
+    random.shuffle(clicks)
+    return clicks
+
+
+def _panel_clients(state: FakePanelState) -> dict:
+    counts = {}
+    with state.lock:
+        for inbound in state.inbounds:
+            for client in json.loads(inbound["settings"])["clients"]:
+                counts[client["tgId"]] = counts.get(client["tgId"], 0) + 1
+    return counts
+
+
+def _check(name: str, users, panel_state: FakePanelState) -> str:
+    from handlers import get_approval_request, get_approved_user
+
+    on_panel = _panel_clients(panel_state)
+    errors = []
+    approved = 0
+    for user_id in users:
+        registered = on_panel.get(str(user_id), 0)
+        if get_approval_request(user_id):
+            errors.append(f"{user_id}: request is still pending")
+        if get_approved_user(user_id):
+            approved += 1
+            if registered != 1:
+                errors.append(f"{user_id}: approved but registered {registered} times")
+        elif registered:
+            errors.append(f"{user_id}: rejected but registered {registered} times")
+    if errors:
+        raise SystemExit(f"{name}: {len(errors)} errors, e.g. " + "; ".join(errors[:5]))
+    return f"{name}: approved={approved} rejected={len(users) - approved}"
+
+
+def _duplicates() -> dict:
+    from metrics import DUPLICATE_CALLBACKS
+
+    return {
+        sample.labels["action"]: int(sample.value)
+        for metric in DUPLICATE_CALLBACKS.collect()
+        for sample in metric.samples
+        if sample.name.endswith("_total")
+    }
+
+
+def _check_qr(args, users, telegram: FakeTelegramState, photos: int, duplicates: int) -> None:
+    """Каждое принятое нажатие даёт одно фото, после отправки захваты QR свободны."""
+    from handlers import QR_ACTION, get_approved_user, in_flight
+
+    approved = [user_id for user_id in users if get_approved_user(user_id)]
+    accepted = len(approved) * args.clicks - (_duplicates().get("qr", 0) - duplicates)
+    if not telegram.wait_for("sendPhoto", photos + accepted):
+        raise SystemExit(f"qr: {telegram.calls.get('sendPhoto', 0) - photos} of {accepted} photos sent")
+    # Bot API засчитывает фото раньше, чем ответ дойдёт до очереди отправки и её on_done
+    deadline = time.monotonic() + 5
+    while True:
+        held = [user_id for user_id in approved if not in_flight.claim(QR_ACTION, user_id)]
+        in_flight.release(QR_ACTION, *(set(approved) - set(held)))
+        if not held or time.monotonic() > deadline:
+            break
+        time.sleep(0.05)
+    if held:
+        raise SystemExit(f"qr: claims of {len(held)} users were not released after sending, e.g. {held[0]}")
+
+
+def _run_sync(args, panel_state: FakePanelState, telegram: FakeTelegramState) -> str:
+    import admin_handlers
+    import client_handlers
+    from handlers import add_approval_request
+
+    users = range(SYNC_USERS, SYNC_USERS + args.users)
+    for user_id in users:
+        add_approval_request(user_id, f"user{user_id}")
+
+    def press(click) -> None:
+        caller_id, data = click
+        if data.startswith("approve:"):
+            admin_handlers.handle_approve(_callback(caller_id, data))
+        else:
+            admin_handlers.handle_reject(_callback(caller_id, data))
+
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        list(pool.map(press, _clicks(args, users)))
+        # Одобренные пользователи жмут «Получить QR» по несколько раз
+        photos, duplicates = telegram.calls.get("sendPhoto", 0), _duplicates().get("qr", 0)
+        qr_clicks = [user_id for user_id in users for _ in range(args.clicks)]
+        list(pool.map(lambda uid: client_handlers.cmd_send_qr(_callback(uid, "get_qr")), qr_clicks))
+    result = _check("threaded", users, panel_state)
+    _check_qr(args, users, telegram, photos, duplicates)
+    return result
+
+
+async def _run_async(args, panel_state: FakePanelState) -> str:
+    import async_admin_handlers
+    from handlers import add_approval_request
+
+    users = range(ASYNC_USERS, ASYNC_USERS + args.users)
+    for user_id in users:
+        add_approval_request(user_id, f"user{user_id}")
+
+    async def press(click) -> None:
+        caller_id, data = click
+        if data.startswith("approve:"):
+            await async_admin_handlers.handle_approve(_callback(caller_id, data))
+        else:
+            await async_admin_handlers.handle_reject(_callback(caller_id, data))
+
+    await asyncio.gather(*(press(click) for click in _clicks(args, users)))
+    await async_admin_handlers.async_api_client.close()
+    await async_admin_handlers.bot.close_session()
+    return _check("async", users, panel_state)
+
+
+def main(argv=None) -> None:
+    args = _parse_args(argv)
+    panel_state = FakePanelState(2, 100, args.panel_latency / 1000)
+    telegram = FakeTelegramState()
+    panel = start_fake_panel(panel_state)
+    bot_api = start_fake_telegram(telegram)
+    _configure(
+        args,
+        tempfile.mkdtemp(prefix="bot-stress-"),
+        f"http://127.0.0.1:{panel.server_port}",
+        f"http://127.0.0.1:{bot_api.server_port}",
+    )
+    asyncio_helper.API_URL = apihelper.API_URL
+
+    from handlers.storage import _backend
+    from handlers.storage_backend import ADMINS
+
+    _backend.add_many(ADMINS, [{"user_id": FIRST_ADMIN_ID + i} for i in range(args.admins)])
+    from bot import sender
+
+    sender.start()
+    print(_run_sync(args, panel_state, telegram))
+    print(asyncio.run(_run_async(args, panel_state)))
+    print(f"addClient calls={panel_state.requests.get('/panel/api/inbounds/addClient', 0)} duplicates={_duplicates()}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
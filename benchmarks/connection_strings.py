@@ -0,0 +1,90 @@
+"""
+Микробенчмарк сборки строки подключения: прежний путь (разбор streamSettings
+и полная сборка URI на каждый запрос) против шаблона inbound'а из снимка.
+Прежний сборщик скопирован сюда как был, так что сравнение строк проверяет
+шаблон, а не сам с собой. Панель не нужна — inbound'ы берутся из состояния
+фейковой панели.
+
+    python -m benchmarks.connection_strings --clients 100000
+"""
+import argparse
+import sys
+from urllib.parse import quote, quote_plus, urlencode
+from benchmarks.fake_panel import FakePanelState
+from benchmarks.harness import format_table, measure
+
+HOST = "vpn.example.com"
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--inbounds", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=25_000, help="клиентов в каждом inbound'е")
+    return parser.parse_args(argv)
+
+
+def _build_connection_string(host: str, inbound: dict, client: dict, settings: dict) -> str:
+    """Сборщик строки подключения до шаблонов, без изменений."""
+    protocol = inbound.get("protocol", "")
+    port = inbound.get("port", "")
+
+    params = {
+        "type":     settings["network"],
+        "security": settings["security"],
+        "pbk":      settings["public_key"],
+        "fp":       settings["fingerprint"],
+        "sni":      settings["sni"],
+        "sid":      settings["short_id"],
+        "spx":      settings["spider_x"],
+    }
+    flow = client.get("flow") or ""
+    if flow:
+        params["flow"] = flow
+
+    query = urlencode(params, quote_via=quote_plus, safe="")
+    remark = inbound.get("remark", "")
+    email = client.get("email", "")
+    fragment = f"{remark}-{email}"
+    fragment_enc = quote(fragment, safe="")
+
+    client_id = client.get("id", "")
+    return f"{protocol}://{client_id}@{host}:{port}?{query}#{fragment_enc}"
+
+
+def main(argv=None) -> None:
+    args = _parse_args(argv)
+    from api_client import InboundSnapshot, _parse_stream_settings
+
+    state = FakePanelState(args.inbounds, args.clients)
+    snapshot = InboundSnapshot(state.inbounds)
+    user_ids = [str(tg_id) for tg_id in range(state.first_tg_id, state.last_tg_id + 1)]
+
+    def rebuild(user_id: str) -> str:
+        inbound, client = snapshot.find(user_id)
+        return _build_connection_string(HOST, inbound, client, _parse_stream_settings(inbound.get("streamSettings")))
+
+    def template(user_id: str) -> str:
+        inbound, client = snapshot.find(user_id)
+        return snapshot.template(inbound, HOST).render(client)
+
+    mismatches = [uid for uid in user_ids[:: max(1, len(user_ids) // 1000)] if rebuild(uid) != template(uid)]
+    if mismatches:
+        raise SystemExit(f"template output differs for {len(mismatches)} users, e.g. {mismatches[0]}")
+
+    # У клиентов фейковой панели flow задан, а email из латиницы: проверяем и остальные случаи
+    inbound, client = snapshot.find(user_ids[0])
+    settings = _parse_stream_settings(inbound.get("streamSettings"))
+    for variant in ({"flow": ""}, {"flow": None}, {"email": "Иван Петров+vpn@example.com"}, {"id": "a/b c"}):
+        edge = dict(client, **variant)
+        expected = _build_connection_string(HOST, inbound, edge, settings)
+        if snapshot.template(inbound, HOST).render(edge) != expected:
+            raise SystemExit(f"template output differs for a client with {variant}")
+
+    results = [measure("rebuild", rebuild, user_ids), measure("template", template, user_ids)]
+    print(f"clients={len(user_ids)} inbounds={args.inbounds}")
+    print(format_table(results))
+    print(f"template speedup: x{results[1].throughput / results[0].throughput:.1f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,210 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Set
+from urllib.parse import urlparse
+
+COOKIE = "3x-ui=benchmark"
+
+_REALITY_STREAM = {
+    "network": "tcp",
+    "security": "reality",
+    "realitySettings": {
+        "serverNames": ["example.com"],
+        "shortIds": ["0123abcd"],
+        "settings": {"publicKey": "benchmark-public-key", "fingerprint": "chrome", "spiderX": "/"},
+    },
+}
+
+
+class FakePanelState:
+    """
+    Состояние фейковой панели 3x-ui: inbounds inbound'ов по clients клиентов.
+    Клиенты заранее созданных inbound'ов получают tgId начиная с first_tg_id.
+    fault включает сбой: "error" — панель отвечает 503, "hang" — отвечает
+    503 только через hang секунд, так что клиент успевает упасть по таймауту,
+    "login" — 503 отвечает только вход. expire_sessions разлогинивает всех.
+    addClient отклоняет клиентов с уже занятым email и с tgId из reject.
+    """
+
+    def __init__(self, inbounds: int, clients: int, latency: float = 0.0, first_tg_id: int = 10_000_000):
+        self.latency = latency
+        self.fault: Optional[str] = None
+        self.hang = 5.0
+        self.cookie = COOKIE
+        self._sessions = 0
+        self.first_tg_id = first_tg_id
+        self.last_tg_id = first_tg_id + inbounds * clients - 1
+        self.lock = threading.Lock()
+        self.requests: Dict[str, int] = {}
+        self.reject: Set[str] = set()
+        self.inbounds: List[dict] = []
+        self._list_body = None
+        tg_id = first_tg_id
+        for inbound_id in range(1, inbounds + 1):
+            inbound_clients = []
+            stats = []
+            for _ in range(clients):
+                inbound_clients.append(
+                    {
+                        "id": f"00000000-0000-0000-0000-{tg_id:012d}",
+                        "email": f"user{tg_id}",
+                        "tgId": str(tg_id),
+                        "flow": "xtls-rprx-vision",
+                        "expiryTime": 0,
+                        "enable": True,
+                    }
+                )
+                stats.append(
+                    {
+                        "id": tg_id,
+                        "inboundId": inbound_id,
+                        "enable": True,
+                        "email": f"user{tg_id}",
+                        "up": tg_id * 1024,
+                        "down": tg_id * 4096,
+                        "expiryTime": 0,
+                        "total": 0,
+                    }
+                )
+                tg_id += 1
+            self.inbounds.append(
+                {
+                    "id": inbound_id,
+                    "remark": f"bench-{inbound_id}",
+                    "protocol": "vless",
+                    "port": 40000 + inbound_id,
+                    "enable": True,
+                    "up": 0,
+                    "down": 0,
+                    "settings": json.dumps({"clients": inbound_clients}),
+                    "streamSettings": json.dumps(_REALITY_STREAM),
+                    "clientStats": stats,
+                }
+            )
+
+    def expire_sessions(self) -> None:
+        """Выданные ранее cookie перестают действовать, как после перезапуска панели."""
+        with self.lock:
+            self._sessions += 1
+            self.cookie = f"{COOKIE}-{self._sessions}"
+
+    def count(self, path: str) -> None:
+        with self.lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+    def add_clients(self, inbound_id: int, clients: list) -> bool:
+        with self.lock:
+            for inbound in self.inbounds:
+                if inbound["id"] == inbound_id:
+                    settings = json.loads(inbound["settings"])
+                    emails = {c["email"] for c in settings["clients"]}
+                    if any(c["email"] in emails or str(c.get("tgId")) in self.reject for c in clients):
+                        return False
+                    settings["clients"] += clients
+                    inbound["settings"] = json.dumps(settings)
+                    self._list_body = None
+                    return True
+        return False
+
+    def update_inbound(self, inbound_id: int, payload: dict) -> bool:
+        with self.lock:
+            for inbound in self.inbounds:
+                if inbound["id"] == inbound_id:
+                    inbound["settings"] = payload["settings"]
+                    self._list_body = None
+                    return True
+        return False
+
+    def list_body(self) -> bytes:
+        # Ответ кэшируется до следующего изменения, чтобы сериализация
+        # большого списка не съедала время самой панели
+        with self.lock:
+            if self._list_body is None:
+                self._list_body = json.dumps({"success": True, "obj": self.inbounds}).encode()
+            return self._list_body
+
+
+def _handler(state: FakePanelState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Заголовки и тело уходят отдельными записями, с Nagle каждая пара ждёт ACK
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args) -> None:
+            pass
+
+        def _reply(self, code: int, body: bytes = b"", headers=()) -> None:
+            self.send_response(code)
+            for name, value in headers:
+                self.send_header(name, value)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                # Потоковый поиск закрывает соединение, найдя клиента
+                pass
+
+        def _inject_fault(self, path: str) -> bool:
+            if state.fault == "hang":
+                time.sleep(state.hang)
+            if state.fault in ("error", "hang") or (state.fault == "login" and path == "/login"):
+                self._reply(503)
+                return True
+            return False
+
+        def _authorized(self) -> bool:
+            cookies = (self.headers.get("Cookie") or "").split("; ")
+            return state.cookie in cookies
+
+        def _body(self) -> bytes:
+            return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        def do_GET(self) -> None:
+            path = urlparse(self.path).path
+            state.count(path)
+            time.sleep(state.latency)
+            if self._inject_fault(path):
+                return
+            if not self._authorized():
+                return self._reply(302, headers=[("Location", "/login")])
+            if path == "/panel/api/inbounds/list":
+                return self._reply(200, state.list_body())
+            self._reply(404)
+
+        def do_POST(self) -> None:
+            path = urlparse(self.path).path
+            body = self._body()
+            state.count(path)
+            time.sleep(state.latency)
+            if self._inject_fault(path):
+                return
+            if path == "/login":
+                return self._reply(
+                    200, b'{"success":true}', [("Set-Cookie", f"{state.cookie}; Path=/")]
+                )
+            if not self._authorized():
+                return self._reply(302, headers=[("Location", "/login")])
+
+            payload = json.loads(body or b"{}")
+            if path == "/panel/api/inbounds/addClient":
+                clients = json.loads(payload["settings"])["clients"]
+                ok = state.add_clients(int(payload["id"]), clients)
+            elif path.startswith("/panel/api/inbounds/update/"):
+                ok = state.update_inbound(int(path.rsplit("/", 1)[1]), payload)
+            else:
+                return self._reply(404)
+            self._reply(200, json.dumps({"success": ok, "msg": ""}).encode())
+
+    return Handler
+
+
+def start_fake_panel(state: FakePanelState) -> ThreadingHTTPServer:
+    """Запускает фейковую панель на свободном порту в фоновом потоке."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-panel", daemon=True).start()
+    return server
@@ -0,0 +1,135 @@
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeTelegramState:
+    """
+    Считает вызовы методов фейкового Bot API и позволяет дождаться нужного
+    числа. replied — когда бот последний раз обратился к каждому чату.
+    Апдейты из put_updates отдаются боту через getUpdates.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: Dict[str, int] = {}
+        self.replied: Dict[int, float] = {}
+        self._updates: List[dict] = []
+        self._message_ids = itertools.count(1)
+        self._cond = threading.Condition()
+
+    def record(self, method: str, chat_id: int = 0) -> int:
+        with self._cond:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            if chat_id:
+                self.replied[chat_id] = time.perf_counter()
+            self._cond.notify_all()
+            return next(self._message_ids)
+
+    def put_updates(self, updates: List[dict]) -> None:
+        with self._cond:
+            self._updates += updates
+            self._cond.notify_all()
+
+    def take_updates(self, offset: int, limit: int, timeout: float) -> List[dict]:
+        """Как getUpdates: апдейты начиная с offset, при пустой очереди ждёт до timeout."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._updates = [u for u in self._updates if u["update_id"] >= offset]
+            while not self._updates:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return self._updates[:limit]
+
+    def wait_for(self, method: str, count: int, timeout: float = 60.0) -> bool:
+        """Ждёт, пока метод вызовут count раз с момента создания состояния."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self.calls.get(method, 0) < count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+
+def _message(message_id: int, chat_id: int, **extra) -> dict:
+    return dict(
+        {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+        },
+        **extra,
+    )
+
+
+# Дольше фейковый long polling не держит запрос, чтобы остановка бота не ждала
+_MAX_POLL_TIMEOUT = 1.0
+
+
+def _result(state: FakeTelegramState, method: str, message_id: int, params: dict):
+    chat_id = int(params.get("chat_id", 0) or 0)
+    if method == "getMe":
+        return {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+    if method in ("sendMessage", "editMessageText"):
+        return _message(message_id, chat_id, text=params.get("text", ""))
+    if method == "sendPhoto":
+        photo = {
+            "file_id": f"photo-{message_id}",
+            "file_unique_id": f"unique-{message_id}",
+            "width": 512,
+            "height": 512,
+        }
+        return _message(message_id, chat_id, photo=[photo])
+    if method == "getUpdates":
+        return state.take_updates(
+            int(params.get("offset", 0)),
+            int(params.get("limit", 100)),
+            min(float(params.get("timeout", 0)), _MAX_POLL_TIMEOUT),
+        )
+    return True
+
+
+def _handler(state: FakeTelegramState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Заголовки и тело уходят отдельными записями, с Nagle каждая пара ждёт ACK
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args) -> None:
+            pass
+
+        def _handle(self) -> None:
+            url = urlparse(self.path)
+            # /bot<token>/<method>
+            method = url.path.rsplit("/", 1)[-1]
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+            time.sleep(state.latency)
+            message_id = state.record(method, int(params.get("chat_id", 0) or 0))
+            body = json.dumps({"ok": True, "result": _result(state, method, message_id, params)}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        do_GET = _handle
+        do_POST = _handle
+
+    return Handler
+
+
+def start_fake_telegram(state: FakeTelegramState) -> ThreadingHTTPServer:
+    """Запускает фейковый Bot API на свободном порту в фоновом потоке."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-telegram", daemon=True).start()
+    return server
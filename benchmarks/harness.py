@@ -0,0 +1,160 @@
+import asyncio
+import json
+import resource
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, NamedTuple, Optional
+
+
+class Result(NamedTuple):
+    """Итог одного сценария: latency — время одного вызова, seconds — всего прогона."""
+
+    name: str
+    operations: int
+    seconds: float
+    p50_ms: float
+    p99_ms: float
+    peak_rss_mb: float
+
+    @property
+    def throughput(self) -> float:
+        return self.operations / self.seconds if self.seconds else 0.0
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss переживает exec и в дочернем процессе включает память
+    # родителя на момент fork, поэтому в Linux берём VmHWM самого процесса
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss в Linux — килобайты
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(
+    name: str,
+    func: Callable,
+    items: Iterable,
+    concurrency: int = 1,
+    wait: Optional[Callable[[], None]] = None,
+) -> Result:
+    """
+    Вызывает func для каждого элемента items из concurrency потоков.
+    Если задан wait, прогон считается законченным после его возврата —
+    так в пропускную способность попадает и фоновая работа (очереди, рендер).
+    """
+    items = list(items)
+    latencies = []
+
+    def _call(item) -> None:
+        start = time.perf_counter()
+        func(item)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(_call, items))
+    else:
+        for item in items:
+            _call(item)
+    if wait:
+        wait()
+    seconds = time.perf_counter() - start
+    return Result(
+        name,
+        len(items),
+        seconds,
+        percentile(latencies, 0.50) * 1000,
+        percentile(latencies, 0.99) * 1000,
+        peak_rss_mb(),
+    )
+
+
+async def measure_async(
+    name: str,
+    func: Callable,
+    items: Iterable,
+    concurrency: int = 1,
+    wait: Optional[Callable[[], None]] = None,
+) -> Result:
+    """То же, что measure, для корутин: не больше concurrency вызовов func одновременно."""
+    items = list(items)
+    latencies = []
+    slots = asyncio.Semaphore(concurrency)
+
+    async def _call(item) -> None:
+        async with slots:
+            start = time.perf_counter()
+            await func(item)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(_call(item) for item in items))
+    if wait:
+        await asyncio.to_thread(wait)
+    seconds = time.perf_counter() - start
+    return Result(
+        name,
+        len(items),
+        seconds,
+        percentile(latencies, 0.50) * 1000,
+        percentile(latencies, 0.99) * 1000,
+        peak_rss_mb(),
+    )
+
+
+def save_results(path: str, results: List[Result]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([r._asdict() for r in results], f, indent=4)
+
+
+def load_results(path: str) -> List[Result]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [Result(**r) for r in json.load(f)]
+
+
+def format_table(results: List[Result], baseline: Optional[List[Result]] = None) -> str:
+    """Таблица результатов; с baseline добавляется изменение пропускной способности и p99."""
+    base = {r.name: r for r in baseline or []}
+    header = ["scenario", "ops", "ops/s", "p50 ms", "p99 ms", "peak RSS MB"]
+    if base:
+        header += ["Δ ops/s", "Δ p99"]
+    rows = [header]
+    for r in results:
+        row = [
+            r.name,
+            str(r.operations),
+            f"{r.throughput:.1f}",
+            f"{r.p50_ms:.3f}",
+            f"{r.p99_ms:.3f}",
+            f"{r.peak_rss_mb:.1f}",
+        ]
+        if base:
+            old = base.get(r.name)
+            row += [
+                _change(r.throughput, old.throughput) if old else "—",
+                _change(r.p99_ms, old.p99_ms) if old else "—",
+            ]
+        rows.append(row)
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    lines = [" | ".join(cell.ljust(w) for cell, w in zip(row, widths)) for row in rows]
+    lines.insert(1, "-+-".join("-" * w for w in widths))
+    return "\n".join(lines)
+
+
+def _change(new: float, old: float) -> str:
+    if not old:
+        return "—"
+    return f"{(new - old) / old * 100:+.1f}%"
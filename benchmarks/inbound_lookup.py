@@ -0,0 +1,86 @@
+"""
+Сравнение поиска клиента в большом списке inbound'ов: полный снимок
+(InboundSnapshot) против потокового разбора (Panel.find_client).
+Каждый способ запускается в отдельном процессе, чтобы пиковый RSS
+относился только к нему; строка idle — процесс с импортами без поиска.
+
+    python -m benchmarks.inbound_lookup --inbounds 10 --clients 10000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from benchmarks.fake_panel import FakePanelState, start_fake_panel
+from benchmarks.harness import Result, format_table, measure
+
+APPROACHES = ("idle", "snapshot", "stream_first", "stream_last")
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--inbounds", type=int, default=10)
+    parser.add_argument("--clients", type=int, default=10_000, help="клиентов в каждом inbound'е")
+    parser.add_argument("--repeats", type=int, default=5, help="поисков в каждом процессе")
+    parser.add_argument("--child", choices=APPROACHES, help=argparse.SUPPRESS)
+    parser.add_argument("--first", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--last", type=int, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def _child(args) -> None:
+    # Окружение уже настроено родителем, config читает его при импорте
+    from api_client import InboundSnapshot, panels
+
+    panel = panels[0]
+    lookups = {
+        "idle": lambda: None,
+        "snapshot": lambda: InboundSnapshot(panel.list_inbounds()).find(str(args.last)),
+        "stream_first": lambda: panel.find_client(args.first),
+        "stream_last": lambda: panel.find_client(args.last),
+    }
+    lookup = lookups[args.child]
+    result = measure(args.child, lambda _: lookup(), range(args.repeats))
+    print(json.dumps(result._asdict()))
+
+
+def main(argv=None) -> None:
+    args = _parse_args(argv)
+    if args.child:
+        return _child(args)
+
+    state = FakePanelState(args.inbounds, args.clients)
+    panel = start_fake_panel(state)
+    workdir = tempfile.mkdtemp(prefix="bot-bench-")
+    env = dict(
+        os.environ,
+        API_URL=f"http://127.0.0.1:{panel.server_port}",
+        API_AUTH_LOGIN="admin",
+        API_AUTH_PASSWORD="admin",
+        PLACEMENTS_FILE=os.path.join(workdir, "placements.json"),
+    )
+    results = []
+    for approach in APPROACHES:
+        output = subprocess.run(
+            [
+                sys.executable, "-m", "benchmarks.inbound_lookup",
+                "--child", approach,
+                "--repeats", str(args.repeats),
+                "--first", str(state.first_tg_id),
+                "--last", str(state.last_tg_id),
+            ],
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        results.append(Result(**json.loads(output.strip().splitlines()[-1])))
+
+    size_mb = len(state.list_body()) / 1024 / 1024
+    print(f"clients={args.inbounds * args.clients} inbounds/list={size_mb:.1f} MB")
+    print(format_table(results))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
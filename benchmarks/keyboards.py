@@ -0,0 +1,52 @@
+"""
+Микробенчмарк клавиатур: прежний путь (новый InlineKeyboardMarkup и его
+сериализация telebot'ом на каждую отправку) против JSON, собранного один
+раз, с подстановкой user_id в клавиатуру одобрения заявки.
+
+    python -m benchmarks.keyboards --messages 200000
+"""
+import argparse
+import sys
+from telebot.apihelper import _convert_markup
+from benchmarks.harness import format_table, measure
+
+FIRST_USER_ID = 1_000_000
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200_000, help="отправок в каждом сценарии")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = _parse_args(argv)
+    from handlers.keyboards import (
+        approve_keyboard,
+        make_approve_management_keyboard,
+        make_user_keyboard,
+        user_keyboard,
+    )
+
+    # _convert_markup — то, что telebot делает с reply_markup перед запросом
+    scenarios = {
+        "user rebuild": lambda _: _convert_markup(make_user_keyboard()),
+        "user cached": lambda _: _convert_markup(user_keyboard()),
+        "approve rebuild": lambda uid: _convert_markup(make_approve_management_keyboard(uid)),
+        "approve cached": lambda uid: _convert_markup(approve_keyboard(uid)),
+    }
+    users = range(FIRST_USER_ID, FIRST_USER_ID + args.messages)
+    for kind in ("user", "approve"):
+        rebuilt = scenarios[f"{kind} rebuild"](FIRST_USER_ID)
+        if rebuilt != scenarios[f"{kind} cached"](FIRST_USER_ID):
+            raise SystemExit(f"cached {kind} keyboard differs: {rebuilt}")
+
+    results = [measure(name, func, users) for name, func in scenarios.items()]
+    print(f"messages={args.messages}")
+    print(format_table(results))
+    for rebuild, cached in (results[0:2], results[2:4]):
+        print(f"{cached.name}: x{cached.throughput / rebuild.throughput:.1f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
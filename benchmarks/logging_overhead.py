@@ -0,0 +1,73 @@
+"""
+Накладные расходы логирования на вызывающий поток: сколько обработчик
+тратит на одну запись при синхронной записи в поток и через очередь,
+в текстовом и JSON-формате, а также на отключённый debug с f-строкой
+и с ленивыми аргументами. Поток вывода имитирует stderr с задержкой.
+
+    python -m benchmarks.logging_overhead --records 20000 --sink-latency 20
+"""
+import argparse
+import logging
+import sys
+import time
+from benchmarks.harness import format_table, measure
+
+CONNECTION = "vless://00000000-0000-0000-0000-000010000000@vpn.example.com:443?type=tcp#bench-user"
+
+
+class SlowSink:
+    """Поток вывода, каждая запись в который занимает latency секунд, как медленный stderr."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.lines = 0
+
+    def write(self, text: str) -> None:
+        self.lines += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def flush(self) -> None:
+        pass
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=20_000)
+    parser.add_argument("--sink-latency", type=float, default=20.0, help="задержка записи в поток, мкс")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = _parse_args(argv)
+    import logger
+    from logger import api_logger
+
+    records = range(args.records)
+    results = []
+    for mode, fmt in (("sync", "text"), ("queue", "text"), ("queue", "json")):
+        sink = SlowSink(args.sink_latency / 1_000_000)
+        logger.configure("INFO", fmt, mode, sink)
+        name = f"{mode}_{fmt}"
+        result = measure(
+            name,
+            lambda i: api_logger.info("Connection string for user with id=%s is %s", i, CONNECTION),
+            records,
+        )
+        start = time.perf_counter()
+        logger.flush()
+        drain = time.perf_counter() - start
+        results.append(result)
+        print(f"{name}: written={sink.lines} background drain after the loop={drain * 1000:.0f} ms", file=sys.stderr)
+
+    logger.configure("INFO", "text", "queue", SlowSink(0))
+    user = {"id": 1, "email": "user1", "flow": "xtls-rprx-vision"}
+    results.append(measure("debug_off_fstring", lambda i: api_logger.debug(f"Client {i}: {user} {CONNECTION}"), records))
+    results.append(measure("debug_off_lazy", lambda i: api_logger.debug("Client %s: %s %s", i, user, CONNECTION), records))
+    logger.flush()
+    logging.shutdown()
+    print(format_table(results))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,194 @@
+"""
+Проверки метрик: timer и timed пишут в гистограмму и для функций,
+и для корутин, в том числе при исключении; после /start, одобрения и
+get_qr против фейковых панели и Bot API заполнены гистограммы запросов
+к панели, хранилища, рендера QR и обработчиков, счётчики кэшей и сбоев
+отправки; /metrics отдаётся по HTTP. В конце — цена timer на горячем пути.
+
+    python -m benchmarks.metrics_checks --calls 100000
+"""
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import urllib.request
+from argparse import Namespace
+from benchmarks.fake_panel import FakePanelState, start_fake_panel
+from benchmarks.fake_telegram import FakeTelegramState, start_fake_telegram
+from benchmarks.harness import format_table, measure
+from benchmarks.run import _callback, _configure, _message
+
+ADMIN_ID = 1
+USER_ID = 1_000_000
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=100000, help="вызовов в замере цены timer")
+    parser.add_argument("--verbose", action="store_true", help="не глушить логи бота")
+    return parser.parse_args(argv)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _count(registry, name: str, **labels) -> float:
+    return registry.get_sample_value(name, labels) or 0.0
+
+
+def _decorators() -> str:
+    from prometheus_client import CollectorRegistry, Histogram
+    from metrics import timed, timer
+
+    registry = CollectorRegistry()
+    histogram = Histogram("check_seconds", "Проверка", ["path"], registry=registry)
+
+    @timed(histogram, "sync")
+    def sync_call() -> int:
+        return 1
+
+    @timed(histogram, "async")
+    async def async_call() -> int:
+        return 2
+
+    @timed(histogram, "error")
+    def failing_call() -> None:
+        raise RuntimeError("boom")
+
+    if sync_call() != 1 or asyncio.run(async_call()) != 2:
+        raise SystemExit("timed: wrapped functions returned wrong values")
+    try:
+        failing_call()
+    except RuntimeError:
+        pass
+    with timer(histogram, "block"):
+        pass
+    for path in ("sync", "async", "error", "block"):
+        if _count(registry, "check_seconds_count", path=path) != 1:
+            raise SystemExit(f"timed: no observation for {path}")
+    return "decorators: timed and timer observe functions, coroutines, exceptions and with-blocks"
+
+
+def _hot_paths(telegram: FakeTelegramState) -> str:
+    from prometheus_client import REGISTRY
+    import admin_handlers
+    import client_handlers
+
+    client_handlers.cmd_start(_message(USER_ID, "/start"))
+    admin_handlers.handle_approve(_callback(ADMIN_ID, f"approve:{USER_ID}"))
+    photos = telegram.calls.get("sendPhoto", 0)
+    client_handlers.cmd_send_qr(_callback(USER_ID, "get_qr"))
+    telegram.wait_for("sendPhoto", photos + 1)
+
+    expected = {
+        "panel_request_seconds_count": [
+            {"endpoint": "/login"},
+            {"endpoint": "/panel/api/inbounds/list"},
+            {"endpoint": "/panel/api/inbounds/addClient"},
+        ],
+        "storage_operation_seconds_count": [
+            {"operation": "add", "collection": "approval_requests"},
+            {"operation": "remove_many", "collection": "approval_requests"},
+        ],
+        "qr_render_seconds_count": [{}],
+        "handler_seconds_count": [
+            {"handler": "cmd_start"},
+            {"handler": "handle_approve"},
+            {"handler": "cmd_send_qr"},
+        ],
+        "cache_requests_total": [
+            {"cache": "inbounds", "result": "miss"},
+            {"cache": "qr_png", "result": "miss"},
+        ],
+    }
+    missing = [
+        f"{name}{labels}"
+        for name, label_sets in expected.items()
+        for labels in label_sets
+        if not _count(REGISTRY, name, **labels)
+    ]
+    if missing:
+        raise SystemExit(f"hot paths: no samples for {', '.join(missing)}")
+    return f"hot paths: {sum(len(v) for v in expected.values())} series filled by /start, approve and get_qr"
+
+
+def _send_failures() -> str:
+    from prometheus_client import REGISTRY
+    from sender import MessageSender
+
+    def failing(chat_id: int, text: str, **kwargs):
+        raise RuntimeError("Bot API is down")
+
+    before = _count(REGISTRY, "telegram_send_failures_total", reason="error")
+    sender = MessageSender(failing, max_retries=0)
+    sender.start()
+    sender.send_message(ADMIN_ID, "lost")
+    sender.stop()
+    if _count(REGISTRY, "telegram_send_failures_total", reason="error") != before + 1:
+        raise SystemExit("send failures: telegram_send_failures_total did not grow")
+    return "send failures: counted"
+
+
+def _endpoint(port: int) -> str:
+    from metrics import start_metrics_server
+
+    start_metrics_server()
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as resp:
+        body = resp.read().decode()
+    for name in ("panel_request_seconds", "storage_operation_seconds", "qr_render_seconds", "handler_seconds"):
+        if f"{name}_bucket" not in body:
+            raise SystemExit(f"/metrics: {name} is missing")
+    return f"/metrics: served on port {port}, {len(body.splitlines())} lines"
+
+
+def _overhead(args):
+    from prometheus_client import CollectorRegistry, Histogram
+    from metrics import timer
+
+    histogram = Histogram("overhead_seconds", "Цена timer", ["path"], registry=CollectorRegistry())
+
+    def bare(_) -> None:
+        pass
+
+    def timed_call(_) -> None:
+        with timer(histogram, "hot"):
+            pass
+
+    return [measure("bare call", bare, range(args.calls)), measure("with timer", timed_call, range(args.calls))]
+
+
+def main(argv=None) -> None:
+    args = _parse_args(argv)
+    telegram = FakeTelegramState()
+    panel = start_fake_panel(FakePanelState(2, 100))
+    bot_api = start_fake_telegram(telegram)
+    port = _free_port()
+    os.environ["METRICS_PORT"] = str(port)
+    _configure(
+        Namespace(storage="json", verbose=args.verbose),
+        tempfile.mkdtemp(prefix="bot-bench-"),
+        f"http://127.0.0.1:{panel.server_port}",
+        f"http://127.0.0.1:{bot_api.server_port}",
+    )
+
+    # Модули бота импортируются только после настройки окружения
+    from bot import sender
+    from handlers.storage import _backend
+    from handlers.storage_backend import ADMINS
+
+    _backend.add(ADMINS, {"user_id": ADMIN_ID})
+    sender.start()
+    print(_decorators())
+    print(_hot_paths(telegram))
+    print(_send_failures())
+    print(_endpoint(port))
+    print(format_table(_overhead(args)))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,125 @@
+"""
+Отказ панели 3x-ui посреди работы бота. Панель зависает дольше API_TIMEOUT,
+бот продолжает выдавать строки подключения и одобрять пользователей,
+затем панель восстанавливается. Проверяется, что чтения обслуживаются из
+последнего удачного снимка, регистрации откладываются и повторяются после
+восстановления, а с размыкателем запросы не ждут таймаутов. Из отложенных
+один пользователь попадает на панель ещё до восстановления (повтор —
+дубль, регистрация засчитывается), а другого панель отклоняет, и его
+получает обработчик отклонённых.
+
+    python -m benchmarks.panel_outage --requests 50
+    PANEL_BREAKER_THRESHOLD=0 python -m benchmarks.panel_outage --requests 10
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from benchmarks.fake_panel import FakePanelState, start_fake_panel
+from benchmarks.harness import format_table, measure
+
+ADD_CLIENT = "/panel/api/inbounds/addClient"
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50, help="запросов строки подключения в каждой фазе")
+    parser.add_argument("--new-users", type=int, default=10, help="пользователей, одобряемых во время сбоя")
+    parser.add_argument("--timeout", type=float, default=0.5, help="API_TIMEOUT, секунды")
+    parser.add_argument("--reset", type=float, default=1.0, help="PANEL_BREAKER_RESET, секунды")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--verbose", action="store_true", help="не глушить логи бота")
+    return parser.parse_args(argv)
+
+
+def _configure(args, workdir: str, panel_url: str) -> None:
+    """Настраивает окружение до импорта модулей бота: config читает его при импорте."""
+    os.environ.update(
+        {
+            "API_URL": panel_url,
+            "API_AUTH_LOGIN": "admin",
+            "API_AUTH_PASSWORD": "admin",
+            "API_TIMEOUT": str(args.timeout),
+            "INBOUNDS_CACHE_TTL": "0.1",
+            "PANEL_BREAKER_RESET": str(args.reset),
+        }
+    )
+    for name in ("PLACEMENTS_FILE", "PENDING_CLIENTS_FILE"):
+        os.environ[name] = os.path.join(workdir, f"{name.lower()}.json")
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+
+def main(argv=None) -> None:
+    args = _parse_args(argv)
+    state = FakePanelState(1, args.requests)
+    state.hang = args.timeout * 4
+    panel = start_fake_panel(state)
+    _configure(args, tempfile.mkdtemp(prefix="bot-bench-"), f"http://127.0.0.1:{panel.server_port}")
+
+    # Модули бота импортируются только после настройки окружения
+    import api_client
+    from handlers.storage import load_pending_clients
+
+    users = range(state.first_tg_id, state.last_tg_id + 1)
+    new_users = [(state.last_tg_id + 1 + i, f"new{i}") for i in range(args.new_users)]
+    served = []
+    rejected = []
+    # Обработчик отклонённых запоминается и для повторов после восстановления
+    api_client.start_replay(rejected.extend).join()
+
+    def lookup(user_id: int) -> None:
+        served.append(api_client.get_connection_string(user_id) is not None)
+
+    def phase(name: str):
+        served.clear()
+        time.sleep(0.2)  # снимок устаревает по INBOUNDS_CACHE_TTL
+        result = measure(name, lookup, users, args.concurrency)
+        return result, sum(served)
+
+    results = [phase("healthy")]
+    state.fault = "hang"
+    results.append(phase("outage"))
+
+    added_before = state.requests.get(ADD_CLIENT, 0)
+    started = time.perf_counter()
+    approved = api_client.add_clients(new_users)
+    approve_seconds = time.perf_counter() - started
+    deferred = len(load_pending_clients())
+    sent_during_outage = state.requests.get(ADD_CLIENT, 0) - added_before
+
+    # Первый отложенный всё же дошёл до панели, второго она не примет
+    duplicate, refused = new_users[0][0], new_users[1][0]
+    state.add_clients(1, [api_client._build_client(*new_users[0])])
+    state.reject.add(str(refused))
+
+    state.fault = None
+    time.sleep(args.reset)
+    results.append(phase("recovered"))
+    deadline = time.monotonic() + 10
+    while (load_pending_clients() or not rejected) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    registered = sum(
+        api_client.get_connection_string(user_id) is not None for user_id, _ in new_users
+    )
+    if rejected != [refused]:
+        raise SystemExit(f"rejected deferred users: {rejected}, expected [{refused}]")
+    if api_client.get_connection_string(duplicate) is None:
+        raise SystemExit(f"deferred user {duplicate} registered before recovery was lost")
+
+    breaker = api_client.panels[0].breaker
+    print(
+        f"threshold={breaker.threshold} timeout={args.timeout}s "
+        f"approved_during_outage={sum(approved.values())}/{len(new_users)} in {approve_seconds:.2f}s "
+        f"deferred={deferred} addClient_during_outage={sent_during_outage} "
+        f"registered_after_recovery={registered} rejected={len(rejected)} "
+        f"pending_left={len(load_pending_clients())}"
+    )
+    print("served: " + " ".join(f"{r.name}={ok}/{r.operations}" for r, ok in results))
+    print(format_table([r for r, _ in results]))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
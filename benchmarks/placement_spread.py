@@ -0,0 +1,177 @@
+"""
+Равномерность размещения новых клиентов по панелям и inbound'ам.
+Сначала модель: assign раскладывает пачки пользователей по inbound'ам
+с неравной начальной загрузкой, после выравнивания разброс числа клиентов
+должен быть не больше одного. Затем то же через api_client.add_clients
+против нескольких фейковых панелей 3x-ui, а после — проверка, что
+get_connection_string ходит только на панель-владельца клиента, а если
+записанная панель-владелец недоступна, клиент ищется на остальных.
+
+    python -m benchmarks.placement_spread --users 3000 --panels 3 --inbounds 4
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+from argparse import Namespace
+from benchmarks.fake_panel import FakePanelState, start_fake_panel
+from benchmarks.harness import format_table, measure
+
+FIRST_USER_ID = 1_000_000
+LIST = "/panel/api/inbounds/list"
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=3000, help="новых пользователей")
+    parser.add_argument("--panels", type=int, default=3, help="фейковых панелей")
+    parser.add_argument("--inbounds", type=int, default=4, help="inbound'ов на каждой панели")
+    parser.add_argument("--max-batch", type=int, default=50, help="наибольшая пачка одобрений")
+    parser.add_argument("--lookups", type=int, default=50, help="проверок панели-владельца")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="не глушить логи бота")
+    return parser.parse_args(argv)
+
+
+def _batches(users: list, rng: random.Random, max_batch: int) -> list:
+    batches = []
+    while users:
+        size = rng.randint(1, max_batch)
+        batches.append(users[:size])
+        users = users[size:]
+    return batches
+
+
+def _spread(counts: list) -> int:
+    return max(counts) - min(counts)
+
+
+def _check_spread(name: str, counts: list) -> str:
+    if _spread(counts) > 1:
+        raise SystemExit(f"{name}: uneven spread {counts}")
+    return f"{name}: clients per inbound {min(counts)}..{max(counts)}"
+
+
+def _simulate(args, rng: random.Random) -> str:
+    """Только assign: загрузка inbound'ов обновляется после каждой пачки, как после сброса снимка."""
+    from placement import Candidate, assign
+
+    nodes = args.panels * args.inbounds
+    counts = [rng.randrange(args.users // nodes + 1) for _ in range(nodes)]
+    users = [(FIRST_USER_ID + i, f"user{i}") for i in range(args.users)]
+    for batch in _batches(users, rng, args.max_batch):
+        candidates = [Candidate(f"panel-{i // args.inbounds}", i, c, 0) for i, c in enumerate(counts)]
+        for candidate, assigned in assign(batch, candidates, "clients"):
+            counts[candidate.inbound_id] += len(assigned)
+    return _check_spread("model", counts)
+
+
+def _panel_counts(states: list) -> list:
+    counts = []
+    for state in states:
+        with state.lock:
+            counts += [len(json.loads(i["settings"])["clients"]) for i in state.inbounds]
+    return counts
+
+
+def _configure(args, workdir: str, panels: list) -> None:
+    from benchmarks.run import _configure as configure_bot
+
+    panels_file = os.path.join(workdir, "panels.json")
+    with open(panels_file, "w", encoding="utf-8") as f:
+        json.dump(panels, f)
+    os.environ["PANELS_FILE"] = panels_file
+    # Снимок сбрасывается после каждой записи, TTL только мешал бы сравнению запросов
+    os.environ["INBOUNDS_CACHE_TTL"] = "3600"
+    configure_bot(Namespace(storage="json", verbose=args.verbose), workdir, panels[0]["url"], "http://127.0.0.1:9")
+
+
+def _owner_lookups(args, states: list, users: list) -> str:
+    """Холодный кэш, один пользователь: inbounds/list должна запросить только его панель."""
+    import api_client
+    from handlers.storage import get_placement
+
+    names = [p.name for p in api_client.panels]
+    strays = 0
+    for user_id in random.Random(args.seed).sample(users, args.lookups):
+        api_client.invalidate_inbounds_cache()
+        before = [s.requests.get(LIST, 0) for s in states]
+        if api_client.get_connection_string(user_id) is None:
+            raise SystemExit(f"lookup: no connection string for user {user_id}")
+        asked = [names[i] for i, s in enumerate(states) if s.requests.get(LIST, 0) > before[i]]
+        if asked != [get_placement(user_id)["panel"]]:
+            strays += 1
+    if strays:
+        raise SystemExit(f"lookup: {strays} of {args.lookups} lookups asked panels other than the owner")
+    return f"lookup: {args.lookups} cold lookups asked only the owner panel"
+
+
+def _owner_down(states: list, user_id: int) -> str:
+    """Запись о владельце устарела, а записанная панель лежит и ни разу не отдала снимок."""
+    import api_client
+    from handlers.storage import get_placement, set_placements
+
+    names = [p.name for p in api_client.panels]
+    placement = get_placement(user_id)
+    home = names.index(placement["panel"])
+    stale = (home + 1) % len(names)
+    set_placements([dict(placement, panel=names[stale])])
+    states[stale].fault = "error"
+    api_client.panels[stale].cache.last_good = None
+    api_client.invalidate_inbounds_cache()
+    try:
+        if api_client.get_connection_string(user_id) is None:
+            raise SystemExit(f"owner down: lookup of user {user_id} stopped at unavailable panel {names[stale]}")
+    finally:
+        states[stale].fault = None
+    if get_placement(user_id)["panel"] != names[home]:
+        raise SystemExit(f"owner down: placement of user {user_id} was not corrected")
+    return f"owner down: client found on {names[home]} while {names[stale]} was unavailable"
+
+
+def main(argv=None) -> None:
+    args = _parse_args(argv)
+    rng = random.Random(args.seed)
+    print(_simulate(args, rng))
+
+    # Панели с разной начальной загрузкой и непересекающимися tgId
+    per_inbound = args.users // (args.panels * args.inbounds)
+    states = [
+        FakePanelState(args.inbounds, rng.randrange(per_inbound + 1), first_tg_id=10_000_000 * (i + 1))
+        for i in range(args.panels)
+    ]
+    servers = [start_fake_panel(state) for state in states]
+    panels = [
+        {
+            "name": f"panel-{i}",
+            "url": f"http://127.0.0.1:{server.server_port}",
+            "login": "admin",
+            "password": "admin",
+        }
+        for i, server in enumerate(servers)
+    ]
+    _configure(args, tempfile.mkdtemp(prefix="bot-bench-"), panels)
+
+    # Модули бота импортируются только после настройки окружения
+    import api_client
+
+    users = [(FIRST_USER_ID + i, f"user{i}") for i in range(args.users)]
+    failed = []
+    result = measure(
+        "add_clients",
+        lambda batch: failed.extend(u for u, ok in api_client.add_clients(batch).items() if not ok),
+        _batches(users, rng, args.max_batch),
+    )
+    if failed:
+        raise SystemExit(f"add_clients: {len(failed)} users were not registered")
+
+    print(_check_spread("panels", _panel_counts(states)))
+    print(_owner_lookups(args, states, [u for u, _ in users]))
+    print(_owner_down(states, users[0][0]))
+    print(format_table([result]))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
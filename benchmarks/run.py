@@ -0,0 +1,169 @@
+"""
+Нагрузочный прогон бота против локальных фейковой панели 3x-ui и фейкового
+Bot API. Сценарии вызывают настоящие обработчики: /start от новых
+пользователей, одобрение их заявок админом и запрос QR-кода.
+
+    python -m benchmarks.run --users 1000 --concurrency 8 --save before.json
+    python -m benchmarks.run --users 1000 --concurrency 8 --compare before.json
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from telebot import apihelper, types
+from benchmarks.fake_panel import FakePanelState, start_fake_panel
+from benchmarks.fake_telegram import FakeTelegramState, start_fake_telegram
+from benchmarks.harness import format_table, load_results, measure, save_results
+
+ADMIN_ID = 1
+FIRST_USER_ID = 1_000_000
+SCENARIOS = ("start", "approve", "get_qr")
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=500, help="новых пользователей в сценариях")
+    parser.add_argument("--concurrency", type=int, default=8, help="одновременных обработчиков")
+    parser.add_argument("--inbounds", type=int, default=4, help="inbound'ов на фейковой панели")
+    parser.add_argument("--clients", type=int, default=1000, help="клиентов в каждом inbound'е")
+    parser.add_argument("--panel-latency", type=float, default=5.0, help="задержка панели, мс")
+    parser.add_argument("--telegram-latency", type=float, default=1.0, help="задержка Bot API, мс")
+    parser.add_argument("--storage", choices=("json", "sqlite"), default="json")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="через запятую, по порядку")
+    parser.add_argument("--save", help="сохранить результаты в JSON")
+    parser.add_argument("--compare", help="сравнить с результатами из JSON")
+    parser.add_argument("--verbose", action="store_true", help="не глушить логи бота")
+    return parser.parse_args(argv)
+
+
+def _configure(args, workdir: str, panel_url: str, telegram_url: str) -> None:
+    """Настраивает окружение до импорта модулей бота: config читает его при импорте."""
+    os.environ.update(
+        {
+            "API_URL": panel_url,
+            "API_AUTH_LOGIN": "admin",
+            "API_AUTH_PASSWORD": "admin",
+            "BOT_TOKEN": "123456:benchmark",
+            "STORAGE_BACKEND": args.storage,
+            "STORAGE_DB_FILE": os.path.join(workdir, "bot.sqlite3"),
+        }
+    )
+    for name in (
+        "APPROVED_USERS_FILE",
+        "APPROVAL_REQUESTS_FILE",
+        "ADMIN_IDS_FILE",
+        "PLACEMENTS_FILE",
+        "SUBSCRIPTIONS_FILE",
+        "PENDING_CLIENTS_FILE",
+    ):
+        os.environ[name] = os.path.join(workdir, f"{name.lower()}.json")
+    apihelper.API_URL = f"{telegram_url}/bot{{0}}/{{1}}"
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+
+def _user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": "bench", "username": f"user{user_id}"}
+
+
+def _message(user_id: int, text: str) -> types.Message:
+    return types.Message.de_json(
+        {
+            "message_id": 1,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": _user(user_id),
+            "text": text,
+        }
+    )
+
+
+def _callback(user_id: int, data: str) -> types.CallbackQuery:
+    return types.CallbackQuery.de_json(
+        {
+            "id": str(user_id),
+            "from": _user(user_id),
+            "chat_instance": "benchmark",
+            "data": data,
+            "message": {
+                "message_id": 1,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "text": "",
+            },
+        }
+    )
+
+
+def main(argv=None) -> None:
+    args = _parse_args(argv)
+    panel_state = FakePanelState(args.inbounds, args.clients, args.panel_latency / 1000)
+    telegram = FakeTelegramState(args.telegram_latency / 1000)
+    panel = start_fake_panel(panel_state)
+    bot_api = start_fake_telegram(telegram)
+    workdir = tempfile.mkdtemp(prefix="bot-bench-")
+    _configure(
+        args,
+        workdir,
+        f"http://127.0.0.1:{panel.server_port}",
+        f"http://127.0.0.1:{bot_api.server_port}",
+    )
+
+    # Модули бота импортируются только после настройки окружения
+    from handlers.storage import _backend
+    from handlers.storage_backend import ADMINS
+
+    _backend.add(ADMINS, {"user_id": ADMIN_ID})
+    from bot import sender
+    import admin_handlers
+    import client_handlers
+
+    sender.start()
+    users = range(FIRST_USER_ID, FIRST_USER_ID + args.users)
+    scenarios = {
+        "start": lambda: measure(
+            "start",
+            lambda uid: client_handlers.cmd_start(_message(uid, "/start")),
+            users,
+            args.concurrency,
+        ),
+        "approve": lambda: measure(
+            "approve",
+            lambda uid: admin_handlers.handle_approve(_callback(ADMIN_ID, f"approve:{uid}")),
+            users,
+            args.concurrency,
+        ),
+        "get_qr": lambda: _measure_get_qr(client_handlers, telegram, users, args.concurrency),
+    }
+
+    results = []
+    for name in args.scenarios.split(","):
+        results.append(scenarios[name]())
+    baseline = load_results(args.compare) if args.compare else None
+    print(
+        f"users={args.users} concurrency={args.concurrency} storage={args.storage} "
+        f"inbounds={args.inbounds}x{args.clients} panel_latency={args.panel_latency}ms "
+        f"panel_requests={sum(panel_state.requests.values())}"
+    )
+    print(format_table(results, baseline))
+    if args.save:
+        save_results(args.save, results)
+
+
+def _measure_get_qr(client_handlers, telegram: FakeTelegramState, users, concurrency: int):
+    # QR отправляется из пула рендера уже после возврата обработчика,
+    # поэтому прогон заканчивается, когда Bot API получил все фото
+    expected = telegram.calls.get("sendPhoto", 0) + len(users)
+    return measure(
+        "get_qr",
+        lambda uid: client_handlers.cmd_send_qr(_callback(uid, "get_qr")),
+        users,
+        concurrency,
+        wait=lambda: telegram.wait_for("sendPhoto", expected),
+    )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,196 @@
+"""
+Проверки очереди исходящих сообщений (sender.MessageSender) на фейковом
+транспорте вместо Bot API: общий темп на весь бот, темп на чат, порядок
+сообщений в чате, пауза по retry_after после 429, склейка уведомлений
+о заявках в дайджест и то, что медленный Telegram не держит обработчик.
+
+    python -m benchmarks.sender_checks --rate 50
+"""
+import argparse
+import sys
+import threading
+import time
+
+# Запас на неточность таймеров при сравнении интервалов
+_SLACK = 0.02
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=50.0, help="общий темп, сообщений в секунду")
+    parser.add_argument("--per-chat", type=float, default=10.0, help="темп одного чата, сообщений в секунду")
+    parser.add_argument("--messages", type=int, default=150, help="сообщений в проверке общего темпа")
+    return parser.parse_args(argv)
+
+
+class FloodError(Exception):
+    """Ответ 429 в том виде, в каком его отдаёт telebot."""
+
+    error_code = 429
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Too Many Requests: retry after {retry_after}")
+        self.result_json = {"parameters": {"retry_after": retry_after}}
+
+
+class FakeTransport:
+    """
+    Вместо bot.send_message: запоминает вызовы со временем отправки.
+    flood — сколько раз подряд ответить 429 каждому из чатов, delay — задержка ответа.
+    """
+
+    def __init__(self, delay: float = 0.0, flood=None, retry_after: float = 0.2):
+        self.delay = delay
+        self.flood = flood or {}
+        self.retry_after = retry_after
+        self.calls = []
+        self.floods = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, chat_id: int, text, **kwargs):
+        time.sleep(self.delay)
+        with self.lock:
+            if self.floods.get(chat_id, 0) < self.flood.get(chat_id, 0):
+                self.floods[chat_id] = self.floods.get(chat_id, 0) + 1
+                raise FloodError(self.retry_after)
+            if hasattr(text, "read"):
+                text = text.read()
+            self.calls.append((time.monotonic(), chat_id, text, kwargs))
+        return text
+
+    def times(self, chat_id: int) -> list:
+        return [t for t, chat, _, _ in self.calls if chat == chat_id]
+
+
+def _sender(transport, args, **kwargs):
+    from sender import MessageSender
+
+    options = dict(global_rate=args.rate, per_chat_rate=args.per_chat, workers=4, max_retries=3)
+    options.update(kwargs)
+    sender = MessageSender(transport, transport, **options)
+    sender.start()
+    return sender
+
+
+def _global_rate(args) -> str:
+    transport = FakeTransport()
+    sender = _sender(transport, args)
+    for i in range(args.messages):
+        sender.send_message(i, f"message {i}")
+    sender.stop()
+    started, finished = transport.calls[0][0], transport.calls[-1][0]
+    # Ведро полное на старте: первые rate сообщений уходят сразу
+    expected = (args.messages - args.rate) / args.rate
+    if finished - started < expected - _SLACK:
+        raise SystemExit(f"global rate: {args.messages} messages in {finished - started:.2f}s, expected >= {expected:.2f}s")
+    return f"global rate: {args.messages} messages to different chats in {finished - started:.2f}s (>= {expected:.2f}s)"
+
+
+def _per_chat_order(args) -> str:
+    transport = FakeTransport()
+    sender = _sender(transport, args)
+    for i in range(10):
+        sender.send_message(1, f"message {i}")
+        sender.send_message(2, f"message {i}")
+    sender.stop()
+    interval = 1 / args.per_chat
+    for chat_id in (1, 2):
+        texts = [text for _, chat, text, _ in transport.calls if chat == chat_id]
+        if texts != [f"message {i}" for i in range(10)]:
+            raise SystemExit(f"per-chat order: chat {chat_id} got {texts}")
+        times = transport.times(chat_id)
+        gaps = [b - a for a, b in zip(times, times[1:])]
+        if min(gaps) < interval - _SLACK:
+            raise SystemExit(f"per-chat rate: gap {min(gaps):.3f}s in chat {chat_id}, expected >= {interval:.3f}s")
+    return f"per-chat: messages stay in order, gaps >= {interval:.2f}s"
+
+
+def _retry_after(args) -> str:
+    transport = FakeTransport(flood={1: 1}, retry_after=0.3)
+    sender = _sender(transport, args)
+    started = time.monotonic()
+    sender.send_message(1, "first")
+    sender.send_message(1, "second")
+    sender.send_message(2, "other chat")
+    sender.stop()
+    first = transport.times(1)[0] - started
+    other = transport.times(2)[0] - started
+    texts = [text for _, chat, text, _ in transport.calls if chat == 1]
+    if first < 0.3 - _SLACK:
+        raise SystemExit(f"retry_after: retried after {first:.2f}s, expected >= 0.3s")
+    if texts != ["first", "second"]:
+        raise SystemExit(f"retry_after: chat got {texts} after a flood error")
+    if other >= 0.3:
+        raise SystemExit(f"retry_after: a flood in one chat delayed another by {other:.2f}s")
+    return f"retry_after: chat paused {first:.2f}s after 429, order kept, other chats not delayed"
+
+
+def _give_up(args) -> str:
+    transport = FakeTransport(flood={1: 10}, retry_after=0.01)
+    sender = _sender(transport, args, max_retries=2)
+    done = []
+    sender.send_photo(1, b"png", on_done=done.append)
+    sender.send_message(2, "other chat")
+    sender.stop()
+    if done != [None]:
+        raise SystemExit(f"give up: on_done got {done}, expected [None]")
+    if transport.floods[1] != 3 or transport.times(2) == []:
+        raise SystemExit(f"give up: {transport.floods[1]} attempts, other chat sent: {bool(transport.times(2))}")
+    return "give up: 3 attempts, then on_done(None); other chats unaffected"
+
+
+def _photo_retry(args) -> str:
+    transport = FakeTransport(flood={1: 1}, retry_after=0.01)
+    sender = _sender(transport, args)
+    done = []
+    sender.send_photo(1, b"png-bytes", on_done=done.append)
+    sender.stop()
+    # После 429 файл открывается заново, а не отправляется дочитанным
+    if done != [b"png-bytes"]:
+        raise SystemExit(f"photo retry: uploaded {done}, expected the full picture")
+    return "photo retry: picture re-uploaded in full after 429"
+
+
+def _digest(args) -> str:
+    from handlers.approvals import new_requests_digest
+
+    transport = FakeTransport(delay=0.2)
+    sender = _sender(transport, args)
+    # Первое уведомление занимает чат админа, остальные копятся в очереди
+    sender.send_message(1, "request 0", digest=new_requests_digest, reply_markup="markup 0")
+    time.sleep(0.05)
+    for i in range(1, 20):
+        sender.send_message(1, f"request {i}", digest=new_requests_digest, reply_markup=f"markup {i}")
+    sender.stop()
+    if len(transport.calls) != 2:
+        raise SystemExit(f"digest: {len(transport.calls)} messages to the admin, expected 2")
+    _, _, text, kwargs = transport.calls[1]
+    if "Новых заявок: 19" not in text or kwargs:
+        raise SystemExit(f"digest: unexpected digest {text!r} {kwargs}")
+    return "digest: 20 pending-request notifications reached the admin as 2 messages"
+
+
+def _fan_out(args) -> str:
+    transport = FakeTransport(delay=0.05)
+    sender = _sender(transport, args, workers=8)
+    started = time.perf_counter()
+    for admin_id in range(16):
+        sender.send_message(admin_id, "new request")
+    enqueued = time.perf_counter() - started
+    sender.stop()
+    sent = transport.calls[-1][0] - transport.calls[0][0]
+    if enqueued > 0.01:
+        raise SystemExit(f"fan-out: enqueueing 16 messages took {enqueued * 1000:.1f} ms")
+    if sent > 16 * 0.05 / 2:
+        raise SystemExit(f"fan-out: 16 admins took {sent:.2f}s, sends are not concurrent")
+    return f"fan-out: 16 admins enqueued in {enqueued * 1000:.2f} ms, sent in {sent:.2f}s by 8 workers"
+
+
+def main(argv=None) -> None:
+    args = _parse_args(argv)
+    for check in (_global_rate, _per_chat_order, _retry_after, _give_up, _photo_retry, _digest, _fan_out):
+        print(check(args))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
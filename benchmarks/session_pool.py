@@ -0,0 +1,122 @@
+"""
+Пул сессий панели против фейковой панели 3x-ui: сколько раз бот ходит
+на /login. При постоянной нагрузке логинов не больше, чем сессий в пуле,
+после того как панель разлогинила всех, — ровно по одному на сессию.
+Отдельно проверяется отказ входа: ни один поток не должен зависнуть
+в ожидании сессии, а все сбои должны дойти до размыкателя.
+
+    python -m benchmarks.session_pool --requests 2000 --pool 4 --concurrency 16
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from benchmarks.fake_panel import FakePanelState, start_fake_panel
+from benchmarks.harness import format_table, measure
+
+LOGIN = "/login"
+LIST = "/panel/api/inbounds/list"
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="запросов inbounds/list в каждой фазе")
+    parser.add_argument("--pool", type=int, default=4, help="API_SESSION_POOL_SIZE")
+    parser.add_argument("--concurrency", type=int, default=16, help="одновременных запросов")
+    parser.add_argument("--panel-latency", type=float, default=1.0, help="задержка панели, мс")
+    parser.add_argument("--timeout", type=float, default=1.0, help="API_TIMEOUT, секунды")
+    parser.add_argument("--verbose", action="store_true", help="не глушить логи бота")
+    return parser.parse_args(argv)
+
+
+def _configure(args, panel_url: str) -> None:
+    """Настраивает окружение до импорта модулей бота: config читает его при импорте."""
+    os.environ.update(
+        {
+            "API_URL": panel_url,
+            "API_AUTH_LOGIN": "admin",
+            "API_AUTH_PASSWORD": "admin",
+            "API_TIMEOUT": str(args.timeout),
+            "PANEL_BREAKER_THRESHOLD": "3",
+        }
+    )
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+
+def _logins(state: FakePanelState) -> int:
+    with state.lock:
+        return state.requests.get(LOGIN, 0)
+
+
+def _phase(name: str, pool, state: FakePanelState, args):
+    before = _logins(state)
+    result = measure(name, lambda _: pool.request("GET", LIST).close(), range(args.requests), args.concurrency)
+    return result, _logins(state) - before
+
+
+def _failing_login(args, panel_url: str, state: FakePanelState) -> str:
+    """Пул на одну сессию, вход отвечает 503, шесть запросов одновременно."""
+    from api_client import SessionPool
+    from breaker import CircuitBreaker, CircuitOpenError
+
+    breaker = CircuitBreaker("failing-login", 3, 60)
+    pool = SessionPool(panel_url, "admin", "admin", breaker, 1)
+    state.fault = "login"
+    errors = {}
+
+    def call(_) -> None:
+        try:
+            pool.request("GET", LIST)
+        except Exception as e:
+            kind = "CircuitOpenError" if isinstance(e, CircuitOpenError) else type(e).__name__
+            errors[kind] = errors.get(kind, 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(6) as executor:
+        _, hung = wait([executor.submit(call, i) for i in range(6)], timeout=args.timeout * 6)
+    seconds = time.perf_counter() - started
+    state.fault = None
+    if hung:
+        raise SystemExit(f"failing login: {len(hung)} of 6 requests hung")
+    if breaker.state != "open":
+        raise SystemExit(f"failing login: breaker is {breaker.state}, expected open")
+    return f"failing login: 6 requests finished in {seconds:.2f}s errors={errors} breaker={breaker.state}"
+
+
+def main(argv=None) -> None:
+    args = _parse_args(argv)
+    state = FakePanelState(1, 100, args.panel_latency / 1000)
+    panel = start_fake_panel(state)
+    panel_url = f"http://127.0.0.1:{panel.server_port}"
+    _configure(args, panel_url)
+
+    # Модули бота импортируются только после настройки окружения
+    from api_client import SessionPool
+    from breaker import CircuitBreaker
+
+    pool = SessionPool(panel_url, "admin", "admin", CircuitBreaker("bench", 3, 60), args.pool)
+    results = []
+    warm, logins = _phase("warm", pool, state, args)
+    if logins > args.pool:
+        raise SystemExit(f"warm: {logins} logins for a pool of {args.pool} sessions")
+    results.append((warm, logins))
+
+    state.expire_sessions()
+    expired, logins = _phase("expired", pool, state, args)
+    if logins > args.pool:
+        raise SystemExit(f"expired: {logins} logins for a pool of {args.pool} sessions")
+    results.append((expired, logins))
+
+    print(
+        f"requests={args.requests} pool={args.pool} concurrency={args.concurrency} "
+        + " ".join(f"{r.name}_logins={logins}" for r, logins in results)
+    )
+    print(format_table([r for r, _ in results]))
+    print(_failing_login(args, panel_url, state))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
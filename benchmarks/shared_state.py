@@ -0,0 +1,240 @@
+"""
+Несколько экземпляров бота с общим состоянием. Каждый процесс-экземпляр
+принимает /start от одних и тех же пользователей, затем по сигналу все
+одновременно одобряют все заявки. Итог показывает, сколько одобрений
+потеряно и сколько клиентов зарегистрировано на панели дважды. Затем
+одобренным заводятся подписки, близкие к окончанию, и планировщики всех
+экземпляров разбирают их одновременно: каждому пользователю должно уйти
+ровно одно напоминание и одно сообщение об окончании. Проверка падает,
+если что-то потеряно или задвоено.
+
+С --storage redis экземпляры делят Redis-совместимый сервер: REDIS_URL
+из окружения, а без него — fakeredis, запущенный в этом процессе.
+
+    python -m benchmarks.shared_state --workers 4 --users 200 --storage redis
+    python -m benchmarks.shared_state --workers 4 --users 200 --storage json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from benchmarks.fake_panel import FakePanelState, start_fake_panel
+from benchmarks.fake_telegram import FakeTelegramState, start_fake_telegram
+from benchmarks.harness import Result, format_table, measure
+
+ADMIN_ID = 1
+FIRST_USER_ID = 3_000_000
+# Через сколько секунд после раздачи закончатся подписки
+EXPIRE_IN = 5
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4, help="экземпляров бота")
+    parser.add_argument("--users", type=int, default=200, help="новых пользователей")
+    parser.add_argument("--concurrency", type=int, default=4, help="обработчиков в каждом экземпляре")
+    parser.add_argument("--storage", choices=("json", "sqlite", "redis"), default="redis")
+    parser.add_argument("--child", choices=("worker", "verify", "seed"), help=argparse.SUPPRESS)
+    parser.add_argument("--verbose", action="store_true", help="не глушить логи бота")
+    return parser.parse_args(argv)
+
+
+def _start_fake_redis() -> str:
+    from fakeredis import TcpFakeServer
+
+    server = TcpFakeServer(("127.0.0.1", 0))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-redis", daemon=True).start()
+    host, port = server.server_address
+    return f"redis://{host}:{port}/0"
+
+
+def _worker(args) -> None:
+    from telebot import apihelper
+    from benchmarks.run import _callback, _message
+
+    apihelper.API_URL = os.environ["BENCH_TELEGRAM_URL"]
+    from handlers.storage import _backend
+    from handlers.storage_backend import ADMINS
+
+    _backend.add(ADMINS, {"user_id": ADMIN_ID})
+    import admin_handlers
+    import client_handlers
+
+    users = range(FIRST_USER_ID, FIRST_USER_ID + args.users)
+    start = measure(
+        "start", lambda uid: client_handlers.cmd_start(_message(uid, "/start")), users, args.concurrency
+    )
+    # Одобрение начинается во всех экземплярах одновременно, когда все заявки приняты
+    print("ready", flush=True)
+    sys.stdin.readline()
+    approve = measure(
+        "approve",
+        lambda uid: admin_handlers.handle_approve(_callback(ADMIN_ID, f"approve:{uid}")),
+        users,
+        args.concurrency,
+    )
+    print(json.dumps([start._asdict(), approve._asdict()]), flush=True)
+    expires_at = int(sys.stdin.readline())
+    print(json.dumps(_run_scheduler(expires_at)), flush=True)
+
+
+class _RecordingSender:
+    """Вместо очереди сообщений: запоминает, кому планировщик писал."""
+
+    def __init__(self):
+        self.chats = []
+
+    def send_message(self, chat_id: int, text: str, **kwargs) -> None:
+        self.chats.append(chat_id)
+
+
+def _run_scheduler(expires_at: int) -> list:
+    from api_client import update_clients
+    from billing import SubscriptionScheduler
+
+    sender = _RecordingSender()
+    SubscriptionScheduler().start(update_clients, sender)
+    time.sleep(max(0, expires_at - time.time()) + 2)
+    return sender.chats
+
+
+def _seed(args) -> None:
+    from handlers.storage import set_subscriptions
+
+    expires_at = int(time.time()) + EXPIRE_IN
+    set_subscriptions([
+        {
+            "user_id": user_id,
+            "expires_at": expires_at,
+            "active": True,
+            "reminded": False,
+            "synced": True,
+            "payments": [],
+        }
+        for user_id in range(FIRST_USER_ID, FIRST_USER_ID + args.users)
+    ])
+    print(expires_at)
+
+
+def _verify(args) -> None:
+    from handlers.storage import count_users
+    from handlers.storage_backend import APPROVAL_REQUESTS, APPROVED_USERS
+
+    print(json.dumps({
+        "approved": count_users(APPROVED_USERS),
+        "pending": count_users(APPROVAL_REQUESTS),
+    }))
+
+
+def _spawn(args, env: dict, child: str) -> subprocess.Popen:
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "benchmarks.shared_state",
+            "--child", child,
+            "--users", str(args.users),
+            "--concurrency", str(args.concurrency),
+        ],
+        env=env,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=None if args.verbose else subprocess.DEVNULL,
+        text=True,
+    )
+
+
+def main(argv=None) -> None:
+    args = _parse_args(argv)
+    if args.child == "worker":
+        return _worker(args)
+    if args.child == "verify":
+        return _verify(args)
+    if args.child == "seed":
+        return _seed(args)
+
+    panel_state = FakePanelState(1, 10)
+    panel = start_fake_panel(panel_state)
+    bot_api = start_fake_telegram(FakeTelegramState())
+    workdir = tempfile.mkdtemp(prefix="bot-bench-")
+    env = dict(
+        os.environ,
+        API_URL=f"http://127.0.0.1:{panel.server_port}",
+        API_AUTH_LOGIN="admin",
+        API_AUTH_PASSWORD="admin",
+        BOT_TOKEN="123456:benchmark",
+        STORAGE_BACKEND=args.storage,
+        STORAGE_DB_FILE=os.path.join(workdir, "bot.sqlite3"),
+        BENCH_TELEGRAM_URL=f"http://127.0.0.1:{bot_api.server_port}/bot{{0}}/{{1}}",
+        LOG_LEVEL="DEBUG" if args.verbose else "CRITICAL",
+    )
+    for name in (
+        "APPROVED_USERS_FILE",
+        "APPROVAL_REQUESTS_FILE",
+        "ADMIN_IDS_FILE",
+        "PLACEMENTS_FILE",
+        "SUBSCRIPTIONS_FILE",
+        "PENDING_CLIENTS_FILE",
+    ):
+        env[name] = os.path.join(workdir, f"{name.lower()}.json")
+    if args.storage == "redis" and not env.get("REDIS_URL"):
+        env["REDIS_URL"] = _start_fake_redis()
+
+    workers = [_spawn(args, env, "worker") for _ in range(args.workers)]
+    for worker in workers:
+        if worker.stdout.readline().strip() != "ready":
+            raise RuntimeError("Worker failed to start, rerun with --verbose")
+    for worker in workers:
+        worker.stdin.write("go\n")
+        worker.stdin.flush()
+    results = []
+    for index, worker in enumerate(workers):
+        for result in json.loads(worker.stdout.readline()):
+            result["name"] = f"{result['name']} #{index}"
+            results.append(Result(**result))
+
+    verify = _spawn(args, env, "verify")
+    counts = json.loads(verify.communicate()[0].strip().splitlines()[-1])
+    registered = [
+        int(client["tgId"])
+        for inbound in panel_state.inbounds
+        for client in json.loads(inbound["settings"])["clients"]
+        if FIRST_USER_ID <= int(client["tgId"]) < FIRST_USER_ID + args.users
+    ]
+    lost = args.users - counts["approved"] - counts["pending"]
+    duplicates = len(registered) - len(set(registered))
+    print(
+        f"workers={args.workers} users={args.users} storage={args.storage} "
+        f"approved={counts['approved']} pending={counts['pending']} "
+        f"lost={lost} panel_clients={len(registered)} duplicates={duplicates}"
+    )
+    print(format_table(results))
+
+    # Напоминание и окончание подписки: по одному сообщению каждого вида
+    seed = _spawn(args, env, "seed")
+    expires_at = seed.communicate()[0].strip().splitlines()[-1]
+    for worker in workers:
+        worker.stdin.write(f"{expires_at}\n")
+        worker.stdin.flush()
+    sent = Counter()
+    for worker in workers:
+        output, _ = worker.communicate()
+        sent.update(json.loads(output.strip().splitlines()[-1]))
+    users = range(FIRST_USER_ID, FIRST_USER_ID + args.users)
+    missed = sum(max(0, 2 - sent[user_id]) for user_id in users)
+    repeated = sum(max(0, sent[user_id] - 2) for user_id in users)
+    print(f"subscription_messages={sum(sent.values())} missed={missed} repeated={repeated}")
+
+    if lost or duplicates or missed or repeated:
+        raise SystemExit(
+            f"Inconsistent shared state: lost={lost} duplicates={duplicates} "
+            f"missed={missed} repeated={repeated}"
+        )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,107 @@
+"""
+Время холодного старта бота против фейкового Bot API с задержкой.
+Каждый запуск — отдельный процесс, который импортирует модули так же,
+как main.py, и замеряет время до готовности принимать апдейты (ready)
+и до окончания выставления команд (commands).
+
+    legacy   — команды выставляются последовательно до polling, как раньше
+    cold     — первый запуск: команды в фоне и параллельно
+    warm     — повторный запуск: сохранённый хэш совпал, команды не трогаются
+    changed  — добавились админы: команды выставляются только им
+
+    python -m benchmarks.startup --admins 200 --telegram-latency 30
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks.fake_telegram import FakeTelegramState, start_fake_telegram
+
+RUNS = ("legacy", "cold", "warm", "changed")
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--admins", type=int, default=200)
+    parser.add_argument("--added", type=int, default=10, help="админов, добавленных перед запуском changed")
+    parser.add_argument("--telegram-latency", type=float, default=30.0, help="задержка Bot API, мс")
+    parser.add_argument("--storage", choices=("json", "sqlite"), default="json")
+    parser.add_argument("--verbose", action="store_true", help="не глушить логи бота")
+    parser.add_argument("--child", choices=RUNS, help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    parser.add_argument("--telegram-url", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def _child(args, started: float) -> None:
+    from benchmarks.run import _configure
+
+    _configure(args, args.workdir, "http://127.0.0.1:9", args.telegram_url)
+    os.environ["COMMANDS_STATE_FILE"] = os.path.join(args.workdir, "commands.json")
+
+    from bot import bot, sender, start_commands_sync
+    import admin_handlers
+    import client_handlers
+
+    sender.start()
+    if args.child == "legacy":
+        from telebot import types
+        from handlers import admin_commands, load_admins, user_commands
+
+        bot.set_my_commands(commands=user_commands, scope=types.BotCommandScopeDefault())
+        for admin in load_admins():
+            bot.set_my_commands(commands=admin_commands, scope=types.BotCommandScopeChat(admin["user_id"]))
+        ready = time.perf_counter() - started
+    else:
+        thread = start_commands_sync()
+        ready = time.perf_counter() - started
+        thread.join()
+    print(json.dumps({"ready_ms": ready * 1000, "commands_ms": (time.perf_counter() - started) * 1000}))
+
+
+def _write_admins(workdir: str, count: int) -> None:
+    with open(os.path.join(workdir, "admin_ids_file.json"), "w", encoding="utf-8") as f:
+        json.dump([{"user_id": 1 + i} for i in range(count)], f)
+
+
+def main(argv=None) -> None:
+    started = time.perf_counter()
+    args = _parse_args(argv)
+    if args.child:
+        return _child(args, started)
+
+    telegram = FakeTelegramState(args.telegram_latency / 1000)
+    bot_api = start_fake_telegram(telegram)
+    workdir = tempfile.mkdtemp(prefix="bot-startup-")
+    _write_admins(workdir, args.admins)
+
+    rows = [("run", "ready ms", "commands ms", "setMyCommands")]
+    for run in RUNS:
+        if run == "changed":
+            _write_admins(workdir, args.admins + args.added)
+        before = telegram.calls.get("setMyCommands", 0)
+        command = [
+            sys.executable, "-m", "benchmarks.startup",
+            "--child", run,
+            "--workdir", workdir,
+            "--telegram-url", f"http://127.0.0.1:{bot_api.server_port}",
+            "--storage", args.storage,
+        ]
+        if args.verbose:
+            command.append("--verbose")
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        calls = telegram.calls.get("setMyCommands", 0) - before
+        rows.append((run, f"{result['ready_ms']:.0f}", f"{result['commands_ms']:.0f}", str(calls)))
+
+    print(f"admins={args.admins} telegram_latency={args.telegram_latency}ms")
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    for row in rows:
+        print(" | ".join(cell.ljust(w) for cell, w in zip(row, widths)))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
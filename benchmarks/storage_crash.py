@@ -0,0 +1,141 @@
+"""
+Проверка журнала JSON-хранилища на сбоях. Дочерний процесс добавляет
+и удаляет записи, подтверждая каждую операцию в stdout, и получает
+SIGKILL в случайный момент — в том числе посреди сжатия журнала.
+После каждого убийства подтверждённые операции должны быть на месте.
+Отдельно проверяются недописанный хвост журнала и сбой между подменой
+файла и очисткой журнала.
+
+    python -m benchmarks.storage_crash --rounds 50
+"""
+import argparse
+import os
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=30, help="убийств дочернего процесса")
+    parser.add_argument("--compact", type=int, default=50, help="STORAGE_JOURNAL_COMPACT в дочернем процессе")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--start", type=int, default=0, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def _child(path: str, start: int) -> None:
+    from handlers.storage import JsonUserFile
+
+    users = JsonUserFile(path, "Crash test file")
+    user_id = start
+    while True:
+        # Удаляется каждая третья запись, так что в журнале есть оба вида событий
+        if user_id % 3 == 0 and users.remove(user_id - 1):
+            print(f"remove {user_id - 1}", flush=True)
+        if users.add({"user_id": user_id, "username": f"user{user_id}"}):
+            print(f"add {user_id}", flush=True)
+        user_id += 1
+
+
+def _load(path: str) -> set:
+    from handlers.storage import JsonUserFile
+
+    return {entry["user_id"] for entry in JsonUserFile(path, "Crash test file").load()}
+
+
+def _kill_rounds(args, path: str) -> int:
+    env = dict(os.environ, STORAGE_JOURNAL_COMPACT=str(args.compact))
+    present, removed = set(), set()
+    start = 0
+    for round_number in range(args.rounds):
+        child = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.storage_crash", "--child", path, "--start", str(start)],
+            env=env,
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        # Отсчёт до убийства начинается после первой операции, а не с импортов
+        first = child.stdout.readline()
+        time.sleep(random.uniform(0.0, 0.3))
+        child.send_signal(signal.SIGKILL)
+        output, _ = child.communicate()
+        for line in (first + output).splitlines():
+            op, _, value = line.partition(" ")
+            if not value.isdigit():
+                continue
+            if op == "add":
+                present.add(int(value))
+            elif op == "remove":
+                present.discard(int(value))
+                removed.add(int(value))
+        last = max(present | removed | {start})
+        start = last + 1
+
+        actual = _load(path)
+        lost = present - actual
+        # Удаление после последнего подтверждённого добавления могло пройти без подтверждения
+        if (last + 1) % 3 == 0 and lost == {last}:
+            lost = set()
+            removed.add(last)
+        resurrected = removed & actual
+        if lost or resurrected:
+            raise SystemExit(
+                f"round {round_number}: lost {sorted(lost)[:10]}, resurrected {sorted(resurrected)[:10]}"
+            )
+        # Неподтверждённой может остаться только операция, прерванная убийством
+        present = actual - removed
+    return len(present)
+
+
+def _torn_tail(path: str) -> None:
+    expected = _load(path)
+    with open(f"{path}.journal", "a", encoding="utf-8") as f:
+        f.write('{"op": "add", "entry": {"user_id": -1, "userna')
+    actual = _load(path)
+    if actual != expected:
+        raise SystemExit(f"torn tail changed state: {sorted(actual ^ expected)[:10]}")
+    from handlers.storage import JsonUserFile
+
+    users = JsonUserFile(path, "Crash test file")
+    users.add({"user_id": -2})
+    if -2 not in _load(path):
+        raise SystemExit("append after torn tail was lost")
+    users.remove(-2)
+
+
+def _crash_after_rename(path: str) -> None:
+    from handlers.storage import JsonUserFile
+
+    expected = _load(path)
+    journal = f"{path}.journal"
+    kept = f"{journal}.kept"
+    shutil.copyfile(journal, kept)
+    users = JsonUserFile(path, "Crash test file")
+    users.save(users.load())
+    # Журнал вернулся, как будто процесс упал до его очистки
+    os.replace(kept, journal)
+    actual = _load(path)
+    if actual != expected:
+        raise SystemExit(f"replaying journal over compacted file changed state: {sorted(actual ^ expected)[:10]}")
+
+
+def main(argv=None) -> None:
+    args = _parse_args(argv)
+    if args.child:
+        return _child(args.child, args.start)
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bot-crash-"), "users.json")
+    records = _kill_rounds(args, path)
+    _torn_tail(path)
+    _crash_after_rename(path)
+    journal_lines = sum(1 for _ in open(f"{path}.journal", encoding="utf-8"))
+    print(f"rounds={args.rounds} records={records} journal_events={journal_lines}: no acknowledged writes lost")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,115 @@
+"""
+Задержка проверок is_approved_user и is_admin в зависимости от числа
+одобренных пользователей. Строки "file" — прежняя проверка: JSON-файл
+читается целиком на каждый вызов и перебирается список. Остальные —
+текущее хранилище с индексом по user_id. Каждый размер и способ
+запускается в отдельном процессе, чтобы кэши не пересекались.
+
+    python -m benchmarks.user_lookup --sizes 10000,100000 --lookups 2000
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+from benchmarks.harness import Result, format_table, measure
+
+BACKENDS = ("file", "json", "sqlite")
+ADMIN_COUNT = 10
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000", help="одобренных пользователей, через запятую")
+    parser.add_argument("--lookups", type=int, default=2000, help="проверок в каждом прогоне")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="через запятую")
+    parser.add_argument("--child", choices=BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def _file_check(path: str):
+    """Прежние is_approved_user/is_admin: весь файл на каждый вызов и линейный поиск."""
+
+    def check(user_id: int) -> bool:
+        with open(path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        return any(entry["user_id"] == user_id for entry in entries)
+
+    return check
+
+
+def _child(args) -> None:
+    # Окружение уже настроено родителем, config читает его при импорте
+    if args.child == "file":
+        is_approved_user = _file_check(os.environ["APPROVED_USERS_FILE"])
+        is_admin = _file_check(os.environ["ADMIN_IDS_FILE"])
+    else:
+        from handlers.storage import _backend
+        from handlers.storage_backend import ADMINS, APPROVED_USERS
+        from handlers.user_validation import is_admin, is_approved_user
+
+        _backend.save(APPROVED_USERS, _users(args.size))
+        _backend.save(ADMINS, _users(ADMIN_COUNT))
+
+    # Половина проверок — промахи, как у сообщений от неодобренных пользователей
+    rng = random.Random(args.size)
+    user_ids = [rng.randrange(args.size * 2) for _ in range(args.lookups)]
+    results = [
+        measure(f"{args.child} approved {args.size}", is_approved_user, user_ids),
+        measure(f"{args.child} admin {args.size}", is_admin, user_ids),
+    ]
+    print(json.dumps([r._asdict() for r in results]))
+
+
+def _users(count: int) -> list:
+    return [{"user_id": user_id, "username": f"user{user_id}"} for user_id in range(count)]
+
+
+def _write(path: str, entries: list) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(entries, f, ensure_ascii=False, indent=4)
+
+
+def main(argv=None) -> None:
+    args = _parse_args(argv)
+    if args.child:
+        return _child(args)
+
+    results = []
+    for size in (int(s) for s in args.sizes.split(",")):
+        for backend in args.backends.split(","):
+            workdir = tempfile.mkdtemp(prefix="bot-bench-")
+            env = dict(
+                os.environ,
+                STORAGE_BACKEND="sqlite" if backend == "sqlite" else "json",
+                STORAGE_DB_FILE=os.path.join(workdir, "bot.sqlite3"),
+                APPROVED_USERS_FILE=os.path.join(workdir, "approved_users.json"),
+                ADMIN_IDS_FILE=os.path.join(workdir, "admins.json"),
+            )
+            if backend == "file":
+                _write(env["APPROVED_USERS_FILE"], _users(size))
+                _write(env["ADMIN_IDS_FILE"], _users(ADMIN_COUNT))
+            # Прежняя проверка на больших файлах медленная, ей хватит меньшего числа вызовов
+            lookups = min(args.lookups, 200) if backend == "file" else args.lookups
+            output = subprocess.run(
+                [
+                    sys.executable, "-m", "benchmarks.user_lookup",
+                    "--child", backend,
+                    "--size", str(size),
+                    "--lookups", str(lookups),
+                ],
+                env=env,
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            results += [Result(**r) for r in json.loads(output.strip().splitlines()[-1])]
+
+    print(format_table(results))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,169 @@
+"""
+Одни и те же записанные апдейты (/start от новых пользователей)
+доставляются боту двумя способами: long polling через getUpdates
+фейкового Bot API и POST-запросами в приложение вебхука, как это делает
+Telegram, с max_connections одновременных соединений. Задержка апдейта —
+от момента, когда он появился у Telegram, до ответа бота в чат.
+Проверяется и отказ запросам без секретного токена.
+
+    python -m benchmarks.webhook_replay --updates 2000 --workers 8 --connections 40
+"""
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from argparse import Namespace
+from benchmarks.fake_panel import FakePanelState, start_fake_panel
+from benchmarks.fake_telegram import FakeTelegramState, start_fake_telegram
+from benchmarks.harness import Result, format_table, peak_rss_mb, percentile
+from benchmarks.run import _configure, _user
+
+POLLING_USERS = 1_000_000
+WEBHOOK_USERS = 2_000_000
+SECRET = "benchmark-secret"
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=2000, help="апдейтов в каждом режиме")
+    parser.add_argument("--workers", type=int, default=8, help="BOT_WORKERS, потоков обработчиков")
+    parser.add_argument("--connections", type=int, default=40, help="WEBHOOK_MAX_CONNECTIONS")
+    parser.add_argument("--telegram-latency", type=float, default=1.0, help="задержка Bot API, мс")
+    parser.add_argument("--storage", choices=("json", "sqlite"), default="json")
+    parser.add_argument("--verbose", action="store_true", help="не глушить логи бота")
+    return parser.parse_args(argv)
+
+
+def _updates(first_user: int, count: int) -> list:
+    return [
+        {
+            "update_id": first_user + i,
+            "message": {
+                "message_id": 1,
+                "date": int(time.time()),
+                "chat": {"id": first_user + i, "type": "private"},
+                "from": _user(first_user + i),
+                "text": "/start",
+            },
+        }
+        for i in range(count)
+    ]
+
+
+def _result(name: str, telegram: FakeTelegramState, updates: list, started: float) -> Result:
+    finished = [telegram.replied[u["message"]["chat"]["id"]] for u in updates]
+    latencies = [t - started for t in finished]
+    return Result(
+        name,
+        len(updates),
+        max(finished) - started,
+        percentile(latencies, 0.50) * 1000,
+        percentile(latencies, 0.99) * 1000,
+        peak_rss_mb(),
+    )
+
+
+def _wait_replies(telegram: FakeTelegramState, expected: int) -> None:
+    if not telegram.wait_for("sendMessage", expected):
+        raise SystemExit(f"bot answered {telegram.calls.get('sendMessage', 0)} of {expected} messages")
+
+
+def _replay_polling(bot, telegram: FakeTelegramState, args) -> Result:
+    updates = _updates(POLLING_USERS, args.updates)
+    expected = telegram.calls.get("sendMessage", 0) + len(updates)
+    polls = telegram.calls.get("getUpdates", 0)
+    thread = threading.Thread(
+        target=bot.infinity_polling, kwargs={"timeout": 5, "long_polling_timeout": 1}, daemon=True
+    )
+    thread.start()
+    # Апдейты появляются, когда бот уже ждёт на getUpdates
+    telegram.wait_for("getUpdates", polls + 1)
+    started = time.perf_counter()
+    telegram.put_updates(updates)
+    _wait_replies(telegram, expected)
+    bot.stop_polling()
+    thread.join()
+    return _result("polling", telegram, updates, started)
+
+
+async def _post(session, url: str, update: dict, secret: str) -> int:
+    from webhook import SECRET_HEADER
+
+    async with session.post(url, json=update, headers={SECRET_HEADER: secret}) as resp:
+        return resp.status
+
+
+async def _replay_webhook(bot, telegram: FakeTelegramState, args) -> Result:
+    import aiohttp
+    from aiohttp import web
+    from config import WEBHOOK_PATH
+    from webhook import make_app
+
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    runner = web.AppRunner(make_app(bot))
+    await runner.setup()
+    await web.SockSite(runner, sock).start()
+    url = f"http://127.0.0.1:{sock.getsockname()[1]}{WEBHOOK_PATH}"
+
+    updates = _updates(WEBHOOK_USERS, args.updates)
+    expected = telegram.calls.get("sendMessage", 0) + len(updates)
+    try:
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=args.connections)) as session:
+            status = await _post(session, url, _updates(0, 1)[0], "forged")
+            if status != 403:
+                raise SystemExit(f"webhook accepted an update with a wrong secret: HTTP {status}")
+            started = time.perf_counter()
+            statuses = await asyncio.gather(*(_post(session, url, u, SECRET) for u in updates))
+        if set(statuses) != {200}:
+            raise SystemExit(f"webhook answered {sorted(set(statuses))} to valid updates")
+        await asyncio.to_thread(_wait_replies, telegram, expected)
+    finally:
+        await runner.cleanup()
+    return _result("webhook", telegram, updates, started)
+
+
+def main(argv=None) -> None:
+    args = _parse_args(argv)
+    telegram = FakeTelegramState(args.telegram_latency / 1000)
+    panel = start_fake_panel(FakePanelState(1, 10))
+    bot_api = start_fake_telegram(telegram)
+    os.environ.update(
+        {
+            "BOT_WORKERS": str(args.workers),
+            "WEBHOOK_URL": "https://bot.example.com",
+            "WEBHOOK_SECRET": SECRET,
+            "WEBHOOK_MAX_CONNECTIONS": str(args.connections),
+        }
+    )
+    _configure(
+        Namespace(storage=args.storage, verbose=args.verbose),
+        tempfile.mkdtemp(prefix="bot-bench-"),
+        f"http://127.0.0.1:{panel.server_port}",
+        f"http://127.0.0.1:{bot_api.server_port}",
+    )
+
+    # Модули бота импортируются только после настройки окружения
+    from bot import bot, sender
+    # Обработчики регистрируются при импорте, админка первой, как в main.py
+    import admin_handlers
+    import client_handlers
+
+    sender.start()
+    results = [
+        _replay_polling(bot, telegram, args),
+        asyncio.run(_replay_webhook(bot, telegram, args)),
+    ]
+    print(
+        f"updates={args.updates} workers={args.workers} connections={args.connections} "
+        f"storage={args.storage} telegram_latency={args.telegram_latency}ms"
+    )
+    print(format_table(results))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
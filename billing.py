@@ -0,0 +1,255 @@
+import heapq
+import itertools
+import threading
+import time
+from datetime import datetime
+from logger import api_logger as logger
+from typing import Callable, Dict, List, Optional
+from config import (
+    SUBSCRIPTION_DAYS,
+    SUBSCRIPTION_PRICE,
+    SUBSCRIPTION_CURRENCY,
+    SUBSCRIPTION_REMIND_HOURS,
+    SUBSCRIPTION_RETRY_DELAY,
+)
+from handlers import (
+    get_subscription,
+    is_approved_user,
+    load_subscriptions,
+    renewal_keyboard,
+    replace_subscriptions,
+    set_subscriptions,
+)
+from metrics import SUBSCRIPTION_EVENTS, SUBSCRIPTION_QUEUE_SIZE
+
+SUBSCRIPTION_PAYLOAD = "buy_subscription"
+
+REMIND = "remind"
+EXPIRE = "expire"
+SYNC = "sync"
+
+_DAY = 24 * 60 * 60
+_REMIND_BEFORE = SUBSCRIPTION_REMIND_HOURS * 60 * 60
+
+# Чтение и запись подписок идут под одной блокировкой, чтобы оплата
+# и планировщик не перезаписали изменения друг друга. От других экземпляров
+# бота она не защищает, поэтому планировщик пишет через replace_subscriptions
+_lock = threading.Lock()
+
+
+def _load_entry(user_id: int) -> Optional[dict]:
+    # Хранилище может отдавать свой экземпляр записи, меняем только копию
+    entry = get_subscription(user_id)
+    return dict(entry, payments=list(entry["payments"])) if entry else None
+
+
+def format_expiry(entry: dict) -> str:
+    return datetime.fromtimestamp(entry["expires_at"]).strftime("%d.%m.%Y %H:%M")
+
+
+def panel_fields(entry: dict) -> dict:
+    """Поля клиента на панели, соответствующие подписке."""
+    return {"expiryTime": entry["expires_at"] * 1000, "enable": entry["active"]}
+
+
+def check_invoice(user_id: int, payload: str, currency: str, amount: int) -> Optional[str]:
+    """Проверяет счёт перед оплатой. Возвращает текст ошибки или None."""
+    if payload != SUBSCRIPTION_PAYLOAD:
+        return "Неизвестный счёт"
+    if not is_approved_user(user_id):
+        return "Заявка не одобрена"
+    if currency != SUBSCRIPTION_CURRENCY or amount != SUBSCRIPTION_PRICE:
+        return "Счёт устарел, запросите новый"
+    return None
+
+
+def record_payment(user_id: int, charge_id: str, amount: int, currency: str) -> Optional[dict]:
+    """
+    Записывает платёж и продлевает подписку на SUBSCRIPTION_DAYS дней от
+    текущей даты окончания (или от сейчас, если подписка уже закончилась).
+    Возвращает обновлённую подписку, либо None, если платёж уже учтён.
+    """
+    now = int(time.time())
+    with _lock:
+        entry = _load_entry(user_id) or {"user_id": user_id, "expires_at": 0, "payments": []}
+        if any(p["charge_id"] == charge_id for p in entry["payments"]):
+            logger.warning(f"Payment {charge_id} from user with id={user_id} is already recorded")
+            return None
+        start = max(now, entry["expires_at"]) if entry.get("active") else now
+        entry["expires_at"] = start + SUBSCRIPTION_DAYS * _DAY
+        entry["active"] = True
+        # Для подписок короче окна напоминания напоминать сразу после оплаты незачем
+        entry["reminded"] = entry["expires_at"] - now <= _REMIND_BEFORE
+        entry["synced"] = False
+        entry["payments"].append(
+            {"charge_id": charge_id, "amount": amount, "currency": currency, "paid_at": now}
+        )
+        set_subscriptions([entry])
+    logger.info(f"Subscription of user with id={user_id} extended until {format_expiry(entry)}")
+    return entry
+
+
+class SubscriptionScheduler:
+    """
+    Планировщик событий подписок: напоминание о продлении, отключение
+    истёкших клиентов и синхронизация срока с панелью. События лежат в куче
+    по времени, поэтому на каждом шаге снимаются только наступившие, без
+    обхода всех подписок. Событие помнит expires_at, под который создано:
+    если подписку с тех пор продлили, оно устарело и пропускается.
+    Изменения на панели за один шаг отправляются одним вызовом apply_updates,
+    который группирует их по inbound'ам. Те же события разбирают планировщики
+    всех экземпляров бота: напоминает и отключает только тот, чья замена
+    записи в хранилище прошла первой.
+    """
+
+    def __init__(self):
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._apply_updates: Optional[Callable[[Dict[int, dict]], Dict[int, bool]]] = None
+        self._sender = None
+
+    def _push(self, when: float, kind: str, entry: dict) -> None:
+        heapq.heappush(
+            self._heap,
+            (when, next(self._seq), kind, entry["user_id"], entry["expires_at"]),
+        )
+
+    def schedule(self, entry: dict) -> None:
+        """Планирует события подписки. Вызывается после каждого её изменения."""
+        with self._cond:
+            if not entry.get("synced"):
+                self._push(time.time(), SYNC, entry)
+            if entry.get("active"):
+                if not entry.get("reminded"):
+                    self._push(entry["expires_at"] - _REMIND_BEFORE, REMIND, entry)
+                self._push(entry["expires_at"], EXPIRE, entry)
+            SUBSCRIPTION_QUEUE_SIZE.set(len(self._heap))
+            self._cond.notify()
+
+    def _retry(self, entry: dict) -> None:
+        with self._cond:
+            self._push(time.time() + SUBSCRIPTION_RETRY_DELAY, SYNC, entry)
+            self._cond.notify()
+
+    def start(self, apply_updates: Callable[[Dict[int, dict]], Dict[int, bool]], sender) -> threading.Thread:
+        """
+        Загружает подписки и запускает поток планировщика. apply_updates
+        применяет изменения клиентов на панели ({user_id: поля}), sender —
+        очередь исходящих сообщений.
+        """
+        self._apply_updates = apply_updates
+        self._sender = sender
+        entries = load_subscriptions()
+        for entry in entries:
+            self.schedule(entry)
+        logger.info(f"Loaded {len(entries)} subscriptions")
+        thread = threading.Thread(target=self._run, name="subscriptions", daemon=True)
+        thread.start()
+        return thread
+
+    def _take_due(self) -> List[tuple]:
+        with self._cond:
+            while True:
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                delay = self._heap[0][0] - time.time()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                now = time.time()
+                events = []
+                while self._heap and self._heap[0][0] <= now:
+                    events.append(heapq.heappop(self._heap))
+                SUBSCRIPTION_QUEUE_SIZE.set(len(self._heap))
+                return events
+
+    def _run(self) -> None:
+        while True:
+            events = self._take_due()
+            try:
+                self.process(events)
+            except Exception as e:
+                logger.error(f"Failed to process subscription events: {e}", exc_info=True)
+
+    def process(self, events: List[tuple]) -> None:
+        changes = {}
+        reminders = []
+        expired = []
+        with _lock:
+            loaded = {}
+            entries = {}
+            for _, _, kind, user_id, expires_at in events:
+                if user_id not in entries:
+                    loaded[user_id] = _load_entry(user_id)
+                    entries[user_id] = loaded[user_id] and dict(loaded[user_id])
+                entry = entries[user_id]
+                if not entry or entry["expires_at"] != expires_at:
+                    continue
+                if kind == REMIND and entry["active"] and not entry["reminded"] and expires_at > time.time():
+                    entry["reminded"] = True
+                    reminders.append(entry)
+                elif kind == EXPIRE and entry["active"]:
+                    entry["active"] = False
+                    entry["synced"] = False
+                    expired.append(entry)
+                elif kind != SYNC or entry["synced"]:
+                    continue
+                SUBSCRIPTION_EVENTS.labels(kind).inc()
+                if not entry["synced"]:
+                    changes[user_id] = panel_fields(entry)
+            if reminders or expired:
+                won = {
+                    entry["user_id"]
+                    for entry in replace_subscriptions(
+                        [(loaded[entry["user_id"]], entry) for entry in reminders + expired]
+                    )
+                }
+                for entry in reminders + expired:
+                    if entry["user_id"] not in won:
+                        changes.pop(entry["user_id"], None)
+                reminders = [entry for entry in reminders if entry["user_id"] in won]
+                expired = [entry for entry in expired if entry["user_id"] in won]
+
+        for entry in reminders:
+            self._sender.send_message(
+                entry["user_id"],
+                f"⏰ Подписка закончится {format_expiry(entry)}. Продлите её, чтобы не потерять доступ",
+                reply_markup=renewal_keyboard(),
+            )
+        for entry in expired:
+            self._sender.send_message(
+                entry["user_id"],
+                "⛔ Подписка закончилась, доступ приостановлен",
+                reply_markup=renewal_keyboard(),
+            )
+        if changes:
+            self._sync(changes)
+
+    def _sync(self, changes: Dict[int, dict]) -> None:
+        try:
+            results = self._apply_updates(changes)
+        except Exception as e:
+            logger.error(f"Failed to update subscriptions on panel: {e}", exc_info=True)
+            results = {}
+
+        synced = []
+        with _lock:
+            for user_id, fields in changes.items():
+                entry = _load_entry(user_id)
+                # Подписку могли изменить, пока шёл запрос, тогда её
+                # синхронизирует событие, запланированное при изменении
+                if entry is None or panel_fields(entry) != fields:
+                    continue
+                if results.get(user_id):
+                    synced.append((entry, dict(entry, synced=True)))
+                else:
+                    self._retry(entry)
+            if synced:
+                # Не затирает оплату, записанную тем временем другим экземпляром
+                synced = replace_subscriptions(synced)
+        logger.info(f"Synced {len(synced)}/{len(changes)} subscriptions with panel")
+
+
+subscription_scheduler = SubscriptionScheduler()
@@ -1,27 +1,64 @@
 # bot.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from logger import api_logger as logger
 from telebot import TeleBot, types
-from config import BOT_TOKEN
-from handlers import load_admins
+from config import BOT_TOKEN, BOT_WORKERS
+from handlers import load_admins, user_commands, admin_commands, plan_commands, save_commands_state
+from sender import MessageSender
 
-user_commands = [
-    types.BotCommand("start", "Запустить бота"),
-    types.BotCommand("help", "Помощь"),
-]
+# Сколько запросов setMyCommands отправляется одновременно
+COMMANDS_CONCURRENCY = 8
 
-admin_commands = [
-    types.BotCommand("admin", "Панель администратора"),
-]
+bot = TeleBot(BOT_TOKEN, num_threads=BOT_WORKERS)
+# Рассылки (уведомления админам и пользователям) и QR-коды идут через
+# очередь с ограничением темпа, обработчики их не ждут
+sender = MessageSender(bot.send_message, bot.send_photo)
 
 
-def init_bot() -> TeleBot:
-    bot = TeleBot(BOT_TOKEN)
+def _set_default_commands() -> None:
     bot.set_my_commands(commands=user_commands, scope=types.BotCommandScopeDefault())
-    for admin_id in load_admins():
-        bot.set_my_commands(
-            commands=admin_commands,
-            scope=types.BotCommandScopeChat(admin_id["user_id"]),
-        )
-    return bot
 
 
-bot = init_bot()
+def _set_admin_commands(admin_id: int) -> None:
+    bot.set_my_commands(commands=admin_commands, scope=types.BotCommandScopeChat(admin_id))
+
+
+def _delete_admin_commands(admin_id: int) -> None:
+    bot.delete_my_commands(scope=types.BotCommandScopeChat(admin_id))
+
+
+def sync_commands() -> None:
+    """Выставляет команды бота, пропуская то, что не изменилось с прошлого запуска."""
+    start = time.perf_counter()
+    plan = plan_commands(BOT_TOKEN.split(":", 1)[0], [a["user_id"] for a in load_admins()])
+    if not (plan.default or plan.register or plan.remove):
+        logger.info("Bot commands are up to date, skipping registration")
+        return
+    calls = [_set_default_commands] if plan.default else []
+    calls += [lambda uid=uid: _set_admin_commands(uid) for uid in plan.register]
+    calls += [lambda uid=uid: _delete_admin_commands(uid) for uid in plan.remove]
+    failed = 0
+    with ThreadPoolExecutor(COMMANDS_CONCURRENCY) as pool:
+        for future in [pool.submit(call) for call in calls]:
+            try:
+                future.result()
+            except Exception as e:
+                failed += 1
+                logger.error(f"Failed to set bot commands: {e}")
+    if failed:
+        logger.warning(f"{failed}/{len(calls)} bot command updates failed, will retry on next start")
+    else:
+        save_commands_state(plan.state)
+    logger.info(
+        f"Updated bot commands for {len(plan.register)} admins, removed for {len(plan.remove)} "
+        f"in {(time.perf_counter() - start) * 1000:.0f} ms"
+    )
+
+
+def start_commands_sync() -> threading.Thread:
+    """Запускает sync_commands в фоне, чтобы polling не ждал Telegram."""
+    thread = threading.Thread(target=sync_commands, name="bot-commands", daemon=True)
+    thread.start()
+    return thread
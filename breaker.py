@@ -0,0 +1,118 @@
+import threading
+import time
+from contextlib import contextmanager
+from logger import api_logger as logger
+from typing import Callable, Optional
+from metrics import PANEL_CIRCUIT_REJECTED, PANEL_CIRCUIT_STATE
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Панель считается недоступной: запрос отклонён, не дойдя до неё."""
+
+
+class CircuitBreaker:
+    """
+    Размыкатель панели. После threshold сбоев подряд размыкается, и запросы
+    сразу получают CircuitOpenError вместо ожидания таймаутов. Через
+    reset_timeout к панели пропускается один пробный запрос: успех замыкает
+    размыкатель и вызывает on_close, сбой размыкает его снова.
+    Внутри блокировки нет ожиданий, поэтому размыкатель годится
+    и для потоков, и для корутин. threshold 0 выключает его.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        threshold: int,
+        reset_timeout: float,
+        on_close: Optional[Callable[[], None]] = None,
+    ):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.on_close = on_close
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        PANEL_CIRCUIT_STATE.labels(name).set(_STATE_VALUES[CLOSED])
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        PANEL_CIRCUIT_STATE.labels(self.name).set(_STATE_VALUES[state])
+
+    def before(self) -> None:
+        """Пропускает запрос к панели или бросает CircuitOpenError."""
+        if not self.threshold:
+            return
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._set_state(HALF_OPEN)
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+        PANEL_CIRCUIT_REJECTED.labels(self.name).inc()
+        raise CircuitOpenError(f"Panel {self.name} is unavailable")
+
+    def success(self) -> None:
+        if not self.threshold:
+            return
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            recovered = self.state != CLOSED
+            if recovered:
+                self._set_state(CLOSED)
+        if recovered:
+            logger.info("Panel %s recovered, circuit closed", self.name)
+            if self.on_close:
+                self.on_close()
+
+    def failure(self) -> None:
+        if not self.threshold:
+            return
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            # Запросы, начатые до размыкания, не продлевают его
+            opened = self.state == HALF_OPEN or (
+                self.state == CLOSED and self._failures >= self.threshold
+            )
+            if opened:
+                self._opened_at = time.monotonic()
+                self._set_state(OPEN)
+        if opened:
+            logger.warning(
+                "Panel %s failed %s times in a row, circuit opened for %ss",
+                self.name, self._failures, self.reset_timeout,
+            )
+
+    @contextmanager
+    def guard(self, is_failure: Callable[[Exception], bool]):
+        """
+        Оборачивает запрос к панели. Исключение, для которого is_failure
+        истинно, считается сбоем панели; любой другой исход — её ответом.
+        """
+        self.before()
+        try:
+            yield
+        except Exception as e:
+            if is_failure(e):
+                self.failure()
+            else:
+                self.success()
+            raise
+        except BaseException:
+            # Отмена не говорит ничего о панели, но пробный запрос надо освободить
+            with self._lock:
+                self._probing = False
+            raise
+        self.success()
@@ -1,63 +1,44 @@
 # handlers.py
-import io
-import qrcode
 from logger import api_logger as logger
 from api_client import get_connection_string
 from telebot import types
-from bot import bot
+from bot import bot, sender
+from metrics import timed_handler
+from ratelimit import rate_limited
+from accounts import account_text
+from billing import (
+    SUBSCRIPTION_PAYLOAD,
+    check_invoice,
+    format_expiry,
+    record_payment,
+    subscription_scheduler,
+)
+from config import (
+    PAYMENT_PROVIDER_TOKEN,
+    SUBSCRIPTION_CURRENCY,
+    SUBSCRIPTION_DAYS,
+    SUBSCRIPTION_PRICE,
+)
 
 from handlers import *
 
 
 @bot.message_handler(commands=["start"])
+@timed_handler
+@rate_limited(bot, "start")
 def cmd_start(message: types.Message) -> None:
     user_id = message.chat.id
     username = message.from_user.username or "[unknown]"
 
-    logger.info(f"Received /start from user_id={user_id}, username={username}")
+    logger.info("Received /start from user_id=%s, username=%s", user_id, username)
 
-    # Если уже одобрен
-    if is_approved_user(user_id):
-        bot.send_message(
-            user_id,
-            "✅ Вы уже зарегистрированы! Выберите действие ниже:",
-            reply_markup=make_user_keyboard(),
-        )
-        return
-
-    # Если заявка уже ожидает
-    requests = load_approval_requests()
-    if any(entry["user_id"] == user_id for entry in requests):
-        bot.send_message(
-            user_id,
-            "⌛ Ваша заявка уже принята и ожидает одобрения",
-        )
-        return
-
-    # Новая заявка
-    requests.append({"user_id": user_id, "username": username})
-    save_approval_requests(requests)
-    logger.info(f"Saved request for user with id={user_id}")
-
-    admins = load_admins()
-    for admin in admins:
-        admin_id = admin["user_id"]
-        try:
-            bot.send_message(
-                admin_id,
-                f"🆕 Новая заявка от @{username} with id={user_id})",
-                reply_markup=make_approve_management_keyboard(user_id),
-            )
-        except Exception as e:
-            logger.error(f"Failed to notify admin with id={admin_id}: {e}")
-    logger.info(f"Отправлен запрос на одобрение администраторам: {admins}")
-
-    bot.send_message(
-        user_id, "📝 Ваша заявка принята и отправлена на рассмотрение администраторам"
-    )
+    text, markup = start_reply(submit_request(sender, user_id, username))
+    bot.send_message(user_id, text, reply_markup=markup)
 
 
 @bot.callback_query_handler(func=lambda call: call.data == "get_qr")
+@timed_handler
+@rate_limited(bot, "get_qr", shed=True)
 def cmd_send_qr(call: types.CallbackQuery) -> None:
     """Отправляет пользователю QR для подключения к VPN серверу"""
     user_id = call.message.chat.id
@@ -70,30 +51,35 @@ def cmd_send_qr(call: types.CallbackQuery) -> None:
         logger.warning(f"User {user_id} tried to get QR without approval")
         return
 
-    logger.info(f"Incoming command /get_qr from approved user_id={user_id}")
+    logger.info("Incoming command /get_qr from approved user_id=%s", user_id)
 
-    # Формируем строку для подключения
-    cs = get_connection_string(user_id)
-    if cs is None:
-        bot.send_message(user_id, "❗ Не удалось найти параметры подключения")
-        bot.answer_callback_query(call.id)
-        logger.error(f"Can't find configuration for user with id={user_id}")
+    if not in_flight.claim(QR_ACTION, user_id):
+        bot.answer_callback_query(call.id, "⏳ QR-код уже готовится")
         return
 
-    logger.info(f'Connection string for user with id={user_id} is "{cs}"')
-
-    # Делаем из нее QR
-    img = qrcode.make(cs)
-    buf = io.BytesIO()
-    buf.name = "qrcode.png"
-    img.save(buf, "PNG")
-    buf.seek(0)
-
-    bot.send_photo(user_id, photo=buf)
-    bot.answer_callback_query(call.id)
+    # Захват держится до конца фоновой отправки и снимается в её on_done
+    sending = False
+    try:
+        # Формируем строку для подключения
+        cs = get_connection_string(user_id)
+        if cs is None:
+            bot.send_message(user_id, "❗ Не удалось найти параметры подключения")
+            bot.answer_callback_query(call.id)
+            logger.error(f"Can't find configuration for user with id={user_id}")
+            return
+
+        # QR рендерится и отправляется в фоне, обработчик не ждёт кодирования картинки
+        send_qr(sender, user_id, cs, on_done=lambda message: in_flight.release(QR_ACTION, user_id))
+        sending = True
+        bot.answer_callback_query(call.id)
+    finally:
+        if not sending:
+            in_flight.release(QR_ACTION, user_id)
 
 
 @bot.callback_query_handler(func=lambda call: call.data == "get_info")
+@timed_handler
+@rate_limited(bot, "get_info")
 def cmd_send_info(call: types.CallbackQuery) -> None:
     user_id = call.message.chat.id
 
@@ -104,26 +90,63 @@ def cmd_send_info(call: types.CallbackQuery) -> None:
         logger.warning(f"User {user_id} tried to get info without approval")
         return
 
-    logger.info(f"Incoming command /get_info from approved user with id={user_id}")
-    bot.send_message(user_id, "ℹ️ Здесь будет информация об аккаунте")
+    logger.info("Incoming command /get_info from approved user with id=%s", user_id)
+    # Ответ берётся из снимка фоновой синхронизации, к панели не обращаемся
+    bot.send_message(user_id, account_text(user_id))
     bot.answer_callback_query(call.id)
 
 @bot.callback_query_handler(func=lambda c: c.data == 'buy_subscription')
+@timed_handler
 def handle_subscription_payment(callback_query):
     chat_id = callback_query.message.chat.id
 
     bot.send_invoice(
         chat_id=chat_id,
         title="Продление подписки",
-        description="Подписка на 30 дней",
-        payload="buy_subscription",
-        provider_token="",
-        currency="RUB",
-        prices=[types.LabeledPrice(label="Подписка", amount=100*100)],
+        description=f"Подписка на {SUBSCRIPTION_DAYS} дней",
+        invoice_payload=SUBSCRIPTION_PAYLOAD,
+        provider_token=PAYMENT_PROVIDER_TOKEN,
+        currency=SUBSCRIPTION_CURRENCY,
+        prices=[types.LabeledPrice(label="Подписка", amount=SUBSCRIPTION_PRICE)],
         start_parameter="subscription",
         is_flexible=False
     )
+    bot.answer_callback_query(callback_query.id)
+
+
+@bot.pre_checkout_query_handler(func=lambda query: True)
+@timed_handler
+def handle_pre_checkout(query: types.PreCheckoutQuery) -> None:
+    error = check_invoice(
+        query.from_user.id, query.invoice_payload, query.currency, query.total_amount
+    )
+    if error:
+        logger.warning(f"Rejected checkout from user with id={query.from_user.id}: {error}")
+    bot.answer_pre_checkout_query(query.id, ok=error is None, error_message=error)
+
+
+@bot.message_handler(content_types=["successful_payment"])
+@timed_handler
+def handle_successful_payment(message: types.Message) -> None:
+    user_id = message.chat.id
+    payment = message.successful_payment
+    entry = record_payment(
+        user_id,
+        payment.telegram_payment_charge_id,
+        payment.total_amount,
+        payment.currency,
+    )
+    if entry is None:
+        return
+
+    # Срок на панели обновит планировщик, ответ пользователю не ждёт панель
+    subscription_scheduler.schedule(entry)
+    bot.send_message(
+        user_id, f"✅ Оплата получена, подписка действует до {format_expiry(entry)}"
+    )
+
 
 @bot.message_handler(func=lambda message: True)
+@timed_handler
 def fallback(message: types.Message) -> None:
     bot.send_message(message.chat.id, "Не понимаю")
@@ -11,3 +11,54 @@ BOT_TOKEN              = os.getenv("BOT_TOKEN")
 APPROVED_USERS_FILE    = os.getenv("APPROVED_USERS_FILE")
 APPROVAL_REQUESTS_FILE = os.getenv("APPROVAL_REQUESTS_FILE")
 ADMIN_IDS_FILE         = os.getenv("ADMIN_IDS_FILE")
+API_TIMEOUT            = float(os.getenv("API_TIMEOUT", "5"))
+API_SESSION_POOL_SIZE  = int(os.getenv("API_SESSION_POOL_SIZE", "4"))
+INBOUNDS_CACHE_TTL     = float(os.getenv("INBOUNDS_CACHE_TTL", "30"))
+STORAGE_BACKEND        = os.getenv("STORAGE_BACKEND", "json")   # json | sqlite | redis
+STORAGE_DB_FILE        = os.getenv("STORAGE_DB_FILE")
+BOT_MODE               = os.getenv("BOT_MODE", "polling")   # polling | async | webhook
+BOT_WORKERS            = int(os.getenv("BOT_WORKERS", "4"))   # потоки обработчиков TeleBot
+ASYNC_MAX_CONCURRENT_HANDLERS = int(os.getenv("ASYNC_MAX_CONCURRENT_HANDLERS", "64"))
+QR_CACHE_SIZE          = int(os.getenv("QR_CACHE_SIZE", "1024"))
+QR_CACHE_DIR           = os.getenv("QR_CACHE_DIR")   # если не задан, кэш только в памяти
+QR_RENDER_WORKERS      = int(os.getenv("QR_RENDER_WORKERS", "2"))
+API_BATCH_SIZE         = int(os.getenv("API_BATCH_SIZE", "100"))
+PANELS_FILE            = os.getenv("PANELS_FILE")   # JSON-список панелей, без него используется API_URL
+PLACEMENT_STRATEGY     = os.getenv("PLACEMENT_STRATEGY", "clients")   # clients | traffic
+PLACEMENTS_FILE        = os.getenv("PLACEMENTS_FILE")
+TG_GLOBAL_RATE         = float(os.getenv("TG_GLOBAL_RATE", "30"))   # сообщений в секунду на весь бот
+TG_PER_CHAT_RATE       = float(os.getenv("TG_PER_CHAT_RATE", "1"))  # сообщений в секунду в один чат
+TG_SENDER_WORKERS      = int(os.getenv("TG_SENDER_WORKERS", "4"))
+TG_SEND_RETRIES        = int(os.getenv("TG_SEND_RETRIES", "3"))
+WEBHOOK_URL            = os.getenv("WEBHOOK_URL")   # публичный адрес, например https://bot.example.com; обязателен для webhook
+WEBHOOK_PATH           = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET         = os.getenv("WEBHOOK_SECRET")   # обязателен для webhook; 1-256 символов A-Z, a-z, 0-9, _ и -
+WEBHOOK_HOST           = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT           = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+METRICS_PORT           = int(os.getenv("METRICS_PORT", "0"))   # 0 — не поднимать /metrics
+ACCOUNT_SYNC_INTERVAL  = int(os.getenv("ACCOUNT_SYNC_INTERVAL", "60"))   # секунды
+SUBSCRIPTIONS_FILE     = os.getenv("SUBSCRIPTIONS_FILE")
+SUBSCRIPTION_DAYS      = int(os.getenv("SUBSCRIPTION_DAYS", "30"))
+SUBSCRIPTION_PRICE     = int(os.getenv("SUBSCRIPTION_PRICE", "10000"))   # в минимальных единицах валюты
+SUBSCRIPTION_CURRENCY  = os.getenv("SUBSCRIPTION_CURRENCY", "RUB")   # XTR для оплаты звёздами
+PAYMENT_PROVIDER_TOKEN = os.getenv("PAYMENT_PROVIDER_TOKEN", "")   # пустой для оплаты звёздами
+SUBSCRIPTION_REMIND_HOURS = int(os.getenv("SUBSCRIPTION_REMIND_HOURS", "72"))
+SUBSCRIPTION_RETRY_DELAY = int(os.getenv("SUBSCRIPTION_RETRY_DELAY", "60"))   # секунды до повтора неудачного обновления панели
+CLIENT_LOOKUP          = os.getenv("CLIENT_LOOKUP", "snapshot")   # snapshot | stream (потоковый разбор без кэша, для очень больших inbound'ов)
+STORAGE_JOURNAL_COMPACT = int(os.getenv("STORAGE_JOURNAL_COMPACT", "1000"))   # событий журнала JSON-хранилища до сжатия в файл
+COMMANDS_STATE_FILE    = os.getenv("COMMANDS_STATE_FILE")   # хэш выставленных команд бота; без него команды выставляются при каждом запуске
+ADMIN_PAGE_SIZE        = int(os.getenv("ADMIN_PAGE_SIZE", "20"))   # записей на странице /admin
+LOG_LEVEL              = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT             = os.getenv("LOG_FORMAT", "text")   # text | json (по объекту JSON в строке)
+LOG_MODE               = os.getenv("LOG_MODE", "queue")   # queue — запись в stderr в фоновом потоке | sync
+RATE_LIMIT_RATE        = float(os.getenv("RATE_LIMIT_RATE", "0.2"))   # запросов в секунду на пользователя и действие
+RATE_LIMIT_BURST       = int(os.getenv("RATE_LIMIT_BURST", "5"))
+RATE_LIMIT_DB_FILE     = os.getenv("RATE_LIMIT_DB_FILE")   # SQLite для лимитов, переживает перезапуск; без него в памяти
+PANEL_SHED_LATENCY     = float(os.getenv("PANEL_SHED_LATENCY", "0"))   # секунды; выше — запросы к панели отклоняются, 0 — выключено
+PANEL_SHED_COOLDOWN    = float(os.getenv("PANEL_SHED_COOLDOWN", "30"))   # секунды без свежих замеров, после которых сброс снимается
+PANEL_BREAKER_THRESHOLD = int(os.getenv("PANEL_BREAKER_THRESHOLD", "3"))   # сбоев панели подряд до размыкания, 0 — без размыкателя
+PANEL_BREAKER_RESET    = float(os.getenv("PANEL_BREAKER_RESET", "30"))   # секунды до пробного запроса к разомкнутой панели
+PENDING_CLIENTS_FILE   = os.getenv("PENDING_CLIENTS_FILE")   # клиенты, ждущие регистрации на недоступной панели
+REDIS_URL              = os.getenv("REDIS_URL")   # redis://host:6379/0 — общее состояние нескольких экземпляров бота
+REDIS_PREFIX           = os.getenv("REDIS_PREFIX", "vpnbot:")   # префикс ключей и каналов бота на сервере
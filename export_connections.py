@@ -0,0 +1,64 @@
+"""
+Выгрузка строк подключения всех клиентов inbound'а, например для миграции
+на другой сервер. Шаблон строки собирается один раз на inbound, QR-коды
+рендерятся параллельно в нескольких процессах.
+
+    python export_connections.py --inbound 3 --out export/
+    python export_connections.py --panel main --inbound 3 --out export/ --qr
+"""
+import argparse
+import csv
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from logger import api_logger as logger
+from api_client import iter_connection_strings, panels
+from handlers.qr import render_qr_png
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--panel", help="имя панели, по умолчанию первая")
+    parser.add_argument("--inbound", type=int, required=True, help="id inbound'а")
+    parser.add_argument("--out", required=True, help="каталог для connections.csv и QR-кодов")
+    parser.add_argument("--qr", action="store_true", help="сохранить QR-код каждого клиента в PNG")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="процессов рендера QR")
+    return parser.parse_args(argv)
+
+
+def _select_panel(name):
+    if name is None:
+        return panels[0]
+    for panel in panels:
+        if panel.name == name:
+            return panel
+    raise SystemExit(f"Panel {name} not found")
+
+
+def _qr_path(out: str, client: dict) -> str:
+    name = client.get("email") or client.get("id", "")
+    return os.path.join(out, f"{name}.png".replace(os.sep, "_"))
+
+
+def export_inbound(panel, inbound_id: int, out: str, qr: bool = False, workers: int = 1) -> int:
+    """Пишет connections.csv (tgId, email, uri) и при qr — PNG на каждого клиента."""
+    os.makedirs(out, exist_ok=True)
+    connections = list(iter_connection_strings(panel, inbound_id))
+    with open(os.path.join(out, "connections.csv"), "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["tgId", "email", "uri"])
+        writer.writerows([client.get("tgId", ""), client.get("email", ""), uri] for client, uri in connections)
+    if qr and connections:
+        uris = [uri for _, uri in connections]
+        with ProcessPoolExecutor(workers) as pool:
+            pngs = pool.map(render_qr_png, uris, chunksize=max(1, len(uris) // (workers * 4)))
+            for (client, _), png in zip(connections, pngs):
+                with open(_qr_path(out, client), "wb") as qr_file:
+                    qr_file.write(png)
+    logger.info(f"Exported {len(connections)} clients of inbound id={inbound_id} from panel {panel.name} to {out}")
+    return len(connections)
+
+
+if __name__ == "__main__":
+    args = _parse_args(sys.argv[1:])
+    export_inbound(_select_panel(args.panel), args.inbound, args.out, args.qr, args.workers)
@@ -1,3 +1,8 @@
+from handlers.commands import *
 from handlers.keyboards import *
 from handlers.storage import *
 from handlers.user_validation import *
+from handlers.qr import *
+from handlers.inflight import *
+from handlers.admin_pages import *
+from handlers.approvals import *
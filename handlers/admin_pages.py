@@ -0,0 +1,137 @@
+from typing import Optional, Tuple
+from telebot import types
+from config import ADMIN_PAGE_SIZE
+from handlers.storage import (
+    APPROVAL_REQUESTS,
+    APPROVED_USERS,
+    count_users,
+    page_users,
+    search_users,
+)
+
+# Колбэки страниц: adm:<вид>:<n|p>:<курсор>, курсор — user_id крайней записи
+# текущей страницы; пустой курсор — первая страница
+ADMIN_PAGE_PREFIX = "adm:"
+# Ответ на колбэк страницы, который не удалось разобрать (старая версия бота)
+STALE_PAGE_TEXT = "Страница устарела, откройте /admin заново"
+_VIEWS = {"r": APPROVAL_REQUESTS, "u": APPROVED_USERS}
+_TITLES = {"r": "Ожидают", "u": "Одобрены"}
+_EMPTY = {"r": "Заявок нет", "u": "Одобренных пользователей нет"}
+# Сообщения админки уходят с parse_mode="Markdown" (старая разметка): в ней
+# экранируются только эти символы, а escape_markdown рассчитан на MarkdownV2
+_MARKDOWN_SPECIAL = ("_", "*", "`", "[")
+
+
+def _page_callback(view: str, direction: str = "n", cursor: Optional[int] = None) -> str:
+    return f"{ADMIN_PAGE_PREFIX}{view}:{direction}:{'' if cursor is None else cursor}"
+
+
+def parse_admin_callback(data: str) -> Tuple[str, str, Optional[int]]:
+    """Разбирает колбэк страницы в (вид, направление, курсор); ValueError для чужих данных."""
+    view, direction, cursor = data[len(ADMIN_PAGE_PREFIX):].split(":")
+    if view not in _VIEWS or direction not in ("n", "p"):
+        raise ValueError(f"Unknown admin page callback: {data}")
+    return view, direction, int(cursor) if cursor else None
+
+
+def _escape(text: str) -> str:
+    for char in _MARKDOWN_SPECIAL:
+        text = text.replace(char, f"\\{char}")
+    return text
+
+
+def _user_line(entry: dict) -> str:
+    return f"- @{_escape(str(entry.get('username')))} (ID: {entry['user_id']})"
+
+
+def _approve_button(entry: dict) -> types.InlineKeyboardButton:
+    return types.InlineKeyboardButton(
+        text=f"Одобрить @{entry.get('username')}",
+        callback_data=f"approve:{entry['user_id']}"
+    )
+
+
+def admin_page(view: str = "r", direction: str = "n", cursor: Optional[int] = None):
+    """
+    Страница /admin: записи вида view после cursor (n) или перед ним (p).
+    Из хранилища читается не больше ADMIN_PAGE_SIZE + 1 записей, так что
+    стоимость страницы не зависит от числа пользователей.
+    Возвращает (текст, клавиатура).
+    """
+    collection = _VIEWS[view]
+    if direction == "p":
+        entries = page_users(collection, before=cursor, limit=ADMIN_PAGE_SIZE + 1)
+        has_prev = len(entries) > ADMIN_PAGE_SIZE
+        entries = entries[-ADMIN_PAGE_SIZE:]
+        has_next = True
+    else:
+        entries = page_users(collection, after=cursor, limit=ADMIN_PAGE_SIZE + 1)
+        has_next = len(entries) > ADMIN_PAGE_SIZE
+        entries = entries[:ADMIN_PAGE_SIZE]
+        has_prev = cursor is not None
+    if not entries and cursor is not None:
+        # Записи вокруг курсора успели обработать — показываем начало списка
+        return admin_page(view)
+
+    requests_count = count_users(APPROVAL_REQUESTS)
+    users_count = count_users(APPROVED_USERS)
+    count = requests_count if view == "r" else users_count
+    lines = [f"*{_TITLES[view]}: {count}*"] + [_user_line(e) for e in entries]
+    text = "\n".join(lines) if entries else _EMPTY[view]
+
+    markup = types.InlineKeyboardMarkup()
+    if view == "r":
+        if requests_count > 1:
+            markup.add(
+                types.InlineKeyboardButton(
+                    text=f"✅ Одобрить все ({requests_count})",
+                    callback_data="approve_all"
+                )
+            )
+        for entry in entries:
+            markup.add(_approve_button(entry))
+
+    nav = []
+    if has_prev:
+        nav.append(types.InlineKeyboardButton(
+            text="◀️ Назад", callback_data=_page_callback(view, "p", entries[0]["user_id"])
+        ))
+    if has_next:
+        nav.append(types.InlineKeyboardButton(
+            text="Вперёд ▶️", callback_data=_page_callback(view, "n", entries[-1]["user_id"])
+        ))
+    if nav:
+        markup.row(*nav)
+    if view == "r":
+        markup.add(types.InlineKeyboardButton(
+            text=f"👥 Одобренные ({users_count})", callback_data=_page_callback("u")
+        ))
+    else:
+        markup.add(types.InlineKeyboardButton(
+            text=f"🕓 Заявки ({requests_count})", callback_data=_page_callback("r")
+        ))
+    return text, markup
+
+
+def admin_search(query: str):
+    """Результаты поиска по ID или части username в заявках и одобренных. Возвращает (текст, клавиатура)."""
+    requests = search_users(APPROVAL_REQUESTS, query, ADMIN_PAGE_SIZE)
+    users = search_users(APPROVED_USERS, query, ADMIN_PAGE_SIZE)
+
+    lines = [f"🔎 Поиск: {_escape(query)}"]
+    if requests:
+        lines.append(f"*{_TITLES['r']}:*")
+        lines += [_user_line(e) for e in requests]
+    if users:
+        lines.append(f"*{_TITLES['u']}:*")
+        lines += [_user_line(e) for e in users]
+    if not requests and not users:
+        lines.append("Ничего не найдено")
+    if ADMIN_PAGE_SIZE in (len(requests), len(users)):
+        lines.append(f"\nПоказаны первые {ADMIN_PAGE_SIZE} совпадений, уточните запрос")
+
+    markup = types.InlineKeyboardMarkup()
+    for entry in requests:
+        markup.add(_approve_button(entry))
+    markup.add(types.InlineKeyboardButton(text="📋 Все заявки", callback_data=_page_callback("r")))
+    return "\n".join(lines), markup
@@ -0,0 +1,138 @@
+from logger import api_logger as logger
+from typing import Dict, List, Optional, Tuple
+from handlers.keyboards import approve_keyboard, user_keyboard
+from handlers.storage import (
+    add_approval_request,
+    add_approval_requests,
+    add_approved_users,
+    get_approval_request,
+    load_admins,
+    remove_approval_requests,
+    remove_approved_users,
+)
+from handlers.user_validation import is_approved_user
+
+# Логика заявок, общая для обработчиков TeleBot и AsyncTeleBot. Функции
+# блокируются на хранилище: асинхронные обработчики зовут их через
+# asyncio.to_thread, а запросы к панели и ответы в чат делают сами.
+# sender — очередь исходящих сообщений соответствующего бота.
+
+# Исходы /start
+ALREADY_APPROVED = "approved"
+ALREADY_PENDING = "pending"
+SUBMITTED = "submitted"
+
+_START_REPLIES = {
+    ALREADY_APPROVED: "✅ Вы уже зарегистрированы! Выберите действие ниже:",
+    ALREADY_PENDING: "⌛ Ваша заявка уже принята и ожидает одобрения",
+    SUBMITTED: "📝 Ваша заявка принята и отправлена на рассмотрение администраторам",
+}
+
+
+def new_requests_digest(parts: list) -> tuple:
+    """Склеивает накопившиеся уведомления о заявках в одно сообщение."""
+    text = f"🆕 Новых заявок: {len(parts)}\n" + "\n".join(parts)
+    return text + "\n\nОдобрить их можно в /admin", {}
+
+
+def submit_request(sender, user_id: int, username: str) -> str:
+    """
+    Сохраняет заявку на /start и уведомляет админов. Возвращает исход:
+    ALREADY_APPROVED, ALREADY_PENDING или SUBMITTED.
+    """
+    if is_approved_user(user_id):
+        return ALREADY_APPROVED
+
+    # Новая заявка, если она ещё не ожидает
+    if not add_approval_request(user_id, username):
+        return ALREADY_PENDING
+    logger.info("Saved request for user with id=%s", user_id)
+
+    admins = load_admins()
+    for admin in admins:
+        sender.send_message(
+            admin["user_id"],
+            f"🆕 Новая заявка от @{username} with id={user_id})",
+            digest=new_requests_digest,
+            reply_markup=approve_keyboard(user_id),
+        )
+    logger.info("Отправлен запрос на одобрение администраторам: %s", admins)
+    return SUBMITTED
+
+
+def start_reply(outcome: str) -> Tuple[str, Optional[str]]:
+    """Ответ пользователю на /start: (текст, клавиатура)."""
+    markup = user_keyboard() if outcome == ALREADY_APPROVED else None
+    return _START_REPLIES[outcome], markup
+
+
+def get_approval_requests(user_ids: List[int]) -> List[dict]:
+    """Ожидающие заявки из user_ids, уже обработанные пропускаются."""
+    return [r for r in map(get_approval_request, user_ids) if r]
+
+
+def take_requests(user_ids: List[int]) -> List[dict]:
+    """
+    Снимает заявки до обращения к панели: повторный колбэк их уже не найдёт.
+    Неудачные заявки settle_requests возвращает обратно.
+    """
+    return remove_approval_requests(user_ids)
+
+
+def settle_requests(
+    sender, caller_id: int, requests: List[dict], results: Dict[int, bool]
+) -> Tuple[List[dict], List[dict]]:
+    """
+    Одним обновлением хранилища переносит заявки, зарегистрированные на
+    панели (results), в одобренные, а остальные возвращает в ожидание,
+    и уведомляет одобренных. Возвращает (одобренные, неудачные).
+    """
+    approved = [r for r in requests if results.get(r['user_id'])]
+    failed = [r for r in requests if not results.get(r['user_id'])]
+
+    add_approved_users(approved)
+    add_approval_requests(failed)
+    logger.info("Approved %s users by admin %s, failed: %s", len(approved), caller_id, len(failed))
+
+    for r in approved:
+        sender.send_message(
+            r['user_id'],
+            "✅ Ваша заявка одобрена! Вы зарегистрированы",
+            reply_markup=user_keyboard()
+        )
+    return approved, failed
+
+
+def revoke_rejected(sender, user_ids: List[int]) -> List[dict]:
+    """
+    Возвращает в ожидание пользователей, одобренных, пока панель была
+    недоступна, если повторную регистрацию панель отклонила, и сообщает
+    об этом им и админам. Возвращает отозванные записи.
+    """
+    revoked = remove_approved_users(user_ids)
+    add_approval_requests(revoked)
+    logger.warning("Revoked approval of %s users rejected by the panel", len(revoked))
+
+    admins = load_admins()
+    for r in revoked:
+        sender.send_message(
+            r['user_id'],
+            "❗ Не удалось завершить регистрацию, заявка снова ожидает одобрения администратора"
+        )
+        for admin in admins:
+            sender.send_message(
+                admin["user_id"],
+                f"❗ Панель отклонила отложенную регистрацию @{r.get('username')} with id={r['user_id']}), "
+                "заявка возвращена в ожидание",
+                digest=new_requests_digest,
+                reply_markup=approve_keyboard(r['user_id']),
+            )
+    return revoked
+
+
+def approval_summary(approved: list, failed: list) -> str:
+    text = f"✅ Одобрено заявок: {len(approved)}"
+    if failed:
+        ids = ", ".join(str(r['user_id']) for r in failed)
+        text += f"\n❗ Ошибка при регистрации API: {ids}"
+    return text
@@ -0,0 +1,80 @@
+import hashlib
+import json
+import os
+from logger import api_logger as logger
+from typing import List, NamedTuple
+from telebot import types
+from config import COMMANDS_STATE_FILE
+from handlers.storage import _atomic_write_json
+
+user_commands = [
+    types.BotCommand("start", "Запустить бота"),
+    types.BotCommand("help", "Помощь"),
+]
+
+admin_commands = [
+    types.BotCommand("admin", "Панель администратора"),
+    types.BotCommand("approve", "Одобрить заявки по ID"),
+]
+
+
+class CommandsPlan(NamedTuple):
+    """Что нужно выставить в Telegram, чтобы команды совпали с текущими."""
+
+    default: bool
+    register: List[int]
+    remove: List[int]
+    state: dict
+
+
+def _digest(commands: List[types.BotCommand]) -> str:
+    data = json.dumps([c.to_dict() for c in commands], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _load_commands_state() -> dict:
+    if not COMMANDS_STATE_FILE or not os.path.exists(COMMANDS_STATE_FILE):
+        return {}
+    try:
+        with open(COMMANDS_STATE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Failed to read {COMMANDS_STATE_FILE}: {e}")
+        return {}
+
+
+def plan_commands(bot_id: str, admin_ids: List[int]) -> CommandsPlan:
+    """
+    Сравнивает хэши команд и список админов с сохранёнными при прошлом
+    запуске. Админские команды выставляются новым админам (или всем, если
+    изменились сами команды) и снимаются с тех, кто перестал быть админом.
+    """
+    state = {
+        "bot": bot_id,
+        "user_commands": _digest(user_commands),
+        "admin_commands": _digest(admin_commands),
+        "admins": sorted(set(admin_ids)),
+    }
+    old = _load_commands_state()
+    if old.get("bot") != bot_id:
+        old = {}
+    old_admins = set(old.get("admins", []))
+    if old.get("admin_commands") == state["admin_commands"]:
+        register = [uid for uid in state["admins"] if uid not in old_admins]
+    else:
+        register = state["admins"]
+    return CommandsPlan(
+        default=old.get("user_commands") != state["user_commands"],
+        register=register,
+        remove=sorted(old_admins - set(admin_ids)),
+        state=state,
+    )
+
+
+def save_commands_state(state: dict) -> None:
+    if not COMMANDS_STATE_FILE:
+        return
+    try:
+        _atomic_write_json(COMMANDS_STATE_FILE, state)
+    except OSError as e:
+        logger.warning(f"Failed to save {COMMANDS_STATE_FILE}: {e}")
@@ -0,0 +1,53 @@
+import threading
+from contextlib import contextmanager
+from typing import Iterable, List
+from metrics import DUPLICATE_CALLBACKS
+
+# Действия над заявкой: одобрение и отклонение одной заявки исключают друг друга
+REQUEST_ACTION = "request"
+QR_ACTION = "qr"
+
+
+class InFlight:
+    """
+    Реестр операций, выполняющихся прямо сейчас, по ключу (действие, user_id).
+    Повторный колбэк для того же ключа не ждёт первый, а сразу получает отказ,
+    так что панель и хранилище не трогаются дважды. Захват и освобождение
+    не блокируются, поэтому реестр годится и для потоков TeleBot,
+    и для event loop AsyncTeleBot.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = set()
+
+    def claim(self, action: str, user_id: int) -> bool:
+        key = (action, user_id)
+        with self._lock:
+            if key in self._keys:
+                DUPLICATE_CALLBACKS.labels(action).inc()
+                return False
+            self._keys.add(key)
+            return True
+
+    def claim_many(self, action: str, user_ids: Iterable[int]) -> List[int]:
+        """Захватывает свободные из user_ids и возвращает захваченные."""
+        return [user_id for user_id in user_ids if self.claim(action, user_id)]
+
+    def release(self, action: str, *user_ids: int) -> None:
+        with self._lock:
+            for user_id in user_ids:
+                self._keys.discard((action, user_id))
+
+    @contextmanager
+    def single(self, action: str, user_id: int):
+        """Блок with выполняется с захваченным ключом; as-значение — удалось ли захватить."""
+        claimed = self.claim(action, user_id)
+        try:
+            yield claimed
+        finally:
+            if claimed:
+                self.release(action, user_id)
+
+
+in_flight = InFlight()
@@ -1,5 +1,8 @@
 from telebot import types
 
+# Подставляется вместо user_id при сборке шаблона клавиатуры
+_USER_ID = "{user_id}"
+
 
 def make_user_keyboard() -> types.InlineKeyboardMarkup:
     kb = types.InlineKeyboardMarkup()
@@ -18,6 +21,15 @@ def make_user_keyboard() -> types.InlineKeyboardMarkup:
     )
     return kb
 
+def make_renewal_keyboard() -> types.InlineKeyboardMarkup:
+    kb = types.InlineKeyboardMarkup()
+    kb.add(
+        types.InlineKeyboardButton(
+            text="⭐ Продлить подписку", callback_data="buy_subscription"
+        )
+    )
+    return kb
+
 # def make_subscription_keyboard() -> types.InlineKeyboardMarkup:
 #     kb = types.InlineKeyboardMarkup()
 #     kb.add(
@@ -40,3 +52,40 @@ def make_approve_management_keyboard(user_id: int) -> types.InlineKeyboardMarkup
         )
     )
     return kb
+
+
+class KeyboardTemplate:
+    """
+    Клавиатура, сериализованная в JSON один раз. Telebot передаёт строку
+    reply_markup в Bot API как есть, поэтому при отправке разметка не
+    собирается и не кодируется заново. Если клавиатура построена с user_id
+    = "{user_id}", render подставляет настоящий id склейкой готовых кусков.
+    """
+
+    def __init__(self, markup: types.InlineKeyboardMarkup):
+        self._parts = markup.to_json().split(_USER_ID)
+
+    def render(self, user_id: int = 0) -> str:
+        if len(self._parts) == 1:
+            return self._parts[0]
+        return str(user_id).join(self._parts)
+
+
+_USER_KEYBOARD = KeyboardTemplate(make_user_keyboard())
+_RENEWAL_KEYBOARD = KeyboardTemplate(make_renewal_keyboard())
+_APPROVE_KEYBOARD = KeyboardTemplate(make_approve_management_keyboard(_USER_ID))
+
+
+def user_keyboard() -> str:
+    """То же, что make_user_keyboard, но готовым JSON для reply_markup."""
+    return _USER_KEYBOARD.render()
+
+
+def renewal_keyboard() -> str:
+    """То же, что make_renewal_keyboard, но готовым JSON для reply_markup."""
+    return _RENEWAL_KEYBOARD.render()
+
+
+def approve_keyboard(user_id: int) -> str:
+    """То же, что make_approve_management_keyboard, но готовым JSON для reply_markup."""
+    return _APPROVE_KEYBOARD.render(user_id)
@@ -0,0 +1,215 @@
+import asyncio
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from logger import api_logger as logger
+from typing import Callable, Optional
+from config import QR_CACHE_SIZE, QR_CACHE_DIR, QR_RENDER_WORKERS
+from metrics import QR_RENDER_SECONDS, count_cache, timed
+
+
+def qr_key(cs: str) -> str:
+    return hashlib.sha256(cs.encode("utf-8")).hexdigest()
+
+
+@timed(QR_RENDER_SECONDS)
+def render_qr_png(cs: str) -> bytes:
+    # qrcode тянет за собой PIL, поэтому импортируется при первом рендере, а не на старте
+    import qrcode
+
+    buf = io.BytesIO()
+    qrcode.make(cs).save(buf, "PNG")
+    return buf.getvalue()
+
+
+class QrCache:
+    """
+    LRU-кэш PNG с QR-кодами и file_id картинок, уже загруженных в Telegram.
+    Если задан cache_dir, записи дублируются на диск и переживают перезапуск.
+    """
+
+    def __init__(self, size: int, cache_dir: Optional[str] = None):
+        self._size = size
+        self._cache_dir = cache_dir
+        # С диском чтение и запись блокируются, из event loop их зовут через поток
+        self.on_disk = bool(cache_dir)
+        self._images = OrderedDict()
+        self._file_ids = OrderedDict()
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _remember(self, entries: OrderedDict, key: str, value) -> None:
+        with self._lock:
+            entries[key] = value
+            entries.move_to_end(key)
+            while len(entries) > self._size:
+                entries.popitem(last=False)
+
+    def _recall(self, entries: OrderedDict, key: str):
+        with self._lock:
+            value = entries.get(key)
+            if value is not None:
+                entries.move_to_end(key)
+            return value
+
+    def _disk_path(self, key: str, suffix: str) -> str:
+        return os.path.join(self._cache_dir, f"{key}{suffix}")
+
+    def _read_disk(self, key: str, suffix: str) -> Optional[bytes]:
+        if not self._cache_dir:
+            return None
+        try:
+            with open(self._disk_path(key, suffix), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_disk(self, key: str, suffix: str, data: bytes) -> None:
+        if not self._cache_dir:
+            return
+        path = self._disk_path(key, suffix)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Failed to write QR cache file {path}: {e}")
+
+    def get_png(self, key: str) -> Optional[bytes]:
+        png = self._recall(self._images, key)
+        if png is None:
+            png = self._read_disk(key, ".png")
+            if png is not None:
+                self._remember(self._images, key, png)
+        count_cache("qr_png", png is not None)
+        return png
+
+    def put_png(self, key: str, png: bytes) -> None:
+        self._remember(self._images, key, png)
+        self._write_disk(key, ".png", png)
+
+    def get_file_id(self, key: str) -> Optional[str]:
+        file_id = self._recall(self._file_ids, key)
+        if file_id is None:
+            data = self._read_disk(key, ".file_id")
+            if data is not None:
+                file_id = data.decode("utf-8")
+                self._remember(self._file_ids, key, file_id)
+        count_cache("qr_file_id", file_id is not None)
+        return file_id
+
+    def put_file_id(self, key: str, file_id: str) -> None:
+        self._remember(self._file_ids, key, file_id)
+        self._write_disk(key, ".file_id", file_id.encode("utf-8"))
+
+
+qr_cache = QrCache(QR_CACHE_SIZE, QR_CACHE_DIR)
+
+_render_pool = ThreadPoolExecutor(QR_RENDER_WORKERS, thread_name_prefix="qr-render")
+_rendering = {}
+_rendering_lock = threading.Lock()
+
+
+def _store_rendered(key: str, future: Future) -> None:
+    with _rendering_lock:
+        _rendering.pop(key, None)
+    if future.exception() is None:
+        qr_cache.put_png(key, future.result())
+
+
+def get_qr_png(cs: str) -> Future:
+    """
+    Возвращает Future с PNG для строки подключения.
+    При промахе кэша рендер выполняется в пуле потоков, одинаковые
+    одновременные запросы ждут один и тот же рендер.
+    """
+    key = qr_key(cs)
+    png = qr_cache.get_png(key)
+    if png is not None:
+        future = Future()
+        future.set_result(png)
+        return future
+    with _rendering_lock:
+        future = _rendering.get(key)
+        submitted = future is None
+        if submitted:
+            future = _render_pool.submit(render_qr_png, cs)
+            _rendering[key] = future
+    if submitted:
+        future.add_done_callback(lambda f: _store_rendered(key, f))
+    return future
+
+
+QR_FAILED_TEXT = "❗ Не удалось подготовить QR-код, попробуйте позже"
+
+
+def _photo(png: bytes) -> io.BytesIO:
+    buf = io.BytesIO(png)
+    buf.name = "qrcode.png"
+    return buf
+
+
+def _remember_file_id(key: str, message) -> None:
+    if message and message.photo:
+        qr_cache.put_file_id(key, message.photo[-1].file_id)
+
+
+def send_qr(sender, chat_id: int, cs: str, on_done: Optional[Callable] = None) -> None:
+    """
+    Ставит QR-код в очередь отправки, не дожидаясь рендера. Пул рендера
+    только кодирует PNG: загрузка в Telegram идёт потоками очереди, так что
+    медленная загрузка или 429 не занимают воркеры рендера. Повторная
+    отправка того же QR использует file_id и не загружает картинку заново.
+    on_done вызывается один раз, когда отправка закончилась: с сообщением
+    Telegram или None, если рендер либо отправка не удались.
+    """
+    on_done = on_done or (lambda message: None)
+    key = qr_key(cs)
+    file_id = qr_cache.get_file_id(key)
+    if file_id:
+        sender.send_photo(chat_id, file_id, on_done=on_done)
+        return
+
+    def _sent(message) -> None:
+        try:
+            _remember_file_id(key, message)
+        finally:
+            on_done(message)
+
+    def _rendered(future: Future) -> None:
+        if future.exception() is not None:
+            logger.error(f"Failed to render QR for user with id={chat_id}: {future.exception()}")
+            sender.send_message(chat_id, QR_FAILED_TEXT)
+            on_done(None)
+            return
+        sender.send_photo(chat_id, future.result(), on_done=_sent)
+
+    get_qr_png(cs).add_done_callback(_rendered)
+
+
+async def _off_loop(func, *args):
+    if qr_cache.on_disk:
+        return await asyncio.to_thread(func, *args)
+    return func(*args)
+
+
+async def send_qr_async(bot, chat_id: int, cs: str) -> None:
+    """То же, что send_qr, для AsyncTeleBot."""
+    key = qr_key(cs)
+    file_id = await _off_loop(qr_cache.get_file_id, key)
+    if file_id:
+        await bot.send_photo(chat_id, photo=file_id)
+        return
+    try:
+        png = await asyncio.wrap_future(await _off_loop(get_qr_png, cs))
+    except Exception as e:
+        logger.error(f"Failed to render QR for user with id={chat_id}: {e}")
+        await bot.send_message(chat_id, QR_FAILED_TEXT)
+        return
+    message = await bot.send_photo(chat_id, photo=_photo(png))
+    await _off_loop(_remember_file_id, key, message)
@@ -0,0 +1,292 @@
+import json
+import threading
+import time
+import uuid
+import redis
+from logger import api_logger as logger
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from handlers.storage_backend import StorageBackend, COLLECTIONS
+
+# Пауза перед повторной подпиской, если соединение с сервером оборвалось
+_RESUBSCRIBE_DELAY = 1.0
+
+
+def connect(url: str) -> redis.Redis:
+    """Клиент Redis-совместимого сервера с общим пулом соединений, безопасный для потоков."""
+    if not url:
+        raise ValueError("Redis URL is not set in config")
+    return redis.Redis.from_url(url, decode_responses=True)
+
+
+class RedisStorage(StorageBackend):
+    """
+    Хранилище на Redis-совместимом сервере, общее для нескольких экземпляров
+    бота. Записи коллекции лежат в хэше <prefix><collection> по user_id,
+    а сортированное множество <prefix><collection>:ids с user_id в качестве
+    веса даёт постраничный обход без чтения всей коллекции. Каждое изменение
+    выполняется одной транзакцией MULTI/EXEC, так что, например, заявку
+    удаляет и получает ровно один экземпляр. Поиск — общий, через load.
+    """
+
+    def __init__(self, client: redis.Redis, prefix: str = ""):
+        self._redis = client
+        self._prefix = prefix
+
+    def _keys(self, collection: str) -> Tuple[str, str]:
+        if collection not in COLLECTIONS:
+            raise ValueError(f"Unknown collection: {collection}")
+        key = f"{self._prefix}{collection}"
+        return key, f"{key}:ids"
+
+    @staticmethod
+    def _by_id(entries: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+        # Как и в JSON-хранилище, из записей с одинаковым user_id остаётся первая
+        unique = {}
+        for entry in entries:
+            unique.setdefault(entry["user_id"], entry)
+        return unique
+
+    def _decode(self, values: List[Optional[str]]) -> List[Dict[str, Any]]:
+        return [json.loads(value) for value in values if value is not None]
+
+    def load(self, collection: str) -> List[Dict[str, Any]]:
+        key, _ = self._keys(collection)
+        entries = self._decode(self._redis.hvals(key))
+        entries.sort(key=lambda e: e["user_id"])
+        return entries
+
+    def save(self, collection: str, entries: List[Dict[str, Any]]) -> None:
+        key, ids = self._keys(collection)
+        unique = self._by_id(entries)
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.delete(key, ids)
+        if unique:
+            pipe.hset(key, mapping={
+                user_id: json.dumps(entry, ensure_ascii=False) for user_id, entry in unique.items()
+            })
+            pipe.zadd(ids, {user_id: user_id for user_id in unique})
+        pipe.execute()
+
+    def get(self, collection: str, user_id: int) -> Optional[Dict[str, Any]]:
+        key, _ = self._keys(collection)
+        value = self._redis.hget(key, user_id)
+        return json.loads(value) if value is not None else None
+
+    def add(self, collection: str, entry: Dict[str, Any]) -> bool:
+        return self.add_many(collection, [entry]) == 1
+
+    def remove(self, collection: str, user_id: int) -> Optional[Dict[str, Any]]:
+        removed = self.remove_many(collection, [user_id])
+        return removed[0] if removed else None
+
+    def add_many(self, collection: str, entries: List[Dict[str, Any]]) -> int:
+        key, ids = self._keys(collection)
+        unique = self._by_id(entries)
+        if not unique:
+            return 0
+        pipe = self._redis.pipeline(transaction=True)
+        for user_id, entry in unique.items():
+            pipe.hsetnx(key, user_id, json.dumps(entry, ensure_ascii=False))
+        # Для уже существующих записей ZADD ничего не меняет
+        pipe.zadd(ids, {user_id: user_id for user_id in unique})
+        return sum(pipe.execute()[:-1])
+
+    def remove_many(self, collection: str, user_ids: List[int]) -> List[Dict[str, Any]]:
+        key, ids = self._keys(collection)
+        user_ids = list(set(user_ids))
+        if not user_ids:
+            return []
+        # HMGET внутри транзакции видит ровно те записи, которые удалит HDEL
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.hmget(key, user_ids)
+        pipe.hdel(key, *user_ids)
+        pipe.zrem(ids, *user_ids)
+        return self._decode(pipe.execute()[0])
+
+    def put_many(self, collection: str, entries: List[Dict[str, Any]]) -> int:
+        key, ids = self._keys(collection)
+        latest = {entry["user_id"]: entry for entry in entries}
+        if not latest:
+            return 0
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.hset(key, mapping={
+            user_id: json.dumps(entry, ensure_ascii=False) for user_id, entry in latest.items()
+        })
+        pipe.zadd(ids, {user_id: user_id for user_id in latest})
+        pipe.execute()
+        return len(latest)
+
+    def replace_many(
+        self, collection: str, pairs: List[Tuple[Optional[Dict[str, Any]], Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
+        key, ids = self._keys(collection)
+        if not pairs:
+            return []
+        user_ids = [entry["user_id"] for _, entry in pairs]
+        while True:
+            # WATCH: если хэш изменят между чтением и EXEC, сравнение повторяется
+            with self._redis.pipeline(transaction=True) as pipe:
+                try:
+                    pipe.watch(key)
+                    current = pipe.hmget(key, user_ids)
+                    replaced = [
+                        entry for (expected, entry), value in zip(pairs, current)
+                        if (json.loads(value) if value is not None else None) == expected
+                    ]
+                    if not replaced:
+                        return []
+                    pipe.multi()
+                    pipe.hset(key, mapping={
+                        entry["user_id"]: json.dumps(entry, ensure_ascii=False) for entry in replaced
+                    })
+                    pipe.zadd(ids, {entry["user_id"]: entry["user_id"] for entry in replaced})
+                    pipe.execute()
+                    return replaced
+                except redis.WatchError:
+                    continue
+
+    def page(
+        self,
+        collection: str,
+        after: Optional[int] = None,
+        before: Optional[int] = None,
+        limit: int = 20,
+    ) -> List[Dict[str, Any]]:
+        key, ids = self._keys(collection)
+        if not limit:
+            return []
+        if before is not None:
+            page_ids = self._redis.zrevrangebyscore(ids, f"({before}", "-inf", start=0, num=limit)
+            page_ids.reverse()
+        else:
+            low = f"({after}" if after is not None else "-inf"
+            page_ids = self._redis.zrangebyscore(ids, low, "+inf", start=0, num=limit)
+        if not page_ids:
+            return []
+        return self._decode(self._redis.hmget(key, page_ids))
+
+    def count(self, collection: str) -> int:
+        key, _ = self._keys(collection)
+        return self._redis.hlen(key)
+
+
+class RedisSharedInbounds:
+    """
+    Общий для экземпляров бота кэш ответа inbounds/list по панелям и
+    рассылка его сброса через pub/sub. Ответ панели кладётся под ключ
+    <prefix>inbounds:<панель> на ttl секунд. Счётчик поколений
+    <prefix>inbounds:<панель>:gen растёт при каждом сбросе, и ответ,
+    полученный до сброса, в кэш уже не попадёт. Ошибки сервера не мешают
+    работе: кэш просто считается пустым.
+    """
+
+    def __init__(self, client: redis.Redis, prefix: str, ttl: float):
+        self._redis = client
+        self._prefix = prefix
+        self._ttl_ms = max(1, int(ttl * 1000))
+        self._channel = f"{prefix}inbounds:invalidate"
+        # Свои сообщения о сбросе слушателю не нужны: локальный кэш уже сброшен
+        self._instance = uuid.uuid4().hex
+
+    def _keys(self, panel: str) -> Tuple[str, str]:
+        key = f"{self._prefix}inbounds:{panel}"
+        return key, f"{key}:gen"
+
+    def get(self, panel: str) -> Tuple[Optional[list], Optional[str]]:
+        """
+        Возвращает (inbounds или None, поколение). Поколение передаётся
+        в put вместе с ответом панели, полученным после промаха.
+        """
+        key, gen = self._keys(panel)
+        try:
+            value, generation = self._redis.mget(key, gen)
+        except redis.RedisError as e:
+            logger.warning(f"Shared inbounds cache is unavailable: {e}")
+            return None, None
+        return (json.loads(value) if value is not None else None), generation or "0"
+
+    def put(self, panel: str, inbounds: list, generation: Optional[str]) -> None:
+        if generation is None:
+            return
+        key, gen = self._keys(panel)
+        value = json.dumps(inbounds, ensure_ascii=False)
+        try:
+            with self._redis.pipeline(transaction=True) as pipe:
+                pipe.watch(gen)
+                if (pipe.get(gen) or "0") != generation:
+                    return
+                pipe.multi()
+                pipe.set(key, value, px=self._ttl_ms)
+                pipe.execute()
+        except redis.WatchError:
+            pass
+        except redis.RedisError as e:
+            logger.warning(f"Failed to store inbounds of panel {panel} in shared cache: {e}")
+
+    def invalidate(self, panel: str) -> None:
+        key, gen = self._keys(panel)
+        try:
+            pipe = self._redis.pipeline(transaction=True)
+            pipe.incr(gen)
+            pipe.delete(key)
+            pipe.publish(self._channel, f"{self._instance} {panel}")
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Failed to invalidate shared inbounds of panel {panel}: {e}")
+
+    def listen(self, on_invalidate: Callable[[str], None]) -> threading.Thread:
+        """Вызывает on_invalidate(панель) в фоновом потоке, когда её сбросил другой экземпляр."""
+        thread = threading.Thread(
+            target=self._listen, args=(on_invalidate,), name="inbounds-invalidation", daemon=True
+        )
+        thread.start()
+        return thread
+
+    def _listen(self, on_invalidate: Callable[[str], None]) -> None:
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self._channel)
+                for message in pubsub.listen():
+                    instance, _, panel = message["data"].partition(" ")
+                    if instance != self._instance:
+                        on_invalidate(panel)
+            except redis.RedisError as e:
+                logger.warning(f"Inbounds invalidation channel failed: {e}")
+            except Exception as e:
+                logger.error(f"Failed to handle inbounds invalidation: {e}", exc_info=True)
+            time.sleep(_RESUBSCRIBE_DELAY)
+
+
+if __name__ == "__main__":
+    from config import (
+        REDIS_URL,
+        REDIS_PREFIX,
+        APPROVAL_REQUESTS_FILE,
+        APPROVED_USERS_FILE,
+        ADMIN_IDS_FILE,
+        PLACEMENTS_FILE,
+        SUBSCRIPTIONS_FILE,
+        PENDING_CLIENTS_FILE,
+    )
+    from handlers.sqlite_storage import import_json_files
+    from handlers.storage_backend import (
+        APPROVAL_REQUESTS,
+        APPROVED_USERS,
+        ADMINS,
+        PLACEMENTS,
+        SUBSCRIPTIONS,
+        PENDING_CLIENTS,
+    )
+
+    import_json_files(
+        RedisStorage(connect(REDIS_URL), REDIS_PREFIX),
+        {
+            APPROVAL_REQUESTS: APPROVAL_REQUESTS_FILE,
+            APPROVED_USERS: APPROVED_USERS_FILE,
+            ADMINS: ADMIN_IDS_FILE,
+            PLACEMENTS: PLACEMENTS_FILE,
+            SUBSCRIPTIONS: SUBSCRIPTIONS_FILE,
+            PENDING_CLIENTS: PENDING_CLIENTS_FILE,
+        },
+    )
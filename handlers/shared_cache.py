@@ -0,0 +1,32 @@
+from config import INBOUNDS_CACHE_TTL, REDIS_PREFIX, REDIS_URL
+
+
+class LocalInbounds:
+    """
+    Общий кэш inbound'ов, когда бот работает одним экземпляром:
+    делиться не с кем, поэтому все операции пустые.
+    """
+
+    def get(self, panel: str):
+        return None, None
+
+    def put(self, panel: str, inbounds: list, generation) -> None:
+        pass
+
+    def invalidate(self, panel: str) -> None:
+        pass
+
+    def listen(self, on_invalidate) -> None:
+        return None
+
+
+def _create_shared_inbounds():
+    if not REDIS_URL:
+        return LocalInbounds()
+    from handlers.redis_storage import RedisSharedInbounds, connect
+
+    return RedisSharedInbounds(connect(REDIS_URL), REDIS_PREFIX, INBOUNDS_CACHE_TTL)
+
+
+# Кэш ответа inbounds/list, общий для экземпляров бота с одним REDIS_URL
+shared_inbounds = _create_shared_inbounds()
@@ -0,0 +1,263 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from logger import api_logger as logger
+from typing import List, Dict, Any, Optional, Tuple
+from handlers.storage_backend import (
+    StorageBackend,
+    COLLECTIONS,
+    APPROVAL_REQUESTS,
+    APPROVED_USERS,
+    ADMINS,
+    PLACEMENTS,
+    SUBSCRIPTIONS,
+    PENDING_CLIENTS,
+)
+
+
+class SqliteStorage(StorageBackend):
+    """
+    Хранилище в SQLite (WAL): по таблице на коллекцию с user_id в качестве
+    первичного ключа, так что добавление и удаление записи — одна строка.
+    Размеры коллекций ведутся триггерами в collection_sizes, чтобы count
+    не сканировал таблицу. У каждого потока своё соединение.
+    """
+
+    def __init__(self, path: str):
+        if not path:
+            raise ValueError("Storage database path is not set in config")
+        self.path = path
+        self._local = threading.local()
+        dir_path = os.path.dirname(path)
+        if dir_path:
+            os.makedirs(dir_path, exist_ok=True)
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS collection_sizes ("
+                "collection TEXT PRIMARY KEY, size INTEGER NOT NULL)"
+            )
+            for collection in COLLECTIONS:
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {collection} ("
+                    "user_id INTEGER PRIMARY KEY, data TEXT NOT NULL)"
+                )
+                conn.execute(
+                    "INSERT OR IGNORE INTO collection_sizes (collection, size) "
+                    f"VALUES (?, (SELECT COUNT(*) FROM {collection}))",
+                    (collection,),
+                )
+                for event, delta in (("INSERT", "+ 1"), ("DELETE", "- 1")):
+                    conn.execute(
+                        f"CREATE TRIGGER IF NOT EXISTS {collection}_{event.lower()}_size "
+                        f"AFTER {event} ON {collection} BEGIN "
+                        f"UPDATE collection_sizes SET size = size {delta} "
+                        f"WHERE collection = '{collection}'; END"
+                    )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # Иначе удаление строки через INSERT OR REPLACE не запускает триггер размера
+            conn.execute("PRAGMA recursive_triggers=ON")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @staticmethod
+    def _check(collection: str) -> str:
+        if collection not in COLLECTIONS:
+            raise ValueError(f"Unknown collection: {collection}")
+        return collection
+
+    def load(self, collection: str) -> List[Dict[str, Any]]:
+        rows = self._connection().execute(
+            f"SELECT data FROM {self._check(collection)} ORDER BY user_id"
+        )
+        return [json.loads(data) for (data,) in rows]
+
+    def save(self, collection: str, entries: List[Dict[str, Any]]) -> None:
+        table = self._check(collection)
+        with self._transaction() as conn:
+            conn.execute(f"DELETE FROM {table}")
+            conn.executemany(
+                f"INSERT OR REPLACE INTO {table} (user_id, data) VALUES (?, ?)",
+                [(e["user_id"], json.dumps(e, ensure_ascii=False)) for e in entries],
+            )
+
+    def get(self, collection: str, user_id: int) -> Optional[Dict[str, Any]]:
+        row = (
+            self._connection()
+            .execute(
+                f"SELECT data FROM {self._check(collection)} WHERE user_id = ?",
+                (user_id,),
+            )
+            .fetchone()
+        )
+        return json.loads(row[0]) if row else None
+
+    def add(self, collection: str, entry: Dict[str, Any]) -> bool:
+        cursor = self._connection().execute(
+            f"INSERT OR IGNORE INTO {self._check(collection)} (user_id, data) "
+            "VALUES (?, ?)",
+            (entry["user_id"], json.dumps(entry, ensure_ascii=False)),
+        )
+        return cursor.rowcount == 1
+
+    def remove(self, collection: str, user_id: int) -> Optional[Dict[str, Any]]:
+        table = self._check(collection)
+        with self._transaction() as conn:
+            row = conn.execute(
+                f"SELECT data FROM {table} WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+        return json.loads(row[0])
+
+    def add_many(self, collection: str, entries: List[Dict[str, Any]]) -> int:
+        table = self._check(collection)
+        with self._transaction() as conn:
+            # rowcount, в отличие от total_changes, не считает изменения триггеров счётчика
+            cursor = conn.executemany(
+                f"INSERT OR IGNORE INTO {table} (user_id, data) VALUES (?, ?)",
+                [(e["user_id"], json.dumps(e, ensure_ascii=False)) for e in entries],
+            )
+            return cursor.rowcount
+
+    def remove_many(self, collection: str, user_ids: List[int]) -> List[Dict[str, Any]]:
+        table = self._check(collection)
+        removed = []
+        with self._transaction() as conn:
+            for user_id in set(user_ids):
+                row = conn.execute(
+                    f"SELECT data FROM {table} WHERE user_id = ?", (user_id,)
+                ).fetchone()
+                if row is not None:
+                    conn.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+                    removed.append(json.loads(row[0]))
+        return removed
+
+    def put_many(self, collection: str, entries: List[Dict[str, Any]]) -> int:
+        table = self._check(collection)
+        latest = {e["user_id"]: e for e in entries}
+        with self._transaction() as conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO {table} (user_id, data) VALUES (?, ?)",
+                [(user_id, json.dumps(e, ensure_ascii=False)) for user_id, e in latest.items()],
+            )
+        return len(latest)
+
+    def replace_many(
+        self, collection: str, pairs: List[Tuple[Optional[Dict[str, Any]], Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
+        table = self._check(collection)
+        replaced = []
+        # BEGIN IMMEDIATE: между чтением и записью другой процесс ничего не изменит
+        with self._transaction() as conn:
+            for expected, entry in pairs:
+                row = conn.execute(
+                    f"SELECT data FROM {table} WHERE user_id = ?", (entry["user_id"],)
+                ).fetchone()
+                if (json.loads(row[0]) if row else None) != expected:
+                    continue
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {table} (user_id, data) VALUES (?, ?)",
+                    (entry["user_id"], json.dumps(entry, ensure_ascii=False)),
+                )
+                replaced.append(entry)
+        return replaced
+
+    def page(
+        self,
+        collection: str,
+        after: Optional[int] = None,
+        before: Optional[int] = None,
+        limit: int = 20,
+    ) -> List[Dict[str, Any]]:
+        table = self._check(collection)
+        conn = self._connection()
+        if before is not None:
+            rows = conn.execute(
+                f"SELECT data FROM {table} WHERE user_id < ? ORDER BY user_id DESC LIMIT ?",
+                (before, limit),
+            ).fetchall()
+            rows.reverse()
+        else:
+            rows = conn.execute(
+                f"SELECT data FROM {table} WHERE user_id > ? ORDER BY user_id LIMIT ?",
+                (after if after is not None else -(2 ** 63), limit),
+            ).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def search(self, collection: str, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        query = query.lstrip("@").lower()
+        pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        rows = self._connection().execute(
+            f"SELECT data FROM {self._check(collection)} "
+            "WHERE user_id = ? OR lower(json_extract(data, '$.username')) LIKE ? ESCAPE '\\' "
+            "ORDER BY user_id LIMIT ?",
+            (int(query) if query.isdigit() and len(query) < 19 else None, pattern, limit),
+        )
+        return [json.loads(data) for (data,) in rows]
+
+    def count(self, collection: str) -> int:
+        (size,) = self._connection().execute(
+            "SELECT size FROM collection_sizes WHERE collection = ?",
+            (self._check(collection),),
+        ).fetchone()
+        return size
+
+
+def import_json_files(storage: StorageBackend, files: Dict[str, str]) -> None:
+    """
+    Однократно переносит записи из JSON-файлов в хранилище вместе
+    с их журналами. Уже существующие записи не перезаписываются.
+    """
+    from handlers.storage import JsonUserFile
+
+    for collection, path in files.items():
+        if not path or not os.path.exists(path):
+            logger.warning(f"Skipping import of {collection}: file {path} not found")
+            continue
+        entries = JsonUserFile(path, collection).load()
+        added = storage.add_many(collection, entries)
+        logger.info(f"Imported {added}/{len(entries)} {collection} from {path}")
+
+
+if __name__ == "__main__":
+    from config import (
+        STORAGE_DB_FILE,
+        APPROVAL_REQUESTS_FILE,
+        APPROVED_USERS_FILE,
+        ADMIN_IDS_FILE,
+        PLACEMENTS_FILE,
+        SUBSCRIPTIONS_FILE,
+        PENDING_CLIENTS_FILE,
+    )
+
+    import_json_files(
+        SqliteStorage(STORAGE_DB_FILE),
+        {
+            APPROVAL_REQUESTS: APPROVAL_REQUESTS_FILE,
+            APPROVED_USERS: APPROVED_USERS_FILE,
+            ADMINS: ADMIN_IDS_FILE,
+            PLACEMENTS: PLACEMENTS_FILE,
+            SUBSCRIPTIONS: SUBSCRIPTIONS_FILE,
+            PENDING_CLIENTS: PENDING_CLIENTS_FILE,
+        },
+    )
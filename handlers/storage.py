@@ -1,8 +1,39 @@
 import json
 import os
+import threading
+from bisect import bisect_left, bisect_right, insort
+from contextlib import contextmanager
 from logger import api_logger as logger
-from typing import List, Dict, Any
-from config import APPROVAL_REQUESTS_FILE, APPROVED_USERS_FILE, ADMIN_IDS_FILE
+from typing import List, Dict, Any, Optional, Tuple
+from config import (
+    APPROVAL_REQUESTS_FILE,
+    APPROVED_USERS_FILE,
+    ADMIN_IDS_FILE,
+    PLACEMENTS_FILE,
+    SUBSCRIPTIONS_FILE,
+    PENDING_CLIENTS_FILE,
+    STORAGE_BACKEND,
+    STORAGE_DB_FILE,
+    REDIS_URL,
+    REDIS_PREFIX,
+    STORAGE_JOURNAL_COMPACT,
+    ADMIN_PAGE_SIZE,
+)
+from metrics import STORAGE_OPERATION_SECONDS, timer
+from handlers.storage_backend import (
+    StorageBackend,
+    APPROVAL_REQUESTS,
+    APPROVED_USERS,
+    ADMINS,
+    PLACEMENTS,
+    SUBSCRIPTIONS,
+    PENDING_CLIENTS,
+)
+
+try:
+    import fcntl
+except ImportError:  # без fcntl (Windows) файлы защищены только от потоков своего процесса
+    fcntl = None
 
 
 def _validate_path(path: str, description: str) -> bool:
@@ -22,123 +53,596 @@ def _ensure_dir(path: str) -> None:
             logger.error(f"Failed to create directory {dir_path}: {e}")
 
 
-def load_approval_requests() -> List[Dict[str, Any]]:
-    """
-    Читает ожидающие подтверждения заявки из файла как список словарей.
-    При отсутствии файла создаёт файл со списком [] и возвращает пустой список.
-    При ошибке парсинга возвращает пустой список.
-    """
-    if not _validate_path(APPROVAL_REQUESTS_FILE, "Approval requests file"):
-        return []
-
-    if not os.path.exists(APPROVAL_REQUESTS_FILE):
-        _ensure_dir(APPROVAL_REQUESTS_FILE)
-        try:
-            with open(APPROVAL_REQUESTS_FILE, "w", encoding="utf-8") as f:
-                json.dump([], f, ensure_ascii=False, indent=4)
-            logger.warning(
-                f"{APPROVAL_REQUESTS_FILE} not found, created new file with empty list"
-            )
-        except OSError as e:
-            logger.error(f"Failed to create {APPROVAL_REQUESTS_FILE}: {e}")
-        return []
-
+def _signature(path: str):
     try:
-        with open(APPROVAL_REQUESTS_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            if isinstance(data, list):
-                return data
-            logger.error(f"Expected list in {APPROVAL_REQUESTS_FILE}, got {type(data)}")
-    except json.JSONDecodeError:
-        logger.error(f"Не удалось разобрать JSON в {APPROVAL_REQUESTS_FILE}")
-    except OSError as e:
-        logger.error(f"Error reading {APPROVAL_REQUESTS_FILE}: {e}")
-    return []
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
 
 
-def save_approval_requests(requests: List[Dict[str, Any]]) -> None:
-    if not _validate_path(APPROVAL_REQUESTS_FILE, "Approval requests file"):
+def _fsync_dir(path: str) -> None:
+    """Сбрасывает на диск запись каталога, чтобы rename пережил сбой питания."""
+    try:
+        fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    except OSError:
         return
-    _ensure_dir(APPROVAL_REQUESTS_FILE)
     try:
-        with open(APPROVAL_REQUESTS_FILE, "w", encoding="utf-8") as f:
-            json.dump(requests, f, ensure_ascii=False, indent=4)
-    except OSError as e:
-        logger.error(f"Failed to save requests to {APPROVAL_REQUESTS_FILE}: {e}")
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
 
 
-def load_approved_users() -> List[Dict[str, Any]]:
+def _atomic_write_json(path: str, data) -> None:
+    """Пишет JSON во временный файл и подменяет им path: файл либо старый, либо новый целиком."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _fsync_dir(path)
+
+
+class JsonUserFile:
     """
-    Читает список одобренных пользователей из файла как список словарей.
-    При отсутствии файла создаёт файл с [] и возвращает пустой список.
-    При ошибке парсинга возвращает пустой список.
+    JSON-файл со списком записей пользователей и журнал изменений рядом
+    с ним (path + ".journal", по событию add/remove в строке).
+
+    Добавление и удаление дописывают строку в журнал, а после
+    STORAGE_JOURNAL_COMPACT событий записи сжимаются обратно в JSON-файл
+    атомарной подменой. Состояние — файл плюс журнал поверх него; события
+    журнала идемпотентны, поэтому сбой между подменой файла и очисткой
+    журнала ничего не теряет. Записи закэшированы в памяти с индексом по
+    user_id и отсортированным списком user_id для постраничного чтения
+    и перечитываются, если файл или журнал изменились извне.
+
+    С одними файлами могут работать несколько процессов (экземпляры
+    вебхука на одном хосте), поэтому перечитывание, изменения и сжатие
+    идут под flock на файле path + ".lock".
     """
-    if not _validate_path(APPROVED_USERS_FILE, "Approved users file"):
-        return []
 
-    if not os.path.exists(APPROVED_USERS_FILE):
-        _ensure_dir(APPROVED_USERS_FILE)
+    def __init__(self, path: str, description: str):
+        self.path = path
+        self.journal_path = f"{path}.journal" if path else None
+        self.lock_path = f"{path}.lock" if path else None
+        self.description = description
+        self._lock = threading.RLock()
+        self._lock_fd: Optional[int] = None
+        self._lock_depth = 0
+        self._signature = None
+        self._index: Dict[int, Dict[str, Any]] = {}
+        self._ids: List[int] = []
+        self._journal_events = 0
+
+    def _stat(self):
+        return _signature(self.path), _signature(self.journal_path)
+
+    @contextmanager
+    def _locked(self):
+        """
+        Исключает и потоки этого процесса, и другие процессы. flock берётся
+        только на внешнем уровне: вложенный вызов на том же дескрипторе
+        снял бы его досрочно.
+        """
+        with self._lock:
+            if self._lock_depth == 0 and fcntl is not None:
+                if self._lock_fd is None:
+                    _ensure_dir(self.path)
+                    self._lock_fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0 and fcntl is not None:
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _set_entries(self, entries: List[Dict[str, Any]]) -> None:
+        index = {}
+        for entry in entries:
+            index.setdefault(entry["user_id"], entry)
+        self._index = index
+        self._ids = sorted(index)
+
+    def _read(self) -> List[Dict[str, Any]]:
+        """
+        Читает записи из файла как список словарей.
+        При отсутствии файла создаёт файл со списком [] и возвращает пустой список.
+        При ошибке парсинга возвращает пустой список.
+        """
+        if not os.path.exists(self.path):
+            _ensure_dir(self.path)
+            try:
+                _atomic_write_json(self.path, [])
+                logger.warning(
+                    f"{self.path} not found, created new file with empty list"
+                )
+            except OSError as e:
+                logger.error(f"Failed to create {self.path}: {e}")
+            return []
+
         try:
-            with open(APPROVED_USERS_FILE, "w", encoding="utf-8") as f:
-                json.dump([], f, ensure_ascii=False, indent=4)
-            logger.warning(
-                f"{APPROVED_USERS_FILE} not found, created new file with empty list"
-            )
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+                if isinstance(data, list):
+                    return data
+                logger.error(f"Expected list in {self.path}, got {type(data)}")
+        except json.JSONDecodeError:
+            logger.error(f"Не удалось разобрать JSON в {self.path}")
         except OSError as e:
-            logger.error(f"Failed to create {APPROVED_USERS_FILE}: {e}")
+            logger.error(f"Error reading {self.path}: {e}")
         return []
 
-    try:
-        with open(APPROVED_USERS_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            if isinstance(data, list):
-                return data
-            logger.error(f"Expected list in {APPROVED_USERS_FILE}, got {type(data)}")
-    except json.JSONDecodeError:
-        logger.error(f"Не удалось разобрать JSON в {APPROVED_USERS_FILE}")
-    except OSError as e:
-        logger.error(f"Error reading {APPROVED_USERS_FILE}: {e}")
-    return []
+    def _apply(self, event: Dict[str, Any]) -> None:
+        if event["op"] == "add":
+            entry = event["entry"]
+            if entry["user_id"] not in self._index:
+                insort(self._ids, entry["user_id"])
+            self._index[entry["user_id"]] = entry
+        elif self._index.pop(event["user_id"], None) is not None:
+            del self._ids[bisect_left(self._ids, event["user_id"])]
+
+    def _replay(self) -> int:
+        """
+        Применяет журнал к записям из файла и возвращает число событий.
+        Недописанный при сбое хвост журнала отрезается.
+        """
+        events = 0
+        offset = 0
+        try:
+            with open(self.journal_path, "rb") as f:
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("incomplete line")
+                        self._apply(json.loads(line))
+                    except (ValueError, KeyError, TypeError):
+                        logger.warning(f"Truncating damaged tail of {self.journal_path} at byte {offset}")
+                        f.close()
+                        os.truncate(self.journal_path, offset)
+                        break
+                    offset += len(line)
+                    events += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Error reading {self.journal_path}: {e}")
+        return events
+
+    def _refresh(self) -> bool:
+        if not _validate_path(self.path, self.description):
+            return False
+        with self._lock:
+            signature = self._stat()
+            if signature[0] is not None and signature == self._signature:
+                return True
+        # Файл и журнал читаются под flock: иначе сжатие в другом процессе
+        # между чтением файла и журнала потеряло бы события
+        with self._locked():
+            signature = self._stat()
+            if signature[0] is None or signature != self._signature:
+                self._set_entries(self._read())
+                self._journal_events = self._replay()
+                self._signature = self._stat()
+        return True
+
+    def _write_snapshot(self, entries: List[Dict[str, Any]]) -> bool:
+        """Атомарно пишет записи в файл и очищает журнал, уже вошедший в него."""
+        try:
+            _atomic_write_json(self.path, entries)
+            with open(self.journal_path, "w", encoding="utf-8") as f:
+                os.fsync(f.fileno())
+        except OSError as e:
+            logger.error(f"Failed to save {self.path}: {e}")
+            return False
+        self._journal_events = 0
+        return True
+
+    def _append(self, events: List[Dict[str, Any]]) -> bool:
+        """Дописывает события в журнал и применяет их к записям в памяти."""
+        lines = "".join(json.dumps(event, ensure_ascii=False) + "\n" for event in events)
+        try:
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            logger.error(f"Failed to append to {self.journal_path}: {e}")
+            return False
+        for event in events:
+            self._apply(event)
+        self._journal_events += len(events)
+        if self._journal_events >= STORAGE_JOURNAL_COMPACT:
+            self._write_snapshot(list(self._index.values()))
+        self._signature = self._stat()
+        return True
+
+    def load(self) -> List[Dict[str, Any]]:
+        if not self._refresh():
+            return []
+        return list(self._index.values())
+
+    def save(self, entries: List[Dict[str, Any]]) -> None:
+        if not _validate_path(self.path, self.description):
+            return
+        _ensure_dir(self.path)
+        with self._locked():
+            if self._write_snapshot(entries):
+                self._set_entries(list(entries))
+                self._signature = self._stat()
+
+    def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        if not self._refresh():
+            return None
+        return self._index.get(user_id)
+
+    def add_many(self, entries: List[Dict[str, Any]]) -> int:
+        with self._locked():
+            if not self._refresh():
+                return 0
+            seen = set(self._index)
+            events = []
+            for entry in entries:
+                if entry["user_id"] not in seen:
+                    seen.add(entry["user_id"])
+                    events.append({"op": "add", "entry": entry})
+            if events and not self._append(events):
+                return 0
+            return len(events)
+
+    def remove_many(self, user_ids: List[int]) -> List[Dict[str, Any]]:
+        with self._locked():
+            if not self._refresh():
+                return []
+            removed = [self._index[uid] for uid in set(user_ids) if uid in self._index]
+            events = [{"op": "remove", "user_id": entry["user_id"]} for entry in removed]
+            if events and not self._append(events):
+                return []
+            return removed
+
+    def put_many(self, entries: List[Dict[str, Any]]) -> int:
+        with self._locked():
+            if not self._refresh():
+                return 0
+            # Событие add заменяет запись с тем же user_id
+            latest = {entry["user_id"]: entry for entry in entries}
+            events = [{"op": "add", "entry": entry} for entry in latest.values()]
+            if events and not self._append(events):
+                return 0
+            return len(events)
+
+    def replace_many(
+        self, pairs: List[Tuple[Optional[Dict[str, Any]], Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
+        with self._locked():
+            if not self._refresh():
+                return []
+            replaced = [new for expected, new in pairs if self._index.get(new["user_id"]) == expected]
+            events = [{"op": "add", "entry": entry} for entry in replaced]
+            if events and not self._append(events):
+                return []
+            return replaced
+
+    def page(self, after: Optional[int], before: Optional[int], limit: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            if not self._refresh():
+                return []
+            if before is not None:
+                end = bisect_left(self._ids, before)
+                ids = self._ids[max(0, end - limit):end]
+            else:
+                start = bisect_right(self._ids, after) if after is not None else 0
+                ids = self._ids[start:start + limit]
+            return [self._index[uid] for uid in ids]
+
+    def search(self, query: str, limit: int) -> List[Dict[str, Any]]:
+        query = query.lstrip("@").lower()
+        with self._lock:
+            if not self._refresh():
+                return []
+            found = []
+            for uid in self._ids:
+                entry = self._index[uid]
+                if str(uid) == query or query in str(entry.get("username") or "").lower():
+                    found.append(entry)
+                    if len(found) >= limit:
+                        break
+            return found
+
+    def count(self) -> int:
+        if not self._refresh():
+            return 0
+        return len(self._index)
+
+    def add(self, entry: Dict[str, Any]) -> bool:
+        return self.add_many([entry]) == 1
+
+    def remove(self, user_id: int) -> Optional[Dict[str, Any]]:
+        removed = self.remove_many([user_id])
+        return removed[0] if removed else None
+
+
+class JsonStorage(StorageBackend):
+    """Хранилище на JSON-файлах: по одному файлу на коллекцию."""
+
+    def __init__(self):
+        self._files = {
+            APPROVAL_REQUESTS: JsonUserFile(
+                APPROVAL_REQUESTS_FILE, "Approval requests file"
+            ),
+            APPROVED_USERS: JsonUserFile(APPROVED_USERS_FILE, "Approved users file"),
+            ADMINS: JsonUserFile(ADMIN_IDS_FILE, "Admins file"),
+            PLACEMENTS: JsonUserFile(PLACEMENTS_FILE, "Placements file"),
+            SUBSCRIPTIONS: JsonUserFile(SUBSCRIPTIONS_FILE, "Subscriptions file"),
+            PENDING_CLIENTS: JsonUserFile(PENDING_CLIENTS_FILE, "Pending clients file"),
+        }
+
+    def load(self, collection: str) -> List[Dict[str, Any]]:
+        return self._files[collection].load()
+
+    def save(self, collection: str, entries: List[Dict[str, Any]]) -> None:
+        self._files[collection].save(entries)
+
+    def get(self, collection: str, user_id: int) -> Optional[Dict[str, Any]]:
+        return self._files[collection].get(user_id)
+
+    def add(self, collection: str, entry: Dict[str, Any]) -> bool:
+        return self._files[collection].add(entry)
+
+    def remove(self, collection: str, user_id: int) -> Optional[Dict[str, Any]]:
+        return self._files[collection].remove(user_id)
+
+    def add_many(self, collection: str, entries: List[Dict[str, Any]]) -> int:
+        return self._files[collection].add_many(entries)
+
+    def remove_many(self, collection: str, user_ids: List[int]) -> List[Dict[str, Any]]:
+        return self._files[collection].remove_many(user_ids)
+
+    def put_many(self, collection: str, entries: List[Dict[str, Any]]) -> int:
+        return self._files[collection].put_many(entries)
+
+    def replace_many(
+        self, collection: str, pairs: List[Tuple[Optional[Dict[str, Any]], Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
+        return self._files[collection].replace_many(pairs)
+
+    def page(
+        self,
+        collection: str,
+        after: Optional[int] = None,
+        before: Optional[int] = None,
+        limit: int = 20,
+    ) -> List[Dict[str, Any]]:
+        return self._files[collection].page(after, before, limit)
+
+    def search(self, collection: str, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        return self._files[collection].search(query, limit)
+
+    def count(self, collection: str) -> int:
+        return self._files[collection].count()
+
+
+class TimedStorage(StorageBackend):
+    """Обёртка над хранилищем, замеряющая длительность каждой операции."""
+
+    def __init__(self, backend: StorageBackend):
+        self._backend = backend
+
+    def load(self, collection: str) -> List[Dict[str, Any]]:
+        with timer(STORAGE_OPERATION_SECONDS, "load", collection):
+            return self._backend.load(collection)
+
+    def save(self, collection: str, entries: List[Dict[str, Any]]) -> None:
+        with timer(STORAGE_OPERATION_SECONDS, "save", collection):
+            self._backend.save(collection, entries)
+
+    def get(self, collection: str, user_id: int) -> Optional[Dict[str, Any]]:
+        with timer(STORAGE_OPERATION_SECONDS, "get", collection):
+            return self._backend.get(collection, user_id)
+
+    def add(self, collection: str, entry: Dict[str, Any]) -> bool:
+        with timer(STORAGE_OPERATION_SECONDS, "add", collection):
+            return self._backend.add(collection, entry)
+
+    def remove(self, collection: str, user_id: int) -> Optional[Dict[str, Any]]:
+        with timer(STORAGE_OPERATION_SECONDS, "remove", collection):
+            return self._backend.remove(collection, user_id)
+
+    def add_many(self, collection: str, entries: List[Dict[str, Any]]) -> int:
+        with timer(STORAGE_OPERATION_SECONDS, "add_many", collection):
+            return self._backend.add_many(collection, entries)
+
+    def remove_many(self, collection: str, user_ids: List[int]) -> List[Dict[str, Any]]:
+        with timer(STORAGE_OPERATION_SECONDS, "remove_many", collection):
+            return self._backend.remove_many(collection, user_ids)
+
+    def put_many(self, collection: str, entries: List[Dict[str, Any]]) -> int:
+        with timer(STORAGE_OPERATION_SECONDS, "put_many", collection):
+            return self._backend.put_many(collection, entries)
+
+    def replace_many(
+        self, collection: str, pairs: List[Tuple[Optional[Dict[str, Any]], Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
+        with timer(STORAGE_OPERATION_SECONDS, "replace_many", collection):
+            return self._backend.replace_many(collection, pairs)
+
+    def page(
+        self,
+        collection: str,
+        after: Optional[int] = None,
+        before: Optional[int] = None,
+        limit: int = 20,
+    ) -> List[Dict[str, Any]]:
+        with timer(STORAGE_OPERATION_SECONDS, "page", collection):
+            return self._backend.page(collection, after, before, limit)
+
+    def search(self, collection: str, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        with timer(STORAGE_OPERATION_SECONDS, "search", collection):
+            return self._backend.search(collection, query, limit)
+
+    def count(self, collection: str) -> int:
+        with timer(STORAGE_OPERATION_SECONDS, "count", collection):
+            return self._backend.count(collection)
+
+
+def _create_backend() -> StorageBackend:
+    if STORAGE_BACKEND == "json":
+        return JsonStorage()
+    if STORAGE_BACKEND == "sqlite":
+        from handlers.sqlite_storage import SqliteStorage
+
+        return SqliteStorage(STORAGE_DB_FILE)
+    if STORAGE_BACKEND == "redis":
+        from handlers.redis_storage import RedisStorage, connect
+
+        return RedisStorage(connect(REDIS_URL), REDIS_PREFIX)
+    raise ValueError(f"Unknown storage backend: {STORAGE_BACKEND}")
+
+
+_backend = TimedStorage(_create_backend())
+
+
+def load_approval_requests() -> List[Dict[str, Any]]:
+    """Возвращает ожидающие подтверждения заявки как список словарей."""
+    return _backend.load(APPROVAL_REQUESTS)
+
+
+def save_approval_requests(requests: List[Dict[str, Any]]) -> None:
+    _backend.save(APPROVAL_REQUESTS, requests)
+
+
+def get_approval_request(user_id: int) -> Optional[Dict[str, Any]]:
+    """Возвращает заявку пользователя или None, если её нет."""
+    return _backend.get(APPROVAL_REQUESTS, user_id)
+
+
+def add_approval_request(user_id: int, username: str) -> bool:
+    """Сохраняет новую заявку. Возвращает False, если заявка уже ожидает."""
+    return _backend.add(APPROVAL_REQUESTS, {"user_id": user_id, "username": username})
+
+
+def add_approval_requests(entries: List[Dict[str, Any]]) -> int:
+    """Возвращает заявки в ожидание одним обновлением хранилища."""
+    return _backend.add_many(APPROVAL_REQUESTS, entries)
+
+
+def remove_approval_request(user_id: int) -> Optional[Dict[str, Any]]:
+    """Удаляет заявку и возвращает её, либо None, если она уже обработана."""
+    return _backend.remove(APPROVAL_REQUESTS, user_id)
+
+
+def remove_approval_requests(user_ids: List[int]) -> List[Dict[str, Any]]:
+    """Удаляет заявки одним обновлением хранилища и возвращает удалённые."""
+    return _backend.remove_many(APPROVAL_REQUESTS, user_ids)
+
+
+def page_users(
+    collection: str,
+    after: Optional[int] = None,
+    before: Optional[int] = None,
+    limit: int = ADMIN_PAGE_SIZE,
+) -> List[Dict[str, Any]]:
+    """Страница заявок или одобренных пользователей по возрастанию user_id."""
+    return _backend.page(collection, after, before, limit)
+
+
+def search_users(collection: str, query: str, limit: int = ADMIN_PAGE_SIZE) -> List[Dict[str, Any]]:
+    """Ищет записи по ID или части username."""
+    return _backend.search(collection, query, limit)
+
+
+def count_users(collection: str) -> int:
+    return _backend.count(collection)
+
+
+def load_approved_users() -> List[Dict[str, Any]]:
+    """Возвращает список одобренных пользователей как список словарей."""
+    return _backend.load(APPROVED_USERS)
 
 
 def save_approved_users(users: List[Dict[str, Any]]) -> None:
-    if not _validate_path(APPROVED_USERS_FILE, "Approved users file"):
-        return
-    _ensure_dir(APPROVED_USERS_FILE)
-    try:
-        with open(APPROVED_USERS_FILE, "w", encoding="utf-8") as f:
-            json.dump(users, f, ensure_ascii=False, indent=4)
-    except OSError as e:
-        logger.error(f"Failed to save approved users to {APPROVED_USERS_FILE}: {e}")
+    _backend.save(APPROVED_USERS, users)
+
+
+def get_approved_user(user_id: int) -> Optional[Dict[str, Any]]:
+    """Возвращает запись одобренного пользователя или None."""
+    return _backend.get(APPROVED_USERS, user_id)
+
+
+def add_approved_user(entry: Dict[str, Any]) -> bool:
+    """Добавляет пользователя в одобренные. Возвращает False, если он уже там."""
+    return _backend.add(APPROVED_USERS, entry)
+
+
+def add_approved_users(entries: List[Dict[str, Any]]) -> int:
+    """Добавляет пользователей в одобренные одним обновлением хранилища."""
+    return _backend.add_many(APPROVED_USERS, entries)
+
+
+def remove_approved_users(user_ids: List[int]) -> List[Dict[str, Any]]:
+    """Убирает пользователей из одобренных и возвращает их записи."""
+    return _backend.remove_many(APPROVED_USERS, user_ids)
 
 
 def load_admins() -> List[Dict[str, Any]]:
+    """Возвращает список администраторов как список словарей."""
+    return _backend.load(ADMINS)
+
+
+def get_admin(user_id: int) -> Optional[Dict[str, Any]]:
+    """Возвращает запись администратора или None."""
+    return _backend.get(ADMINS, user_id)
+
+
+def get_placement(user_id: int) -> Optional[Dict[str, Any]]:
+    """Возвращает панель и inbound, в которых зарегистрирован пользователь."""
+    return _backend.get(PLACEMENTS, user_id)
+
+
+def set_placements(entries: List[Dict[str, Any]]) -> None:
+    """Запоминает, на какой панели и в каком inbound зарегистрированы пользователи."""
+    _backend.put_many(PLACEMENTS, entries)
+
+
+def load_subscriptions() -> List[Dict[str, Any]]:
+    """Возвращает все подписки как список словарей."""
+    return _backend.load(SUBSCRIPTIONS)
+
+
+def get_subscription(user_id: int) -> Optional[Dict[str, Any]]:
+    """Возвращает подписку пользователя или None, если он ни разу не платил."""
+    return _backend.get(SUBSCRIPTIONS, user_id)
+
+
+def set_subscriptions(entries: List[Dict[str, Any]]) -> None:
+    """Сохраняет подписки, заменяя прежние записи тех же пользователей."""
+    _backend.put_many(SUBSCRIPTIONS, entries)
+
+
+def replace_subscriptions(
+    pairs: List[Tuple[Optional[Dict[str, Any]], Dict[str, Any]]]
+) -> List[Dict[str, Any]]:
     """
-    Читает список администраторов из файла как список словарей
+    Заменяет подписки из пар (прочитанная, изменённая), если их с тех пор
+    никто не изменил, в том числе другой экземпляр бота. Возвращает записанные.
     """
-    if not _validate_path(ADMIN_IDS_FILE, "Approved users file"):
-        return []
+    return _backend.replace_many(SUBSCRIPTIONS, pairs)
 
-    if not os.path.exists(ADMIN_IDS_FILE):
-        _ensure_dir(ADMIN_IDS_FILE)
-        try:
-            with open(ADMIN_IDS_FILE, "w", encoding="utf-8") as f:
-                json.dump([], f, ensure_ascii=False, indent=4)
-            logger.warning(
-                f"{ADMIN_IDS_FILE} not found, created new file with empty list"
-            )
-        except OSError as e:
-            logger.error(f"Failed to create {ADMIN_IDS_FILE}: {e}")
-        return []
 
-    try:
-        with open(ADMIN_IDS_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            if isinstance(data, list):
-                return data
-            logger.error(f"Expected list in {ADMIN_IDS_FILE}, got {type(data)}")
-    except json.JSONDecodeError:
-        logger.error(f"Не удалось разобрать JSON в {ADMIN_IDS_FILE}")
-    except OSError as e:
-        logger.error(f"Error reading {ADMIN_IDS_FILE}: {e}")
-    return []
+def load_pending_clients() -> List[Dict[str, Any]]:
+    """Возвращает клиентов, отложенных до восстановления их панели."""
+    return _backend.load(PENDING_CLIENTS)
+
+
+def add_pending_clients(entries: List[Dict[str, Any]]) -> int:
+    """Откладывает регистрацию клиентов: {"user_id", "username", "panel", "inbound_id"}."""
+    return _backend.add_many(PENDING_CLIENTS, entries)
+
+
+def remove_pending_clients(user_ids: List[int]) -> List[Dict[str, Any]]:
+    """Убирает клиентов из отложенных после регистрации на панели."""
+    return _backend.remove_many(PENDING_CLIENTS, user_ids)
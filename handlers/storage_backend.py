@@ -0,0 +1,99 @@
+from typing import List, Dict, Any, Optional, Tuple
+
+APPROVAL_REQUESTS = "approval_requests"
+APPROVED_USERS = "approved_users"
+ADMINS = "admins"
+PLACEMENTS = "placements"
+SUBSCRIPTIONS = "subscriptions"
+PENDING_CLIENTS = "pending_clients"
+
+COLLECTIONS = (APPROVAL_REQUESTS, APPROVED_USERS, ADMINS, PLACEMENTS, SUBSCRIPTIONS, PENDING_CLIENTS)
+
+
+class StorageBackend:
+    """
+    Хранилище коллекций записей пользователей, ключ записи — user_id.
+    Все методы принимают имя коллекции из COLLECTIONS.
+    """
+
+    def load(self, collection: str) -> List[Dict[str, Any]]:
+        """Возвращает все записи коллекции."""
+        raise NotImplementedError
+
+    def save(self, collection: str, entries: List[Dict[str, Any]]) -> None:
+        """Полностью заменяет содержимое коллекции."""
+        raise NotImplementedError
+
+    def get(self, collection: str, user_id: int) -> Optional[Dict[str, Any]]:
+        """Возвращает запись по user_id или None."""
+        raise NotImplementedError
+
+    def add(self, collection: str, entry: Dict[str, Any]) -> bool:
+        """Добавляет запись. Возвращает False, если запись с таким user_id уже есть."""
+        raise NotImplementedError
+
+    def remove(self, collection: str, user_id: int) -> Optional[Dict[str, Any]]:
+        """Удаляет запись и возвращает её, либо None, если записи не было."""
+        raise NotImplementedError
+
+    def add_many(self, collection: str, entries: List[Dict[str, Any]]) -> int:
+        """Добавляет записи одной записью в хранилище. Возвращает число добавленных."""
+        raise NotImplementedError
+
+    def remove_many(self, collection: str, user_ids: List[int]) -> List[Dict[str, Any]]:
+        """Удаляет записи одной записью в хранилище и возвращает удалённые."""
+        raise NotImplementedError
+
+    def put_many(self, collection: str, entries: List[Dict[str, Any]]) -> int:
+        """
+        Добавляет записи, заменяя прежние с теми же user_id, одной записью
+        в хранилище: читатель видит либо старые записи, либо новые.
+        Из записей с одинаковым user_id остаётся последняя. Возвращает число записанных.
+        """
+        raise NotImplementedError
+
+    def replace_many(
+        self, collection: str, pairs: List[Tuple[Optional[Dict[str, Any]], Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Сравнение с заменой для пар (ожидаемая, новая): новая запись
+        записывается, только если в хранилище сейчас лежит ожидаемая (None —
+        записи нет). Проверка и запись атомарны и для других экземпляров бота.
+        Возвращает записанные.
+        """
+        raise NotImplementedError
+
+    # Постраничный доступ: по умолчанию через load, хранилища с индексом
+    # по user_id переопределяют его, чтобы страница не зависела от размера коллекции
+
+    def page(
+        self,
+        collection: str,
+        after: Optional[int] = None,
+        before: Optional[int] = None,
+        limit: int = 20,
+    ) -> List[Dict[str, Any]]:
+        """
+        Записи по возрастанию user_id: первые limit с user_id больше after
+        либо последние limit с user_id меньше before.
+        """
+        entries = sorted(self.load(collection), key=lambda e: e["user_id"])
+        if before is not None:
+            entries = [e for e in entries if e["user_id"] < before]
+            return entries[-limit:] if limit else []
+        if after is not None:
+            entries = [e for e in entries if e["user_id"] > after]
+        return entries[:limit]
+
+    def search(self, collection: str, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """Записи с user_id, равным query, или с username, содержащим query без учёта регистра."""
+        query = query.lstrip("@").lower()
+        found = [
+            e for e in sorted(self.load(collection), key=lambda e: e["user_id"])
+            if str(e["user_id"]) == query or query in str(e.get("username") or "").lower()
+        ]
+        return found[:limit]
+
+    def count(self, collection: str) -> int:
+        """Число записей в коллекции."""
+        return len(self.load(collection))
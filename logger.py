@@ -1,26 +1,122 @@
+import atexit
+import json
 import logging
-from datetime import datetime
+import queue
+import re
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+from config import LOG_FORMAT, LOG_LEVEL, LOG_MODE
+
+# Идентификатор клиента в строке подключения — секрет, в логах остаются только схема и хост
+_CONNECTION_SECRET = re.compile(r"\b((?:vless|vmess|trojan|ss)://)[^@\s]+@")
+
+
+def redact(text: str) -> str:
+    return _CONNECTION_SECRET.sub(r"\1***@", text)
+
 
 class AlignedFormatter(logging.Formatter):
-    def format(self, record):
-        created_dt = datetime.fromtimestamp(record.created)
-        time = created_dt.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+    def __init__(self):
+        super().__init__()
+        # strftime дорогой, поэтому дата со временем до секунды кэшируется
+        self._second = None
+        self._second_text = ""
+
+    def format_time(self, record) -> str:
+        second = int(record.created)
+        if second != self._second:
+            self._second = second
+            self._second_text = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(second))
+        return f"{self._second_text}.{int(record.msecs):03d}"
 
-        level_raw = f"[{record.levelname.lower()}]"
-        level = f"{level_raw:<8}"
+    def format_message(self, record) -> str:
+        msg = redact(record.getMessage())
+        prefix = getattr(record, "prefix", None)
+        return f"[{prefix}] {msg}" if prefix else msg
 
+    def format(self, record):
+        level = f"[{record.levelname.lower()}]"
         location = f"{record.filename}:{record.lineno:<4}"
-        location = f"{location:<18}"
+        text = f"[{self.format_time(record)}]   {level:<8}{location:<18}  {self.format_message(record)}".rstrip()
+        if record.exc_info:
+            text += "\n" + self.formatException(record.exc_info)
+        return text
+
+
+class JsonFormatter(AlignedFormatter):
+    """Одна запись — один JSON-объект в строке."""
+
+    def format(self, record):
+        data = {
+            "time": self.format_time(record),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "location": f"{record.filename}:{record.lineno}",
+            "message": redact(record.getMessage()),
+        }
+        prefix = getattr(record, "prefix", None)
+        if prefix:
+            data["prefix"] = prefix
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
 
-        msg = record.getMessage()
-        return f"[{time}]   {level}{location}  {msg}".rstrip()
 
 class PrefixAdapter(logging.LoggerAdapter):
+    """
+    Передаёт префикс атрибутом записи, а не склейкой строк: сообщение
+    собирает форматтер и только для записей, которые действительно пишутся.
+    """
+
     def process(self, msg, kwargs):
-        return f"[{self.extra['prefix']}] {msg}", kwargs
+        kwargs["extra"] = {**self.extra, **kwargs.get("extra", {})}
+        return msg, kwargs
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    Кладёт запись в очередь как есть: в отличие от QueueHandler, сообщение
+    не форматируется в вызывающем потоке, это делает поток QueueListener.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+_listener: Optional[QueueListener] = None
+
+
+def configure(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, mode: str = LOG_MODE, stream=None) -> None:
+    """
+    Настраивает корневой логгер. В режиме queue обработчики только кладут
+    записи в очередь, форматирование и запись в stream идут в фоновом потоке.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(JsonFormatter() if fmt == "json" else AlignedFormatter())
+    if mode == "queue":
+        records = queue.SimpleQueue()
+        _listener = QueueListener(records, handler, respect_handler_level=True)
+        _listener.start()
+        handler = LazyQueueHandler(records)
+    logging.basicConfig(level=level.upper(), handlers=[handler], force=True)
+
+
+def flush() -> None:
+    """Дописывает всё, что накопилось в очереди. Вызывается при выходе."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
 
-handler = logging.StreamHandler()
-handler.setFormatter(AlignedFormatter())
-logging.basicConfig(level=logging.INFO, handlers=[handler])
+configure()
+atexit.register(flush)
 
 api_logger = PrefixAdapter(logging.getLogger("api"), {"prefix": "API"})
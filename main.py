@@ -1,6 +1,48 @@
-from bot import bot
-import client_handlers
-import admin_handlers
+import time
+
+# Отсчёт времени старта до остальных импортов, чтобы они тоже попали в замер
+_started = time.perf_counter()
+
+from config import BOT_MODE
+from metrics import report_startup, start_metrics_server
 
 if __name__ == "__main__":
-    bot.infinity_polling()
+    if BOT_MODE == "webhook":
+        from webhook import check_webhook_config
+
+        # Проверяется до запуска фоновых задач, чтобы не стартовать наполовину
+        check_webhook_config()
+    start_metrics_server()
+    if BOT_MODE == "async":
+        import asyncio
+        import async_main
+
+        asyncio.run(async_main.main(_started))
+    else:
+        from bot import bot, sender, start_commands_sync
+        from api_client import panels, start_cache_listener, start_replay, update_clients
+        from accounts import start_account_sync
+        from handlers.approvals import revoke_rejected
+        from billing import subscription_scheduler
+        # Обработчики админки регистрируются первыми: в client_handlers
+        # есть fallback, который перехватывает любые сообщения
+        import admin_handlers
+        import client_handlers
+
+        sender.start()
+        start_commands_sync()
+        start_cache_listener()
+        start_account_sync(panels)
+        # Клиенты, отложенные до перезапуска, пока панель была недоступна;
+        # одобрение тех, кого панель потом отклонит, отзывается
+        start_replay(lambda user_ids: revoke_rejected(sender, user_ids))
+        subscription_scheduler.start(update_clients, sender)
+        if BOT_MODE == "webhook":
+            from webhook import run_webhook
+
+            report_startup(_started)
+            run_webhook(bot)
+        else:
+            bot.remove_webhook()
+            report_startup(_started)
+            bot.infinity_polling()
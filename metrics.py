@@ -0,0 +1,122 @@
+import functools
+import inspect
+import time
+from contextlib import contextmanager
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+from logger import api_logger as logger
+from config import METRICS_PORT
+
+PANEL_REQUEST_SECONDS = Histogram(
+    "panel_request_seconds", "Длительность запросов к панели 3x-ui", ["endpoint"]
+)
+STORAGE_OPERATION_SECONDS = Histogram(
+    "storage_operation_seconds",
+    "Длительность операций с хранилищем",
+    ["operation", "collection"],
+)
+QR_RENDER_SECONDS = Histogram("qr_render_seconds", "Длительность рендера QR-кода")
+HANDLER_SECONDS = Histogram(
+    "handler_seconds", "Полное время обработки апдейта", ["handler"]
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Обращения к кэшам", ["cache", "result"]
+)
+TELEGRAM_SEND_FAILURES = Counter(
+    "telegram_send_failures_total", "Неудачные отправки в Telegram", ["reason"]
+)
+ACCOUNT_SYNC_SECONDS = Histogram(
+    "account_sync_seconds", "Длительность прохода синхронизации аккаунтов"
+)
+ACCOUNT_SYNC_FAILURES = Counter(
+    "account_sync_failures_total", "Неудачные синхронизации аккаунтов", ["panel"]
+)
+SUBSCRIPTION_EVENTS = Counter(
+    "subscription_events_total", "Обработанные события подписок", ["kind"]
+)
+SUBSCRIPTION_QUEUE_SIZE = Gauge(
+    "subscription_queue_size", "Запланированные события подписок"
+)
+PANEL_CIRCUIT_STATE = Gauge(
+    "panel_circuit_state", "Размыкатель панели: 0 — замкнут, 1 — пробный запрос, 2 — разомкнут", ["panel"]
+)
+PANEL_CIRCUIT_REJECTED = Counter(
+    "panel_circuit_rejected_total", "Запросы, отклонённые разомкнутым размыкателем панели", ["panel"]
+)
+PANEL_REPLAYED_CLIENTS = Counter(
+    "panel_replayed_clients_total", "Отложенные регистрации клиентов, повторённые на панели", ["result"]
+)
+RATE_LIMITED = Counter(
+    "rate_limited_total", "Запросы, отклонённые лимитом или сбросом нагрузки", ["action", "reason"]
+)
+PANEL_LATENCY_EWMA = Gauge(
+    "panel_latency_ewma_seconds", "Скользящее среднее задержки запросов к панели"
+)
+DUPLICATE_CALLBACKS = Counter(
+    "duplicate_callbacks_total", "Колбэки, отклонённые из-за уже идущей обработки", ["action"]
+)
+STARTUP_SECONDS = Gauge(
+    "bot_startup_seconds", "Время от запуска процесса до начала приёма апдейтов"
+)
+ACCOUNT_SYNC_INTERVAL_SECONDS = Gauge(
+    "account_sync_interval_seconds", "Интервал синхронизации аккаунтов"
+)
+ACCOUNT_SNAPSHOT_AGE = Gauge(
+    "account_snapshot_age_seconds", "Возраст самого старого снимка аккаунтов"
+)
+
+
+@contextmanager
+def timer(histogram: Histogram, *labels):
+    """Замеряет время блока with и записывает его в гистограмму."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metric = histogram.labels(*labels) if labels else histogram
+        metric.observe(time.perf_counter() - start)
+
+
+def timed(histogram: Histogram, *labels):
+    """Декоратор для timer, поддерживает и обычные функции, и корутины."""
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with timer(histogram, *labels):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(histogram, *labels):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def timed_handler(func):
+    """Замеряет полное время обработчика апдейта, метка — имя обработчика."""
+    return timed(HANDLER_SECONDS, func.__name__)(func)
+
+
+def count_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def report_startup(started: float) -> None:
+    """Пишет в лог и в метрику, сколько прошло с started (time.perf_counter) до готовности бота."""
+    seconds = time.perf_counter() - started
+    STARTUP_SECONDS.set(seconds)
+    logger.info(f"Bot is ready in {seconds * 1000:.0f} ms")
+
+
+def start_metrics_server() -> None:
+    """Отдаёт /metrics по HTTP, если задан METRICS_PORT."""
+    if METRICS_PORT:
+        start_http_server(METRICS_PORT)
+        logger.info(f"Metrics are exposed on port {METRICS_PORT}")
@@ -0,0 +1,60 @@
+import heapq
+from typing import List, NamedTuple, Tuple
+
+# Клиентов создаём с flow xtls-rprx-vision и отдаём им VLESS-ссылки,
+# поэтому размещать их можно только в VLESS inbound'ах
+PLACEABLE_PROTOCOLS = ("vless",)
+
+
+class Candidate(NamedTuple):
+    """Inbound, в который можно добавить новых клиентов, и его текущая нагрузка."""
+
+    panel: object
+    inbound_id: int
+    clients: int
+    traffic: int
+
+
+def inbound_candidates(panel, snapshot) -> List[Candidate]:
+    """Возвращает включённые VLESS inbound'ы панели, разрешённые её конфигом."""
+    return [
+        Candidate(
+            panel,
+            inbound["id"],
+            snapshot.client_counts.get(inbound["id"], 0),
+            (inbound.get("up") or 0) + (inbound.get("down") or 0),
+        )
+        for inbound in snapshot.inbounds
+        if inbound.get("enable", True)
+        and inbound.get("protocol") in PLACEABLE_PROTOCOLS
+        and panel.accepts(inbound["id"])
+    ]
+
+
+def _load(candidate: Candidate, extra: int, strategy: str) -> tuple:
+    """Оценка нагрузки inbound'а после добавления ещё extra клиентов."""
+    clients = candidate.clients + extra
+    if strategy == "traffic":
+        per_client = candidate.traffic / max(candidate.clients, 1)
+        return candidate.traffic + extra * per_client, clients
+    return clients, candidate.traffic
+
+
+def assign(
+    batch: List[Tuple[int, str]], candidates: List[Candidate], strategy: str
+) -> List[Tuple[Candidate, List[Tuple[int, str]]]]:
+    """
+    Распределяет клиентов по наименее нагруженным inbound'ам: по числу
+    клиентов (strategy="clients") или по трафику (strategy="traffic").
+    Возвращает пары (inbound, назначенные ему клиенты).
+    """
+    if not candidates:
+        raise ValueError("No inbounds available for new clients")
+    heap = [(_load(c, 0, strategy), i) for i, c in enumerate(candidates)]
+    heapq.heapify(heap)
+    assigned = [[] for _ in candidates]
+    for item in batch:
+        _, i = heapq.heappop(heap)
+        assigned[i].append(item)
+        heapq.heappush(heap, (_load(candidates[i], len(assigned[i]), strategy), i))
+    return [(candidates[i], users) for i, users in enumerate(assigned) if users]
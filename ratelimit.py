@@ -0,0 +1,258 @@
+import asyncio
+import functools
+import inspect
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from logger import api_logger as logger
+from config import (
+    PANEL_SHED_COOLDOWN,
+    PANEL_SHED_LATENCY,
+    RATE_LIMIT_BURST,
+    RATE_LIMIT_DB_FILE,
+    RATE_LIMIT_RATE,
+)
+from metrics import PANEL_LATENCY_EWMA, PANEL_REQUEST_SECONDS, RATE_LIMITED, timer
+
+# Сколько вёдер помнить, прежде чем выбросить уже полные
+_PRUNE_SIZE = 10000
+# Вес нового замера в скользящем среднем задержки панели
+_EWMA_ALPHA = 0.2
+
+ALLOW = "allow"
+# Первый отказ после разрешённого запроса — пользователю отвечают, что он спешит
+LIMITED = "limited"
+# Повторные отказы — ответ без сообщения в чат, чтобы спам не порождал встречный спам
+DROP = "drop"
+
+_LIMITED_TEXT = "⏳ Слишком много запросов, попробуйте чуть позже"
+_SHED_TEXT = "⏳ Сервер сейчас перегружен, попробуйте через минуту"
+
+
+class MemoryBuckets:
+    """Вёдра токенов по ключу в памяти процесса: (токены, время обновления, предупреждён ли)."""
+
+    blocking = False
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: int, now: float) -> str:
+        with self._lock:
+            tokens, updated, warned = self._buckets.get(key, (burst, now, False))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                verdict, tokens, warned = ALLOW, tokens - 1, False
+            else:
+                verdict, warned = (DROP if warned else LIMITED), True
+            self._buckets[key] = (tokens, now, warned)
+            if len(self._buckets) > _PRUNE_SIZE:
+                self._prune(rate, burst, now)
+            return verdict
+
+    def _prune(self, rate: float, burst: int, now: float) -> None:
+        # Ведро, которое уже наполнилось бы до краёв, неотличимо от отсутствующего
+        full_after = burst / rate if rate else float("inf")
+        self._buckets = {
+            key: value for key, value in self._buckets.items()
+            if now - value[1] < full_after
+        }
+
+
+class SqliteBuckets:
+    """
+    Те же вёдра в SQLite: состояние переживает перезапуск и общее у
+    нескольких процессов бота. У каждого потока своё соединение.
+    Вёдра, которые успели бы наполниться, удаляются не чаще раза за время
+    наполнения, так что таблица не растёт с числом когда-либо писавших.
+    """
+
+    # take ходит в базу, из event loop его зовут через asyncio.to_thread
+    blocking = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._pruned = time.time()
+        dir_path = os.path.dirname(path)
+        if dir_path:
+            os.makedirs(dir_path, exist_ok=True)
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits ("
+            "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, warned INTEGER NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS rate_limits_updated ON rate_limits (updated)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, rate: float, burst: int, now: float) -> str:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated, warned FROM rate_limits WHERE key = ?", (key,)
+            ).fetchone()
+            tokens, updated, warned = row or (burst, now, False)
+            tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+            if tokens >= 1:
+                verdict, tokens, warned = ALLOW, tokens - 1, False
+            else:
+                verdict, warned = (DROP if warned else LIMITED), True
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limits (key, tokens, updated, warned) VALUES (?, ?, ?, ?)",
+                (key, tokens, now, int(warned)),
+            )
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        self._prune(conn, rate, burst, now)
+        return verdict
+
+    def _prune(self, conn: sqlite3.Connection, rate: float, burst: int, now: float) -> None:
+        full_after = burst / rate if rate else float("inf")
+        if now - self._pruned < full_after:
+            return
+        self._pruned = now
+        deleted = conn.execute("DELETE FROM rate_limits WHERE updated < ?", (now - full_after,)).rowcount
+        if deleted:
+            logger.debug("Pruned %s idle rate limit buckets", deleted)
+
+
+class UserRateLimiter:
+    """Ведро токенов на пару (действие, пользователь): rate запросов в секунду, не больше burst подряд."""
+
+    def __init__(self, rate: float, burst: int, buckets=None):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = buckets or MemoryBuckets()
+        self.blocking = self._buckets.blocking
+
+    def check(self, action: str, user_id: int) -> str:
+        """Возвращает ALLOW, LIMITED или DROP. При ошибке хранилища лимитов пропускает запрос."""
+        try:
+            return self._buckets.take(f"{action}:{user_id}", self.rate, self.burst, time.time())
+        except sqlite3.Error as e:
+            logger.error(f"Rate limit storage failed: {e}")
+            return ALLOW
+
+
+class PanelLoad:
+    """
+    Скользящее среднее задержки запросов к панели. Пока оно выше threshold,
+    запросы, которые ходят в панель, отклоняются. Если свежих замеров нет
+    дольше cooldown, сброс снимается, и следующие запросы снова меряют панель.
+    """
+
+    def __init__(self, threshold: float, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._ewma = 0.0
+        self._observed = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._ewma = seconds if not self._observed else (
+                _EWMA_ALPHA * seconds + (1 - _EWMA_ALPHA) * self._ewma
+            )
+            self._observed = time.monotonic()
+            PANEL_LATENCY_EWMA.set(self._ewma)
+
+    def overloaded(self) -> bool:
+        if not self.threshold:
+            return False
+        with self._lock:
+            return self._ewma > self.threshold and time.monotonic() - self._observed < self.cooldown
+
+    @contextmanager
+    def timer(self, endpoint: str):
+        """metrics.timer для запроса к панели, который заодно обновляет среднюю задержку."""
+        start = time.perf_counter()
+        try:
+            with timer(PANEL_REQUEST_SECONDS, endpoint):
+                yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+def _create_limiter() -> UserRateLimiter:
+    buckets = SqliteBuckets(RATE_LIMIT_DB_FILE) if RATE_LIMIT_DB_FILE else None
+    return UserRateLimiter(RATE_LIMIT_RATE, RATE_LIMIT_BURST, buckets)
+
+
+user_limiter = _create_limiter()
+panel_load = PanelLoad(PANEL_SHED_LATENCY, PANEL_SHED_COOLDOWN)
+
+
+def _verdict(action: str, user_id: int, shed: bool) -> tuple:
+    """(вердикт, текст ответа) — лимит пользователя проверяется до сброса нагрузки."""
+    verdict = user_limiter.check(action, user_id)
+    if verdict != ALLOW:
+        RATE_LIMITED.labels(action, "limited").inc()
+        return verdict, _LIMITED_TEXT
+    if shed and panel_load.overloaded():
+        RATE_LIMITED.labels(action, "shed").inc()
+        return LIMITED, _SHED_TEXT
+    return ALLOW, None
+
+
+def _reject(bot, update, verdict: str, text: str):
+    """Дешёвый ответ на отклонённый апдейт: всплывашка для колбэка, сообщение — только первый раз."""
+    if hasattr(update, "data"):
+        return bot.answer_callback_query(update.id, text if verdict == LIMITED else None)
+    if verdict == LIMITED:
+        return bot.send_message(update.chat.id, text)
+    return None
+
+
+def _user_id(update) -> int:
+    message = getattr(update, "message", update)
+    return message.chat.id
+
+
+def rate_limited(bot, action: str, shed: bool = False):
+    """
+    Пропускает обработчик, только если пользователь не превысил лимит
+    на action, а при shed — ещё и если панель не перегружена. Работает
+    и с TeleBot, и с AsyncTeleBot: методы у них называются одинаково.
+    """
+
+    def decorator(handler):
+        if inspect.iscoroutinefunction(handler):
+
+            @functools.wraps(handler)
+            async def async_wrapper(update, *args, **kwargs):
+                if user_limiter.blocking:
+                    verdict, text = await asyncio.to_thread(_verdict, action, _user_id(update), shed)
+                else:
+                    verdict, text = _verdict(action, _user_id(update), shed)
+                if verdict == ALLOW:
+                    return await handler(update, *args, **kwargs)
+                reply = _reject(bot, update, verdict, text)
+                if reply is not None:
+                    await reply
+
+            return async_wrapper
+
+        @functools.wraps(handler)
+        def wrapper(update, *args, **kwargs):
+            verdict, text = _verdict(action, _user_id(update), shed)
+            if verdict == ALLOW:
+                return handler(update, *args, **kwargs)
+            _reject(bot, update, verdict, text)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,244 @@
+import heapq
+import io
+import itertools
+import threading
+import time
+from collections import deque
+from logger import api_logger as logger
+from metrics import TELEGRAM_SEND_FAILURES
+from typing import Callable, Dict, List, Optional, Tuple
+from config import (
+    TG_GLOBAL_RATE,
+    TG_PER_CHAT_RATE,
+    TG_SENDER_WORKERS,
+    TG_SEND_RETRIES,
+)
+
+# Сколько чатов помнить, прежде чем выбросить тех, у кого пауза уже прошла
+_NOT_BEFORE_PRUNE_SIZE = 10000
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity за раз."""
+
+    def __init__(self, rate: float, capacity: float):
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self) -> float:
+        """Забирает токен и возвращает 0 либо время, через которое он появится."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self._capacity, self._tokens + (now - self._updated) * self._rate
+            )
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self._rate
+
+    def acquire(self) -> None:
+        while True:
+            wait = self._take()
+            if not wait:
+                return
+            time.sleep(wait)
+
+
+class OutboundMessage:
+    """
+    Сообщение в очереди отправки. Подряд идущие сообщения в один чат с одной
+    и той же функцией digest склеиваются: digest получает тексты всех частей
+    и возвращает (text, kwargs) итогового сообщения.
+    """
+
+    def __init__(self, chat_id: int, text: str, kwargs: dict, digest: Optional[Callable] = None):
+        self.chat_id = chat_id
+        self.parts = [text]
+        self.kwargs = kwargs
+        self.digest = digest
+        self.attempts = 0
+        self.on_done = None
+
+    def render(self) -> Tuple[str, dict]:
+        if len(self.parts) > 1 and self.digest:
+            return self.digest(self.parts)
+        return self.parts[0], self.kwargs
+
+
+class OutboundPhoto(OutboundMessage):
+    """
+    Фото в очереди отправки: file_id или содержимое картинки (bytes).
+    on_done вызывается один раз с отправленным сообщением или None, если
+    отправить так и не удалось.
+    """
+
+    def __init__(self, chat_id: int, photo, kwargs: dict, on_done: Optional[Callable] = None):
+        super().__init__(chat_id, photo, kwargs)
+        self.on_done = on_done
+
+    def render(self) -> Tuple[object, dict]:
+        photo = self.parts[0]
+        if isinstance(photo, bytes):
+            # Файл на каждую попытку свой: после неудачной загрузки прежний уже прочитан
+            photo = io.BytesIO(photo)
+            photo.name = "photo.png"
+        return photo, self.kwargs
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    """Для ошибки 429 от Telegram возвращает, сколько секунд ждать."""
+    if getattr(exc, "error_code", None) != 429:
+        return None
+    parameters = (getattr(exc, "result_json", None) or {}).get("parameters") or {}
+    return float(parameters.get("retry_after", 1))
+
+
+class MessageSender:
+    """
+    Очередь исходящих сообщений Telegram. Отправкой занимаются фоновые
+    потоки с общим ведром токенов на весь бот и отдельным темпом на каждый
+    чат. Сообщения в один чат уходят по порядку, на 429 чат откладывается
+    на retry_after, а накопившиеся сообщения с digest склеиваются в одно.
+    """
+
+    def __init__(
+        self,
+        transport: Callable,
+        photo_transport: Optional[Callable] = None,
+        global_rate: float = TG_GLOBAL_RATE,
+        per_chat_rate: float = TG_PER_CHAT_RATE,
+        workers: int = TG_SENDER_WORKERS,
+        max_retries: int = TG_SEND_RETRIES,
+    ):
+        self._transport = transport
+        self._photo_transport = photo_transport
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chat_interval = 1 / per_chat_rate
+        self._workers = workers
+        self._max_retries = max_retries
+        self._chats: Dict[int, deque] = {}
+        self._not_before: Dict[int, float] = {}
+        self._in_flight = set()
+        self._ready: List[tuple] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+
+    def start(self) -> None:
+        for i in range(self._workers):
+            thread = threading.Thread(
+                target=self._run, name=f"tg-sender-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Дожидается отправки очереди и останавливает потоки."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def send_message(self, chat_id: int, text: str, digest: Optional[Callable] = None, **kwargs) -> None:
+        """Ставит сообщение в очередь и сразу возвращает управление."""
+        self._enqueue(OutboundMessage(chat_id, text, kwargs, digest))
+
+    def send_photo(self, chat_id: int, photo, on_done: Optional[Callable] = None, **kwargs) -> None:
+        """Ставит фото в очередь, on_done получит результат отправки."""
+        self._enqueue(OutboundPhoto(chat_id, photo, kwargs, on_done))
+
+    def _schedule(self, chat_id: int) -> None:
+        # Вызывается под self._cond: у чата с сообщениями, который сейчас
+        # не отправляется, ровно одна запись в куче
+        ready_at = self._not_before.pop(chat_id, 0.0)
+        heapq.heappush(self._ready, (ready_at, next(self._seq), chat_id))
+        self._cond.notify()
+
+    def _enqueue(self, message: OutboundMessage, front: bool = False) -> None:
+        with self._cond:
+            queue = self._chats.get(message.chat_id)
+            if queue is None:
+                queue = self._chats[message.chat_id] = deque()
+                if message.chat_id not in self._in_flight:
+                    self._schedule(message.chat_id)
+            if front:
+                queue.appendleft(message)
+            else:
+                queue.append(message)
+
+    def _next_message(self) -> Optional[OutboundMessage]:
+        with self._cond:
+            while True:
+                if not self._ready:
+                    if self._stopping:
+                        return None
+                    self._cond.wait()
+                    continue
+                ready_at, _, chat_id = self._ready[0]
+                delay = ready_at - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                heapq.heappop(self._ready)
+                queue = self._chats.pop(chat_id)
+                message = queue.popleft()
+                while message.digest and queue and queue[0].digest is message.digest:
+                    message.parts += queue.popleft().parts
+                if queue:
+                    self._chats[chat_id] = queue
+                self._in_flight.add(chat_id)
+                return message
+
+    def _finish(self, chat_id: int, not_before: float) -> None:
+        with self._cond:
+            self._in_flight.discard(chat_id)
+            self._not_before[chat_id] = not_before
+            if chat_id in self._chats:
+                self._schedule(chat_id)
+            elif len(self._not_before) > _NOT_BEFORE_PRUNE_SIZE:
+                now = time.monotonic()
+                self._not_before = {
+                    chat: t for chat, t in self._not_before.items() if t > now
+                }
+
+    def _run(self) -> None:
+        while True:
+            message = self._next_message()
+            if message is None:
+                return
+            self._global.acquire()
+            not_before = time.monotonic() + self._chat_interval
+            transport = self._photo_transport if isinstance(message, OutboundPhoto) else self._transport
+            try:
+                text, kwargs = message.render()
+                self._done(message, transport(message.chat_id, text, **kwargs))
+            except Exception as e:
+                retry_after = _retry_after(e)
+                TELEGRAM_SEND_FAILURES.labels(
+                    "flood" if retry_after is not None else "error"
+                ).inc()
+                message.attempts += 1
+                if retry_after is not None and message.attempts <= self._max_retries:
+                    logger.warning(f"Flood limit for chat with id={message.chat_id}, retrying in {retry_after}s")
+                    not_before = time.monotonic() + retry_after
+                    self._enqueue(message, front=True)
+                else:
+                    logger.error(f"Failed to send message to chat with id={message.chat_id}: {e}")
+                    self._done(message, None)
+            self._finish(message.chat_id, not_before)
+
+    @staticmethod
+    def _done(message: OutboundMessage, result) -> None:
+        if message.on_done is None:
+            return
+        try:
+            message.on_done(result)
+        except Exception as e:
+            logger.error(f"Send callback failed for chat with id={message.chat_id}: {e}")
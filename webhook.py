@@ -0,0 +1,70 @@
+import hmac
+from aiohttp import web
+from telebot import TeleBot, types
+from logger import api_logger as logger
+from config import (
+    WEBHOOK_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    WEBHOOK_MAX_CONNECTIONS,
+)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def check_webhook_config() -> None:
+    """
+    Без WEBHOOK_URL Telegram некуда слать апдейты, а без WEBHOOK_SECRET
+    любой, кто узнал адрес, может подделать апдейт от имени админа.
+    """
+    if not WEBHOOK_URL or not WEBHOOK_SECRET:
+        raise ValueError("WEBHOOK_URL and WEBHOOK_SECRET must be set in config for webhook mode")
+
+
+def make_app(bot: TeleBot) -> web.Application:
+    """
+    HTTP-приложение, принимающее апдейты от Telegram. Апдейт только
+    раскладывается по обработчикам, сами обработчики выполняются в пуле
+    потоков TeleBot, поэтому Telegram получает ответ сразу.
+    """
+    check_webhook_config()
+
+    async def handle_update(request: web.Request) -> web.Response:
+        token = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(token, WEBHOOK_SECRET):
+            logger.warning(f"Rejected webhook request from {request.remote}: bad secret token")
+            return web.Response(status=403)
+        try:
+            update = types.Update.de_json(await request.text())
+        except Exception as e:
+            logger.error(f"Failed to parse webhook update: {e}")
+            return web.Response(status=400)
+        bot.process_new_updates([update])
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, handle_update)
+    return app
+
+
+def run_webhook(bot: TeleBot) -> None:
+    """
+    Регистрирует вебхук и запускает HTTP-сервер. Порт открывается с
+    SO_REUSEPORT, так что на одном хосте можно запустить несколько процессов.
+    """
+    check_webhook_config()
+    bot.set_webhook(
+        url=f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+        secret_token=WEBHOOK_SECRET,
+        max_connections=WEBHOOK_MAX_CONNECTIONS,
+    )
+    logger.info(f"Webhook server listening on {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    web.run_app(
+        make_app(bot),
+        host=WEBHOOK_HOST,
+        port=WEBHOOK_PORT,
+        reuse_port=True,
+        print=None,
+    )